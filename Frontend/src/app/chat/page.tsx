@@ -25,6 +25,7 @@ export default function ChatPage() {
   const [messages, setMessages] = useState<Message[]>([])
   const [input, setInput] = useState("")
   const [isLoading, setIsLoading] = useState(false)
+  const [sessionId, setSessionId] = useState<string | null>(null) // Server-side chat session (history lives on the backend)
   // const { theme } = useTheme() // theme is not directly used for styling here, but good to have
   const messagesEndRef = useRef<HTMLDivElement>(null)
   const chatContainerRef = useRef<HTMLDivElement>(null); // Ref for the message container
@@ -68,6 +69,7 @@ export default function ChatPage() {
   const handleNewChat = () => {
     setMessages([])
     setInput("")
+    setSessionId(null)
   }
 
   const handleInputChange = (e: React.ChangeEvent<HTMLInputElement>) => {
@@ -89,18 +91,14 @@ export default function ChatPage() {
     setIsLoading(true)
 
     try {
-      // Construct chat history
-      const history: [string, string][] = [];
-      for(let i=0; i<messages.length-1; i++) {
-          if(messages[i].role === 'user' && messages[i+1]?.role === 'assistant') {
-              history.push([messages[i].content, messages[i+1].content]);
-          }
-      }
-
+      // The backend keeps the chat history for the session
       const response = await axios.post('http://localhost:8000/chat', {
         question: trimmedInput,
-        chat_history: history
+        session_id: sessionId
       });
+      if (response.data.session_id) {
+        setSessionId(response.data.session_id)
+      }
 
       const botResponse: Message = {
         id: crypto.randomUUID(),
@@ -1,67 +1,98 @@
-from fastapi import FastAPI, HTTPException
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Tuple, Optional, Dict, Any
-from core.retrieval import get_retriever, get_filterable_retriever
-from core.generation import RAGPipeline
-from core.ingestion import ingest_data
-import os
 from core.config import Config
-from langchain_core.messages import HumanMessage, AIMessage
-
-# Try to import course modules
-try:
-    from core.course_ingestion import ingest_courses
-    from core.course_retrieval import CourseRetriever
-    COURSE_MODULES_AVAILABLE = True
-except ImportError as e:
-    print(f"Warning: Course modules not available: {e}")
-    COURSE_MODULES_AVAILABLE = False
+from core.jobs import JobManager
+from core.metrics import timed
 
-app = FastAPI(title="IIITD Chatbot Backend - Dual Engine")
-
-# Add CORS Middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# NOTE: LangChain, Chroma, the model SDKs and the transformer models are imported and
+# loaded lazily by the background warm-up below, so uvicorn can bind immediately.
 
 # Global variables
 retriever = None
 course_retriever = None
 pipeline = None
+COURSE_MODULES_AVAILABLE = None  # Resolved on first use
 
-def initialize_pipeline(use_router: bool = True):
-    """Initialize the dual-engine pipeline."""
+# Warm-up state (exposed by /readyz)
+startup_state = {
+    "status": "starting",  # starting -> warming -> ready | failed
+    "error": None,
+    "started_at": time.time(),
+    "ready_at": None,
+    "timings": {},
+}
+_warm_up_lock = threading.Lock()
+
+def course_modules_available() -> bool:
+    """Check (once) whether the course modules can be imported."""
+    global COURSE_MODULES_AVAILABLE
+    if COURSE_MODULES_AVAILABLE is None:
+        try:
+            import core.course_ingestion
+            import core.course_retrieval
+            COURSE_MODULES_AVAILABLE = True
+        except ImportError as e:
+            print(f"Warning: Course modules not available: {e}")
+            COURSE_MODULES_AVAILABLE = False
+    return COURSE_MODULES_AVAILABLE
+
+def initialize_pipeline(use_router: bool = True, timings: Optional[Dict[str, float]] = None) -> bool:
+    """
+    Initialize the dual-engine pipeline.
+    Components are built first and swapped in at the end, so a reload after ingestion
+    keeps serving from the previous pipeline until the new one is ready.
+    """
     global retriever, course_retriever, pipeline
     
+    with timed(timings, "imports"):
+        from core.retrieval import get_filterable_retriever, reset_chroma_clients
+        from core.generation import RAGPipeline
+        from core.artifacts import open_bundle, COURSE_RECORDS
+    
     # Check if general vector store exists, if not, ingest
     if not os.path.exists(Config.CHROMA_PERSIST_DIRECTORY):
         print("General vector store not found. Ingesting general data...")
         try:
+            from core.ingestion import ingest_data
             ingest_data()
         except Exception as e:
             print(f"Error during general ingestion: {e}")
-            return
+            return False
+
+    # Ingestion may have swapped new vector stores in at the same paths since the last load
+    reset_chroma_clients()
 
     try:
         # Engine A: General Retriever
-        retriever = get_filterable_retriever()
+        with timed(timings, "engine_a"):
+            new_retriever = get_filterable_retriever(timings=timings)
         print("Engine A (General Retriever) initialized.")
         
         # Engine B: Course Retriever (optional)
-        course_retriever = None
-        if COURSE_MODULES_AVAILABLE:
-            course_index_path = os.path.join(
+        new_course_retriever = None
+        if course_modules_available():
+            bundle = open_bundle()
+            legacy_index_path = os.path.join(
                 os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY),
                 'course_index.pkl'
             )
-            if os.path.exists(course_index_path):
+            if (bundle and bundle.has_prefix(COURSE_RECORDS)) or os.path.exists(legacy_index_path):
                 try:
-                    course_retriever = CourseRetriever()
+                    from core.course_retrieval import CourseRetriever
+                    with timed(timings, "engine_b"):
+                        # Share the embedding model and cross-encoder with Engine A
+                        new_course_retriever = CourseRetriever(
+                            embeddings=new_retriever.vectorstore.embeddings,
+                            reranker=new_retriever.reranker
+                        )
                     print("Engine B (Course Retriever) initialized.")
                 except Exception as e:
                     print(f"Warning: Could not initialize Course Retriever: {e}")
@@ -69,24 +100,119 @@ def initialize_pipeline(use_router: bool = True):
                 print("Course index not found. Run course ingestion to enable Engine B.")
         
         # Create pipeline with both engines
-        pipeline = RAGPipeline(
-            retriever=retriever,
-            use_router=use_router,
-            course_retriever=course_retriever
-        )
+        with timed(timings, "llm_and_router"):
+            new_pipeline = RAGPipeline(
+                retriever=new_retriever,
+                use_router=use_router,
+                course_retriever=new_course_retriever
+            )
+        
+        retriever, course_retriever, pipeline = new_retriever, new_course_retriever, new_pipeline
         print("Dual-Engine Pipeline initialized successfully.")
+        return True
         
     except Exception as e:
         print(f"Error initializing pipeline: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
-# Initialize on startup
-initialize_pipeline()
+def warm_up(use_router: bool = True, wait: bool = False):
+    """
+    Load models and indexes, then run a dummy embed and rerank so the first real
+    query does not pay for lazy model initialization.
+    
+    Args:
+        wait: Wait for an in-progress warm-up instead of skipping (used after ingestion,
+              where the indexes on disk have changed)
+    """
+    if not _warm_up_lock.acquire(blocking=wait):
+        return  # Already warming up
+    timings = {}
+    start = time.perf_counter()
+    try:
+        if pipeline is None:
+            startup_state["status"] = "warming"
+        if not initialize_pipeline(use_router, timings=timings):
+            raise RuntimeError("Pipeline initialization failed. Check logs.")
+        
+        with timed(timings, "warmup_embed"):
+            retriever.vectorstore.embeddings.embed_query("warm up")
+        with timed(timings, "warmup_rerank"):
+            retriever.reranker.score([("warm up", "warm up")])
+        
+        timings["total"] = round(time.perf_counter() - start, 3)
+        startup_state.update(status="ready", error=None, ready_at=time.time(), timings=timings)
+        print(f"Warm-up complete in {timings['total']}s: {timings}")
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        startup_state.update(error=str(e), timings=timings)
+        if pipeline is None:
+            startup_state["status"] = "failed"
+    finally:
+        _warm_up_lock.release()
+
+def start_warm_up():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def reopen_after_fork():
+    """
+    Re-open per-process resources in a worker forked from a warmed parent (serve.py).
+    Models, BM25 arrays and course records stay shared copy-on-write; only the Chroma
+    clients (SQLite connections must not cross a fork) are rebuilt around the shared
+    embedding model.
+    """
+    from langchain_chroma import Chroma
+    from core.retrieval import reset_chroma_clients
+    reset_chroma_clients()
+    
+    if retriever is not None:
+        retriever.vectorstore = Chroma(
+            persist_directory=Config.CHROMA_PERSIST_DIRECTORY,
+            embedding_function=retriever.vectorstore.embeddings
+        )
+    if course_retriever is not None:
+        course_retriever.vectorstore = Chroma(
+            persist_directory=course_retriever.persist_directory,
+            embedding_function=course_retriever.vectorstore.embeddings
+        )
+
+def reload_after_ingestion(job):
+    """Pick up rebuilt indexes: ask the pre-fork parent to re-fork, or reload in-process."""
+    parent_pid = os.environ.get("PREFORK_PARENT_PID")
+    if parent_pid:
+        import signal
+        print(f"Ingestion job {job.id} finished; asking pre-fork parent {parent_pid} to reload workers")
+        os.kill(int(parent_pid), signal.SIGHUP)
+    else:
+        warm_up(wait=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background; the server accepts connections immediately.
+    # Workers forked by serve.py inherit a warmed pipeline and skip this.
+    if pipeline is None:
+        start_warm_up()
+    yield
+
+app = FastAPI(title="IIITD Chatbot Backend - Dual Engine", lifespan=lifespan)
+
+# Add CORS Middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Background ingestion jobs; reload the pipeline once a job has rebuilt the indexes
+job_manager = JobManager(on_success=reload_after_ingestion)
 
 class ChatRequest(BaseModel):
     question: str
-    chat_history: List[Tuple[str, str]] = []
+    session_id: Optional[str] = None  # Server-side history; omit to start a new session
+    chat_history: List[Tuple[str, str]] = []  # Client-side history (legacy clients); bypasses sessions
 
 class Source(BaseModel):
     content: str
@@ -103,22 +229,67 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[Source] = []
     route_info: Optional[RouteInfo] = None
+    cache: Optional[str] = None  # 'exact' or 'semantic' when served from the answer cache
+    session_id: Optional[str] = None  # Send back with the next question
+    context_tokens: Optional[Dict[str, int]] = None  # Context packing stats (tokens before/after, chunks kept)
+
+async def run_until_disconnected(http_request: Request, fn, cancel_event: threading.Event):
+    """
+    Run a blocking `fn` in a worker thread, setting `cancel_event` if the client disconnects
+    meanwhile. `fn` stops at its next cancellation check (raising RequestCancelled).
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(fn))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=Config.CANCEL_POLL_INTERVAL)
+        if done:
+            return task.result()
+        if not cancel_event.is_set() and await http_request.is_disconnected():
+            cancel_event.set()
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    global pipeline
-    if not pipeline:
-        initialize_pipeline()
-        if not pipeline:
-            raise HTTPException(status_code=500, detail="Pipeline not initialized. Check logs.")
+async def chat(request: ChatRequest, http_request: Request):
+    from core.sessions import get_session_store, window_history
+    from core.cancellation import RequestCancelled, cancellable, record_cancelled
     
-    history_messages = []
-    for human, ai in request.chat_history:
-        history_messages.append(HumanMessage(content=human))
-        history_messages.append(AIMessage(content=ai))
+    active_pipeline = pipeline
+    if not active_pipeline:
+        if startup_state["status"] == "failed":
+            start_warm_up()  # Retry in the background
+        raise HTTPException(
+            status_code=503,
+            detail=f"Pipeline not ready ({startup_state['status']}). Retry shortly.",
+            headers={"Retry-After": "5"}
+        )
+    
+    cancel_event = threading.Event()
+    def run_pipeline():
+        # Session reads and writes may hit SQLite, so they run here rather than on the event loop.
+        # History for the condenser: windowed and token-budgeted either way
+        session_store = get_session_store()
+        session = None
+        if request.chat_history or session_store is None:
+            history_messages = window_history(request.chat_history)
+        else:
+            session = session_store.get_or_create(request.session_id)
+            history_messages = session_store.history(session)
+        
+        with cancellable(cancel_event):
+            result = active_pipeline.run(
+                request.question, chat_history=history_messages,
+                working_set=session.working_set if session else None
+            )
+        if session is not None:
+            session_store.record_turn(
+                session, request.question, result["answer"],
+                llm=active_pipeline.llm, working_set=result.get("working_set")
+            )
+        return result, session
     
     try:
-        result = pipeline.run(request.question, chat_history=history_messages)
+        if Config.CANCEL_ON_DISCONNECT:
+            result, session = await run_until_disconnected(http_request, run_pipeline, cancel_event)
+        else:
+            result, session = await asyncio.to_thread(run_pipeline)
         
         # Parse route_info if available
         route_info = None
@@ -134,51 +305,122 @@ async def chat(request: ChatRequest):
         return ChatResponse(
             answer=result["answer"], 
             sources=result["sources"],
-            route_info=route_info
+            route_info=route_info,
+            cache=result.get("cache"),
+            session_id=session.id if session else None,
+            context_tokens=result.get("context_tokens")
         )
+    except RequestCancelled as e:
+        # Nobody is waiting for the answer; the turn is not recorded in the session
+        record_cancelled(e)
+        return JSONResponse(status_code=499, content={"detail": "Client disconnected"})
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/ingest")
-async def trigger_ingestion():
-    """Ingest general knowledge base."""
+def _submit_ingestion(kind: str, **kwargs) -> dict:
     try:
-        ingest_data()
-        initialize_pipeline()
-        return {"status": "General ingestion successful"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job = job_manager.submit(kind, **kwargs)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
 
-@app.post("/ingest-courses")
+@app.post("/ingest", status_code=202)
+async def trigger_ingestion():
+    """Submit a background job that ingests the general knowledge base."""
+    return _submit_ingestion("general")
+
+@app.post("/ingest-courses", status_code=202)
 async def trigger_course_ingestion():
-    """Ingest course JSONs into Engine B."""
-    if not COURSE_MODULES_AVAILABLE:
+    """Submit a background job that ingests course JSONs into Engine B."""
+    if not course_modules_available():
         raise HTTPException(status_code=500, detail="Course modules not available")
     
-    try:
-        # Ingest courses
-        jsons_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'jsons')
-        ingest_courses(jsons_dir)
-        
-        # Reinitialize pipeline to pick up new course data
-        initialize_pipeline()
-        
-        return {"status": "Course ingestion successful"}
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    jsons_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jsons')
+    return _submit_ingestion("courses", jsons_dir=jsons_dir)
+
+@app.get("/jobs")
+async def list_jobs():
+    """List recent ingestion jobs, newest first."""
+    return [job.to_dict() for job in job_manager.list()]
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get progress of an ingestion job (files parsed, chunks embedded, ETA)."""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a running ingestion job."""
+    job = job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the server process is up and accepting connections."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: models and indexes are loaded and warmed up."""
+    ready = pipeline is not None
+    body = {
+        "status": startup_state["status"],
+        "ready": ready,
+        "error": startup_state["error"],
+        "startup_seconds": round(startup_state["ready_at"] - startup_state["started_at"], 3) if startup_state["ready_at"] else None,
+        "timings": startup_state["timings"],
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process counters (router LLM calls avoided, cache hit rate, etc.) for this worker."""
+    from core import metrics
+    from core.answer_cache import get_answer_cache
+    from core.retrieval_cache import retrieval_cache_stats
+    from core.sessions import get_session_store
+    from core.llm_client import http_stats
+    from core.llm_pool import pool_stats
+    snapshot = metrics.snapshot()
+    snapshot.update(metrics.latencies())
+    snapshot.update(http_stats())
+    snapshot.update(pool_stats())
+    answer_cache = get_answer_cache()
+    if answer_cache:
+        snapshot.update(answer_cache.stats())
+    snapshot.update(retrieval_cache_stats())
+    session_store = get_session_store()
+    if session_store:
+        snapshot.update(session_store.stats())
+    if retriever is not None and hasattr(retriever.reranker, "stats"):
+        snapshot.update(retriever.reranker.stats())
+    return snapshot
+
+@app.get("/metrics/memory")
+async def memory():
+    """Memory of this worker process (RSS, PSS and unique/private USS, in KB)."""
+    from core.metrics import process_memory
+    return process_memory()
 
 @app.get("/status")
 async def get_status():
     """Get system status."""
+    active_job = job_manager.active_job()
     return {
         "general_retriever": retriever is not None,
         "course_retriever": course_retriever is not None,
         "pipeline": pipeline is not None,
-        "course_modules_available": COURSE_MODULES_AVAILABLE
+        "course_modules_available": COURSE_MODULES_AVAILABLE,
+        "startup_status": startup_state["status"],
+        "worker_pid": os.getpid(),
+        "active_ingestion_job": active_job.id if active_job else None
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+"""
+Condense + Route Latency Benchmark
+Compares the sequential mode (condense call, then router call) against the combined
+single-call mode (COMBINED_CONDENSE_ROUTE) on multi-turn transcripts.
+
+The LLM is a stub that charges simulated llama-server time for every call: prompt
+prefill at --prefill-tps plus generation at --decode-tps (tokens estimated as chars / 4).
+Defaults approximate a 14B model on CPU. No model server, vector store or embedding
+model is needed.
+
+Usage:
+    python benchmark_condense_route.py
+    python benchmark_condense_route.py --prefill-tps 300 --decode-tps 12
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Any, List, Optional
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from core.config import Config
+from core.generation import RAGPipeline
+
+
+TRANSCRIPTS = [
+    ["What is the fee structure for B.Tech?", "what about hostel fees?", "and is there a scholarship for it?"],
+    ["Tell me about CSE101", "what are its prerequisites?", "how many credits?", "who else takes it?"],
+    ["What is the attendance policy?", "what happens if I fall below it?", "thanks"],
+    ["Which companies visit for placements?", "what was the highest package?", "and for M.Tech?"],
+    ["What clubs are there on campus?", "how do I join the coding one?"],
+]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubLLM(BaseChatModel):
+    """Chat model stub returning canned answers and charging simulated server time."""
+
+    prefill_tps: float = 150.0
+    decode_tps: float = 8.0
+    request_overhead: float = 0.05  # HTTP + slot scheduling per round trip
+    simulated_seconds: List[float] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        system = messages[0].content
+        question = messages[-1].content.split(":", 1)[-1].strip()
+        if "standalone_question" in system:
+            return json.dumps({
+                "standalone_question": question, "intent": "general", "sections": [],
+                "keywords": question.split()[:3]
+            })
+        if "query rewriter" in system:
+            return question
+        return json.dumps({
+            "intent": "general", "sections": [], "keywords": question.split()[:3]
+        })
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        output = self._respond(messages)
+        prompt_tokens = sum(estimate_tokens(str(m.content)) for m in messages)
+        self.simulated_seconds.append(
+            self.request_overhead + prompt_tokens / self.prefill_tps + estimate_tokens(output) / self.decode_tps
+        )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=output))])
+
+
+def run_mode(pipeline: RAGPipeline, llm: StubLLM, combined: bool) -> dict:
+    """Condense + route every follow-up turn; return per-turn simulated latency and call counts."""
+    Config.COMBINED_CONDENSE_ROUTE = combined
+    latencies, calls, overheads = [], [], []
+
+    for transcript in TRANSCRIPTS:
+        history = []
+        for turn, question in enumerate(transcript):
+            if turn > 0:
+                llm.simulated_seconds.clear()
+                start = time.perf_counter()
+                standalone, route_info = pipeline._condense_and_route(question, history)
+                if route_info is None:
+                    route_info = pipeline.router.route(standalone)
+                overheads.append(time.perf_counter() - start)
+                latencies.append(sum(llm.simulated_seconds))
+                calls.append(len(llm.simulated_seconds))
+            history += [HumanMessage(content=question), AIMessage(content=f"Here is what I found about: {question}")]
+
+    return {
+        "turns": len(latencies),
+        "llm_calls_per_turn": statistics.mean(calls),
+        "mean_seconds": statistics.mean(latencies),
+        "p95_seconds": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+        "python_overhead_ms": statistics.mean(overheads) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs combined condense+route")
+    parser.add_argument("--prefill-tps", type=float, default=150.0, help="Simulated prompt tokens/second")
+    parser.add_argument("--decode-tps", type=float, default=8.0, help="Simulated generated tokens/second")
+    parser.add_argument("--request-overhead", type=float, default=0.05, help="Simulated seconds per round trip")
+    args = parser.parse_args()
+
+    llm = StubLLM(prefill_tps=args.prefill_tps, decode_tps=args.decode_tps,
+                  request_overhead=args.request_overhead)
+    pipeline = RAGPipeline(RunnableLambda(lambda q: []), use_router=True, llm=llm)
+
+    results = {
+        "sequential": run_mode(pipeline, llm, combined=False),
+        "combined": run_mode(pipeline, llm, combined=True),
+    }
+
+    print(f"\n{'mode':<12} {'turns':>6} {'calls/turn':>11} {'mean s':>8} {'p95 s':>8} {'overhead ms':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<12} {r['turns']:>6} {r['llm_calls_per_turn']:>11.1f} {r['mean_seconds']:>8.2f} "
+              f"{r['p95_seconds']:>8.2f} {r['python_overhead_ms']:>12.2f}")
+    saved = results["sequential"]["mean_seconds"] - results["combined"]["mean_seconds"]
+    print(f"\nCombined mode saves {saved:.2f}s per follow-up turn "
+          f"({saved / results['sequential']['mean_seconds']:.0%}) at {args.prefill_tps:g} prefill tok/s, "
+          f"{args.decode_tps:g} decode tok/s")
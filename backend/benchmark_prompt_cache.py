@@ -0,0 +1,142 @@
+"""
+Prompt Cache Benchmark (llama-server)
+Replays an interleaved router / condense / general / course call sequence against a
+running llama-server and reports the prefill work per call, as returned in the
+server's `timings` (prompt_n = prompt tokens actually evaluated, prompt_ms).
+
+Modes:
+    no-cache     cache_prompt=false (every call re-prefills the whole prompt)
+    cache        cache_prompt=true, server picks the slot
+    cache+slots  cache_prompt=true and id_slot per chain (Config.LLAMA_SLOTS)
+
+Prompts are rendered from the real templates; contexts are BM25 results from the
+artifact bundle, so no embedding model is needed. Start the server with enough slots:
+    ./llama-server -m model.gguf --port 3000 -np 4 ...
+
+Usage:
+    python benchmark_prompt_cache.py --url http://localhost:3000/v1
+"""
+import os
+import sys
+import argparse
+import statistics
+from collections import defaultdict
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from langchain_core.messages import AIMessage, HumanMessage, convert_to_openai_messages
+from langchain_core.runnables import RunnableLambda
+
+from core.config import Config
+from core.artifacts import load_lexical_retriever, GENERAL_LEXICAL, COURSE_LEXICAL
+from core.generation import RAGPipeline, GENERAL_QA_PROMPT, COURSE_QA_PROMPT
+
+
+GENERAL_QUERIES = [
+    "What is the fee structure for B.Tech?",
+    "What is the attendance policy?",
+    "Tell me about hostel facilities",
+    "Which companies visit for placements?",
+    "What scholarships are available?",
+    "How is CGPA calculated?",
+]
+
+COURSE_QUERIES = [
+    "What are the prerequisites for Machine Learning?",
+    "Tell me about the Operating Systems course",
+    "Which courses cover computer vision?",
+    "Textbook for Signals and Systems",
+    "How many credits is Linear Algebra?",
+    "What topics are in Data Structures and Algorithms?",
+]
+
+MODES = {
+    "no-cache": {"cache_prompt": False, "pin": False},
+    "cache": {"cache_prompt": True, "pin": False},
+    "cache+slots": {"cache_prompt": True, "pin": True},
+}
+
+
+def format_context(docs) -> str:
+    return "\n\n".join(f"Document {i+1}:\n{doc.page_content}" for i, doc in enumerate(docs))
+
+
+def build_workload(rounds: int):
+    """Interleaved (chain, messages) calls, as a stream of two-turn conversations would produce."""
+    pipeline = RAGPipeline(RunnableLambda(lambda q: []), use_router=True, llm=RunnableLambda(lambda x: ""))
+    router_prompt = pipeline.router.router_chain.first
+    condense_prompt = pipeline.condense_q_chain.first
+
+    general_bm25 = load_lexical_retriever(GENERAL_LEXICAL, "", k=Config.TOP_K_RERANK)
+    course_bm25 = load_lexical_retriever(COURSE_LEXICAL, "", k=5)
+
+    calls = []
+    for i in range(rounds):
+        general_q = GENERAL_QUERIES[i % len(GENERAL_QUERIES)]
+        course_q = COURSE_QUERIES[i % len(COURSE_QUERIES)]
+        history = [HumanMessage(content=general_q), AIMessage(content="(previous answer)")]
+        calls += [
+            ("router", router_prompt.format_messages(query=general_q, sitemap=pipeline.router.sitemap_text)),
+            ("general", GENERAL_QA_PROMPT.format_messages(
+                context=format_context(general_bm25.invoke(general_q)), question=general_q)),
+            ("condense", condense_prompt.format_messages(question="what about for M.Tech?", chat_history=history)),
+            ("router", router_prompt.format_messages(query=course_q, sitemap=pipeline.router.sitemap_text)),
+            ("course", COURSE_QA_PROMPT.format_messages(
+                context=format_context(course_bm25.invoke(course_q)), question=course_q)),
+        ]
+    return calls
+
+
+def run_mode(client: httpx.Client, url: str, model: str, calls, cache_prompt: bool, pin: bool, max_tokens: int):
+    stats = defaultdict(lambda: {"prompt_n": [], "prompt_ms": [], "total": []})
+    for chain, messages in calls:
+        body = {
+            "model": model,
+            "messages": convert_to_openai_messages(messages),
+            "max_tokens": max_tokens,
+            "temperature": 0,
+            "cache_prompt": cache_prompt,
+        }
+        if pin:
+            body["id_slot"] = Config.LLAMA_SLOTS[chain]
+        response = client.post(f"{url}/chat/completions", json=body)
+        response.raise_for_status()
+        data = response.json()
+        timings = data.get("timings", {})
+        usage = data.get("usage", {})
+        stats[chain]["prompt_n"].append(timings.get("prompt_n", 0))
+        stats[chain]["prompt_ms"].append(timings.get("prompt_ms", 0.0))
+        stats[chain]["total"].append(usage.get("prompt_tokens", 0))
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure llama-server prefill with and without prompt caching")
+    parser.add_argument("--url", default=Config.LOCAL_MODEL_API or "http://localhost:3000/v1")
+    parser.add_argument("--model", default=Config.LOCAL_MODEL_NAME or "local-model")
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--max-tokens", type=int, default=8, help="Generated tokens per call (prefill is what we measure)")
+    args = parser.parse_args()
+
+    calls = build_workload(args.rounds)
+    print(f"Replaying {len(calls)} calls per mode against {args.url}")
+
+    with httpx.Client(timeout=600) as client:
+        results = {
+            mode: run_mode(client, args.url, args.model, calls, options["cache_prompt"], options["pin"], args.max_tokens)
+            for mode, options in MODES.items()
+        }
+
+    print(f"\n{'chain':<10} {'mode':<12} {'prompt tok':>10} {'prefilled':>10} {'prefill ms':>11}")
+    for chain in ["router", "condense", "general", "course"]:
+        for mode, stats in results.items():
+            s = stats[chain]
+            print(f"{chain:<10} {mode:<12} {statistics.mean(s['total']):>10.0f} "
+                  f"{statistics.mean(s['prompt_n']):>10.0f} {statistics.mean(s['prompt_ms']):>11.1f}")
+
+    print()
+    for mode, stats in results.items():
+        total_ms = sum(sum(s["prompt_ms"]) for s in stats.values())
+        print(f"{mode:<12} total prefill {total_ms / 1000:.2f}s for {len(calls)} calls")
@@ -0,0 +1,125 @@
+"""
+Adaptive Rerank Benchmark
+Compares the fixed baseline (cross-encoder over the top `TOP_K_RETRIEVAL * 2` RRF
+candidates) with the adaptive stage (`ADAPTIVE_RERANK`: candidate budget from RRF
+scores and source agreement, mini-batches with early exit) on the same fused
+candidates per query.
+
+Quality is measured against the baseline's own ranking: recall of the baseline
+top-k in the adaptive top-k, and top-1 agreement. Latency is cross-encoder time,
+with the rerank score cache bypassed so every pair is a real forward pass.
+
+Needs the general index (run ingestion first) and the reranker model.
+
+Usage:
+    python benchmark_rerank.py
+    python benchmark_rerank.py --margins 1 2 4 --batch-size 8 --min-extra 10
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.config import Config
+from core.retrieval import get_filterable_retriever
+from core.rerank_cache import CachedReranker
+from core.intent_classifier import INTENT_EXEMPLARS
+
+
+EXTRA_QUERIES = [
+    "What is the fee structure for B.Tech?",
+    "How is CGPA calculated?",
+    "What is the attendance requirement for end semester exams?",
+    "Which companies visit for placements?",
+    "Is there a gym on campus?",
+    "What are the research centers at IIITD?",
+    "How do I apply for a semester exchange?",
+    "What is the policy on plagiarism?",
+]
+
+
+def recall_at_k(reference, candidate, k):
+    ref = {doc.page_content for doc, _ in reference[:k]}
+    got = {doc.page_content for doc, _ in candidate[:k]}
+    return len(ref & got) / max(1, len(ref))
+
+
+class CountingReranker:
+    """Counts the pairs the adaptive stage actually sends to the model."""
+
+    def __init__(self, reranker):
+        self.reranker = reranker
+        self.pairs = 0
+
+    def score(self, pairs):
+        self.pairs += len(pairs)
+        return self.reranker.score(pairs)
+
+
+def run(retriever, queries, margin: float, batch_size: int):
+    Config.RERANK_STABLE_MARGIN = margin
+    Config.RERANK_BATCH_SIZE = batch_size
+    k = retriever.top_k_rerank
+    counter = CountingReranker(retriever.reranker)
+    counting_retriever = retriever.model_copy(update={"reranker": counter})
+    rows = []
+    for query in queries:
+        prefetched = retriever.prefetch(query)
+        fused = retriever.fuse_scored(prefetched["sources"])
+        if not fused:
+            continue
+        baseline_candidates = [item["doc"] for item in fused][:retriever.top_k_retrieval * 2]
+
+        start = time.perf_counter()
+        baseline = retriever.rerank_scored(query, baseline_candidates)
+        baseline_ms = (time.perf_counter() - start) * 1000
+
+        counter.pairs = 0
+        start = time.perf_counter()
+        adaptive = counting_retriever.rerank_adaptive(query, fused)
+        adaptive_ms = (time.perf_counter() - start) * 1000
+
+        rows.append({
+            "baseline_pairs": len(baseline_candidates),
+            "adaptive_pairs": counter.pairs,
+            "baseline_ms": baseline_ms,
+            "adaptive_ms": adaptive_ms,
+            "recall_k": recall_at_k(baseline, adaptive, k),
+            "recall_5": recall_at_k(baseline, adaptive, 5),
+            "top1": float(baseline[0][0].page_content == adaptive[0][0].page_content),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark adaptive vs fixed-size reranking")
+    parser.add_argument("--margins", type=float, nargs="+", default=[Config.RERANK_STABLE_MARGIN],
+                        help="Early-exit margins (cross-encoder logits) to sweep")
+    parser.add_argument("--batch-size", type=int, default=Config.RERANK_BATCH_SIZE)
+    parser.add_argument("--min-extra", type=int, default=Config.RERANK_MIN_EXTRA,
+                        help="Candidate floor above top_k_rerank")
+    args = parser.parse_args()
+    Config.RERANK_MIN_EXTRA = args.min_extra
+
+    retriever = get_filterable_retriever()
+    if isinstance(retriever.reranker, CachedReranker):
+        # Measure real forward passes, not cache hits
+        retriever = retriever.model_copy(update={"reranker": retriever.reranker.cross_encoder})
+    retriever.reranker.score([["warm up", "warm up"]])
+
+    queries = INTENT_EXEMPLARS["general"] + EXTRA_QUERIES
+    print(f"{len(queries)} queries, top_k_rerank={retriever.top_k_rerank}, "
+          f"baseline candidates={retriever.top_k_retrieval * 2}")
+
+    print(f"\n{'margin':>7} {'pairs base':>11} {'pairs adapt':>12} {'ms base':>8} {'ms adapt':>9} "
+          f"{'recall@k':>9} {'recall@5':>9} {'top-1':>6}")
+    for margin in args.margins:
+        rows = run(retriever, queries, margin, args.batch_size)
+        mean = lambda key: statistics.mean(r[key] for r in rows)
+        print(f"{margin:>7.1f} {mean('baseline_pairs'):>11.1f} {mean('adaptive_pairs'):>12.1f} "
+              f"{mean('baseline_ms'):>8.1f} {mean('adaptive_ms'):>9.1f} "
+              f"{mean('recall_k'):>9.3f} {mean('recall_5'):>9.3f} {mean('top1'):>6.2f}")
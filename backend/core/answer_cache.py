@@ -0,0 +1,188 @@
+"""
+Answer Cache
+Caches pipeline results by standalone question so repeated questions (fees, hostel,
+attendance, popular course codes) skip routing, retrieval, reranking and generation.
+
+Two tiers:
+- Exact: the normalized standalone question
+- Semantic (optional, off by default): MiniLM cosine similarity above a strict
+  threshold, and only between questions that mention the same course codes, numbers,
+  programs and departments
+
+Entries belong to one index version (see core/index_version.py); when ingestion bumps
+the version the cache is cleared. Eviction is LRU with a TTL and an entry cap. The
+cache is per process (each pre-fork worker has its own).
+"""
+import re
+import time
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, FrozenSet
+import numpy as np
+from .config import Config
+from .router import COURSE_CODE_PATTERN
+from . import metrics
+
+
+_NUMBER_PATTERN = re.compile(r"\d+")
+# Entities that embed almost identically ("B.Tech fees" vs "M.Tech fees") but change the answer
+_ENTITY_PATTERNS = {
+    name: re.compile(pattern, re.IGNORECASE) for name, pattern in {
+        "btech": r"\bb\.?\s*tech\b", "mtech": r"\bm\.?\s*tech\b", "phd": r"\bph\.?\s*d\b",
+        "msc": r"\bm\.?\s*sc\b", "bdes": r"\bb\.?\s*des\b",
+        "ug": r"\b(ug|undergrad\w*)\b", "pg": r"\b(pg|postgrad\w*)\b",
+        "cse": r"\b(cse|computer science)\b", "ece": r"\b(ece|electronics)\b",
+        "csam": r"\bcsam\b", "csai": r"\bcsai\b", "csb": r"\bcsb\b", "csd": r"\bcsd\b",
+        "csss": r"\bcsss\b", "eve": r"\beve\b", "math": r"\bmath(s|ematics)?\b",
+        "cb": r"\b(cb|computational biology)\b", "hcd": r"\b(hcd|human[- ]cent(er|r)ed design)\b",
+        "ssh": r"\b(ssh|social sciences?)\b",
+    }.items()
+}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+def question_anchors(question: str) -> FrozenSet[str]:
+    """Course codes, numbers, programs and departments: semantic hits must agree on these exactly."""
+    codes = {f"{dept}{num}".upper() for dept, num in COURSE_CODE_PATTERN.findall(question)}
+    text = COURSE_CODE_PATTERN.sub(" ", question)
+    entities = {name for name, pattern in _ENTITY_PATTERNS.items() if pattern.search(text)}
+    return frozenset(codes | entities | set(_NUMBER_PATTERN.findall(text)))
+
+
+class CacheLookup(NamedTuple):
+    result: Optional[Dict[str, Any]]
+    tier: Optional[str]  # "exact", "semantic" or None on a miss
+    query_vector: Any  # Embedding computed for the semantic tier (reusable by store)
+
+
+class _Entry:
+    __slots__ = ("result", "vector", "anchors", "created_at")
+
+    def __init__(self, result, vector, anchors, created_at):
+        self.result = result
+        self.vector = vector
+        self.anchors = anchors
+        self.created_at = created_at
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None,
+                 semantic_threshold: float = None):
+        self.max_entries = max_entries or Config.ANSWER_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.ANSWER_CACHE_TTL_SECONDS
+        self.semantic_threshold = semantic_threshold or Config.ANSWER_CACHE_SEMANTIC_THRESHOLD
+        self.embeddings = None
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._matrix = None  # Stacked entry vectors for the semantic tier (rebuilt lazily)
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+    def configure(self, version: str, embeddings=None):
+        """Attach to an index version (clearing entries from any other) and an embedding model."""
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    print(f"[AnswerCache] Index version changed, dropping {len(self._entries)} entries")
+                self._entries.clear()
+                self._matrix = None
+                self.version = version
+            self.embeddings = embeddings if Config.ANSWER_CACHE_SEMANTIC else None
+
+    def _embed(self, question: str):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def lookup(self, question: str) -> CacheLookup:
+        key = normalize_question(question)
+        now = time.time()
+        metrics.increment("answer_cache.lookups")
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry.created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    metrics.increment("answer_cache.hits.exact")
+                    return CacheLookup(copy.deepcopy(entry.result), "exact", entry.vector)
+                self._remove(key)
+                metrics.increment("answer_cache.expired")
+
+        if self.embeddings is None:
+            metrics.increment("answer_cache.misses")
+            return CacheLookup(None, None, None)
+
+        vector = self._embed(question)
+        anchors = question_anchors(question)
+        with self._lock:
+            if self._matrix is None and self._entries:
+                self._matrix_keys = [k for k, e in self._entries.items() if e.vector is not None]
+                self._matrix = np.stack([self._entries[k].vector for k in self._matrix_keys]) if self._matrix_keys else None
+            if self._matrix is not None:
+                sims = self._matrix @ vector
+                for i in np.argsort(-sims)[:5]:
+                    if sims[i] < self.semantic_threshold:
+                        break
+                    candidate = self._entries.get(self._matrix_keys[i])
+                    if candidate is None or candidate.anchors != anchors or now - candidate.created_at > self.ttl_seconds:
+                        continue
+                    self._entries.move_to_end(self._matrix_keys[i])
+                    metrics.increment("answer_cache.hits.semantic")
+                    print(f"  [AnswerCache] Semantic hit ({sims[i]:.3f}): '{self._matrix_keys[i]}'")
+                    return CacheLookup(copy.deepcopy(candidate.result), "semantic", vector)
+
+        metrics.increment("answer_cache.misses")
+        return CacheLookup(None, None, vector)
+
+    def store(self, question: str, result: Dict[str, Any], query_vector=None):
+        key = normalize_question(question)
+        if not key or not result.get("answer"):
+            return
+        if query_vector is None and self.embeddings is not None:
+            query_vector = self._embed(question)
+
+        with self._lock:
+            self._entries[key] = _Entry(copy.deepcopy(result), query_vector, question_anchors(question), time.time())
+            self._entries.move_to_end(key)
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment("answer_cache.evictions")
+
+    def _remove(self, key: str):
+        del self._entries[key]
+        self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = metrics.get("answer_cache.lookups")
+        hits = metrics.get("answer_cache.hits.exact") + metrics.get("answer_cache.hits.semantic")
+        return {
+            "answer_cache.entries": len(self._entries),
+            "answer_cache.version": self.version,
+            "answer_cache.hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Process-wide answer cache (None if disabled)."""
+    global _answer_cache
+    if not Config.ANSWER_CACHE_ENABLED:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+        return _answer_cache
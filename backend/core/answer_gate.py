@@ -0,0 +1,150 @@
+"""
+No-Answer Gate
+Skips generation when retrieval found nothing relevant. The gate looks at the best
+cross-encoder score and the best RRF score of a general query; when both are below
+thresholds fitted offline on a labeled query set (fit_no_answer_gate.py, written to
+data/no_answer_gate.json) the pipeline returns the fallback message with section
+suggestions instead of calling the LLM.
+
+Modes (NO_ANSWER_GATE):
+- enforce: gated queries skip generation
+- shadow:  the decision is only logged; the LLM still answers and its answer is
+           written to the audit log, to spot false negatives before enforcing
+- off
+
+Every gated query is appended to data/no_answer_audit.jsonl for review
+(`python fit_no_answer_gate.py --audit`).
+"""
+import os
+import json
+import math
+import time
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from .config import Config
+from .index_version import read_index_versions
+from . import metrics
+
+
+NO_ANSWER_MESSAGE = "Based on the available IIITD documents, I don't have specific information about that."
+
+
+class NoAnswerGate:
+    def __init__(self, rerank_threshold: float, rrf_threshold: Optional[float] = None, mode: str = None):
+        self.rerank_threshold = rerank_threshold
+        self.rrf_threshold = rrf_threshold  # None: decide on the rerank score alone
+        self.mode = mode or Config.NO_ANSWER_GATE
+        self._audit_lock = threading.Lock()
+
+    @property
+    def enforced(self) -> bool:
+        return self.mode == "enforce"
+
+    def check(self, top_rerank: float, top_rrf: Optional[float]) -> bool:
+        """True if retrieval is too weak to answer from."""
+        metrics.increment("no_answer_gate.checked")
+        fired = would_fire(top_rerank, top_rrf, self.rerank_threshold, self.rrf_threshold)
+        if fired:
+            metrics.increment("no_answer_gate.fired" if self.enforced else "no_answer_gate.shadow_fired")
+        return fired
+
+    def audit(self, question: str, top_rerank: float, top_rrf: Optional[float],
+              suggestions: List[str], answer: Optional[str] = None):
+        """Append a gated query to the audit log (with the LLM answer in shadow mode)."""
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "mode": self.mode,
+            "question": question,
+            "top_rerank": top_rerank,
+            "top_rrf": top_rrf,
+            "rerank_threshold": self.rerank_threshold,
+            "rrf_threshold": self.rrf_threshold,
+            "suggestions": suggestions,
+            "answer": answer,
+        }
+        try:
+            with self._audit_lock, open(Config.NO_ANSWER_AUDIT_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"  [NoAnswerGate] Could not write audit log: {e}")
+
+
+def would_fire(top_rerank: float, top_rrf: Optional[float],
+               rerank_threshold: float, rrf_threshold: Optional[float]) -> bool:
+    """
+    True if both scores are below their thresholds. An unknown RRF score (None) never
+    fires a gate fitted with an RRF threshold: the rerank score alone was not fitted to decide.
+    """
+    if top_rerank >= rerank_threshold:
+        return False
+    if rrf_threshold is None:
+        return True
+    return top_rrf is not None and top_rrf < rrf_threshold
+
+
+def _cut_points(values: Sequence[float]) -> List[float]:
+    """Candidate thresholds: midpoints between consecutive observed scores, plus one above the max."""
+    values = sorted(set(values))
+    if not values:
+        return []
+    return [(a + b) / 2 for a, b in zip(values, values[1:])] + [math.nextafter(values[-1], math.inf)]
+
+
+def fit_thresholds(samples: Sequence[Tuple[float, float, bool]],
+                   max_false_negative_rate: float = 0.02) -> Dict[str, Any]:
+    """
+    Grid-search thresholds on labeled (top_rerank, top_rrf, answerable) samples.
+    Picks the pair that gates the most unanswerable queries while gating at most
+    `max_false_negative_rate` of the answerable ones (ties: fewer false negatives).
+    """
+    answerable = sum(1 for _, _, ok in samples if ok)
+    unanswerable = len(samples) - answerable
+    rerank_cuts = _cut_points([s[0] for s in samples])
+    rrf_cuts = [None] + _cut_points([s[1] for s in samples])
+
+    best = None
+    for rerank_threshold in rerank_cuts:
+        for rrf_threshold in rrf_cuts:
+            fired = [would_fire(r, f, rerank_threshold, rrf_threshold) for r, f, _ in samples]
+            false_negatives = sum(1 for hit, (_, _, ok) in zip(fired, samples) if hit and ok)
+            true_positives = sum(1 for hit, (_, _, ok) in zip(fired, samples) if hit and not ok)
+            if answerable and false_negatives / answerable > max_false_negative_rate:
+                continue
+            key = (true_positives, -false_negatives)
+            if best is None or key > best[0]:
+                best = (key, rerank_threshold, rrf_threshold, true_positives, false_negatives)
+
+    if best is None or best[3] == 0:
+        return {"rerank_threshold": None, "rrf_threshold": None, "recall": 0.0,
+                "false_negative_rate": 0.0, "n_answerable": answerable, "n_unanswerable": unanswerable}
+    _, rerank_threshold, rrf_threshold, true_positives, false_negatives = best
+    return {
+        "rerank_threshold": rerank_threshold,
+        "rrf_threshold": rrf_threshold,
+        "recall": round(true_positives / unanswerable, 4) if unanswerable else 0.0,
+        "false_negative_rate": round(false_negatives / answerable, 4) if answerable else 0.0,
+        "n_answerable": answerable,
+        "n_unanswerable": unanswerable,
+    }
+
+
+def load_no_answer_gate(path: str = None) -> Optional[NoAnswerGate]:
+    """Gate from the fitted thresholds, or None if disabled or not fitted yet."""
+    if Config.NO_ANSWER_GATE == "off":
+        return None
+    path = path or Config.NO_ANSWER_GATE_PATH
+    if not os.path.exists(path):
+        print("No-answer gate inactive: thresholds not fitted yet (run fit_no_answer_gate.py)")
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            fitted = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not load no-answer gate thresholds: {e}")
+        return None
+    if fitted.get("rerank_threshold") is None:
+        print("No-answer gate inactive: fitted thresholds gate nothing")
+        return None
+    if fitted.get("index_version") != read_index_versions().get("general"):
+        print("Warning: No-answer gate was fitted on another general index version; consider re-fitting")
+    return NoAnswerGate(fitted["rerank_threshold"], fitted.get("rrf_threshold"))
@@ -0,0 +1,473 @@
+"""
+Artifact Bundle Module
+A single versioned, memory-mappable file holding everything the retrievers used to
+unpickle at startup: BM25 lexical indexes, chunk text/metadata and course records.
+
+Layout (little endian):
+  Header:       magic (8s) | schema version (u32) | section count (u32) | reserved (16s)
+  Offset table: one entry per section: name (48s) | dtype (8s) | offset (u64) | length (u64)
+  Sections:     raw payloads, each aligned to 8 bytes
+
+Section dtypes are numpy dtype strings ("<u4", "<f8", ...) for arrays, "json" for small
+JSON documents and "utf8" for string blobs. Arrays are served as read-only views over
+the mmap, so opening is O(sections) and the pages are shared between worker processes.
+"""
+import os
+import io
+import json
+import math
+import mmap
+import shutil
+import struct
+import threading
+from collections.abc import Mapping, Sequence
+from typing import Dict, List, Any, Tuple, Optional
+import numpy as np
+from langchain_core.documents import Document
+from .config import Config
+
+
+MAGIC = b"IIITDART"
+SCHEMA_VERSION = 1
+
+HEADER = struct.Struct("<8sII16s")
+TABLE_ENTRY = struct.Struct("<48s8sQQ")
+ALIGNMENT = 8
+
+# Section prefixes
+GENERAL_LEXICAL = "kb"          # Engine A BM25 + chunk text
+COURSE_LEXICAL = "course_kb"    # Engine B BM25 + course documents
+COURSE_RECORDS = "courses"      # Raw course JSON records + lookup index
+
+
+class ArtifactFormatError(Exception):
+    """Raised when a bundle is missing, corrupt or written with another schema version."""
+
+
+# ============================================================================
+# Reading
+# ============================================================================
+
+class ArtifactBundle:
+    """Read-only view over a memory-mapped artifact bundle."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < HEADER.size:
+            raise ArtifactFormatError(f"{path} is too small to be an artifact bundle")
+        magic, version, count, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ArtifactFormatError(f"{path} is not an artifact bundle")
+        if version != SCHEMA_VERSION:
+            raise ArtifactFormatError(
+                f"{path} has schema version {version}, expected {SCHEMA_VERSION}. Re-run migrate_artifacts.py."
+            )
+        self.schema_version = version
+
+        self.sections: Dict[str, Tuple[str, int, int]] = {}
+        for i in range(count):
+            name, dtype, offset, length = TABLE_ENTRY.unpack_from(self._mmap, HEADER.size + i * TABLE_ENTRY.size)
+            if offset + length > len(self._mmap):
+                raise ArtifactFormatError(f"Section {name!r} extends past end of {path}")
+            self.sections[name.rstrip(b"\0").decode()] = (dtype.rstrip(b"\0").decode(), offset, length)
+
+    def close(self):
+        """Unmap the file. Arrays and raw views handed out before must no longer be in use."""
+        self._mmap.close()
+
+    def __enter__(self) -> "ArtifactBundle":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def has(self, name: str) -> bool:
+        return name in self.sections
+
+    def has_prefix(self, prefix: str) -> bool:
+        return any(name.startswith(prefix + ".") for name in self.sections)
+
+    def _section(self, name: str) -> Tuple[str, int, int]:
+        if name not in self.sections:
+            raise ArtifactFormatError(f"Section '{name}' not found in {self.path}")
+        return self.sections[name]
+
+    def raw(self, name: str) -> memoryview:
+        _, offset, length = self._section(name)
+        return memoryview(self._mmap)[offset:offset + length]
+
+    def array(self, name: str) -> np.ndarray:
+        """Zero-copy, read-only numpy view of an array section."""
+        dtype, offset, length = self._section(name)
+        return np.frombuffer(self._mmap, dtype=np.dtype(dtype), count=length // np.dtype(dtype).itemsize, offset=offset)
+
+    def json(self, name: str) -> Any:
+        return json.loads(bytes(self.raw(name)).decode("utf-8"))
+
+    def strings(self, name: str) -> "StringTable":
+        return StringTable(self, name)
+
+
+class StringTable(Sequence):
+    """Lazily decoded list of strings stored as a utf8 blob plus an offsets array."""
+
+    def __init__(self, bundle: ArtifactBundle, name: str):
+        self._blob = bundle.raw(f"{name}.blob")
+        self._offsets = bundle.array(f"{name}.offsets")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+
+_bundle_cache: Dict[str, Tuple[float, ArtifactBundle]] = {}
+_bundle_lock = threading.Lock()
+
+
+def open_bundle(path: str = None) -> Optional[ArtifactBundle]:
+    """
+    Open (and cache per process) the artifact bundle, or return None if it does not exist.
+    A rewritten bundle (new mtime) is picked up on the next call.
+    """
+    path = path or Config.ARTIFACT_BUNDLE_PATH
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    with _bundle_lock:
+        cached = _bundle_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        bundle = ArtifactBundle(path)
+        _bundle_cache[path] = (mtime, bundle)
+        return bundle
+
+
+# ============================================================================
+# Writing
+# ============================================================================
+
+def pack_strings(name: str, values: List[str]) -> Dict[str, Tuple[str, bytes]]:
+    """Encode a list of strings as '<name>.blob' + '<name>.offsets' sections."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    if encoded:
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return {
+        f"{name}.blob": ("utf8", b"".join(encoded)),
+        f"{name}.offsets": ("<u8", offsets.tobytes()),
+    }
+
+
+def pack_array(values, dtype: str) -> Tuple[str, bytes]:
+    return dtype, np.asarray(values, dtype=np.dtype(dtype)).tobytes()
+
+
+def pack_json(value: Any) -> Tuple[str, bytes]:
+    return "json", json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def write_bundle(path: str, sections: Dict[str, Tuple[str, bytes]]):
+    """
+    Write sections to a new bundle atomically. Processes that already mapped the old
+    file keep reading it until they reopen.
+    """
+    names = sorted(sections)
+    offset = HEADER.size + TABLE_ENTRY.size * len(names)
+    table = []
+    for name in names:
+        offset += -offset % ALIGNMENT
+        table.append((name, sections[name][0], offset, len(sections[name][1])))
+        offset += len(sections[name][1])
+
+    buf = io.BytesIO()
+    buf.write(HEADER.pack(MAGIC, SCHEMA_VERSION, len(names), b""))
+    for name, dtype, section_offset, length in table:
+        buf.write(TABLE_ENTRY.pack(name.encode(), dtype.encode(), section_offset, length))
+    for name, dtype, section_offset, length in table:
+        buf.write(b"\0" * (section_offset - buf.tell()))
+        buf.write(sections[name][1])
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buf.getvalue())
+    os.replace(tmp_path, path)
+
+
+def update_bundle(path: str, prefixes: List[str], sections: Dict[str, Tuple[str, bytes]]):
+    """Replace every section under the given prefixes, keeping the rest of the bundle."""
+    merged = {}
+    if os.path.exists(path):
+        # Unmapped before the file is replaced, so ingestion does not leak a map per run
+        with ArtifactBundle(path) as existing:
+            for name, (dtype, _, _) in existing.sections.items():
+                if not any(name.startswith(p + ".") for p in prefixes):
+                    merged[name] = (dtype, bytes(existing.raw(name)))
+    merged.update(sections)
+    write_bundle(path, merged)
+    print(f"Artifact bundle updated at {path} ({', '.join(prefixes)})")
+
+
+def staging_directory(path: str) -> str:
+    """Empty sibling directory to build a replacement for `path` in (see replace_directory)."""
+    staging = f"{path}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    return staging
+
+
+def replace_directory(staging: str, path: str):
+    """
+    Swap a fully built directory in for `path` (two renames), so a cancelled or failed
+    ingestion never leaves a half-built index at `path`. Processes with files open in
+    the old directory keep reading them until they reopen.
+    """
+    old = f"{path}.old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(staging, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+# ============================================================================
+# Lexical index (BM25)
+# ============================================================================
+
+def tokenize(text: str) -> List[str]:
+    """Same tokenization as LangChain's BM25Retriever default_preprocessing_func."""
+    return text.split()
+
+
+def build_lexical_sections(prefix: str, documents: List[Document],
+                           k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25) -> Dict[str, Tuple[str, bytes]]:
+    """
+    Build BM25 sections equivalent to rank_bm25.BM25Okapi (the scorer behind
+    BM25Retriever) as a CSR postings matrix with precomputed idf.
+    """
+    doc_freqs = []
+    doc_len = []
+    for doc in documents:
+        counts: Dict[str, int] = {}
+        for token in tokenize(doc.page_content):
+            counts[token] = counts.get(token, 0) + 1
+        doc_freqs.append(counts)
+        doc_len.append(sum(counts.values()))
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    for doc_id, counts in enumerate(doc_freqs):
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_id, tf))
+    terms = sorted(postings)
+
+    # idf exactly as BM25Okapi._calc_idf (same summation order): negative idfs are
+    # floored at epsilon * mean idf
+    n_docs = len(documents)
+    idf_by_term = {t: math.log(n_docs - len(p) + 0.5) - math.log(len(p) + 0.5) for t, p in postings.items()}
+    if idf_by_term:
+        floor = epsilon * (sum(idf_by_term.values()) / len(idf_by_term))
+        idf_by_term = {t: (floor if v < 0 else v) for t, v in idf_by_term.items()}
+    idf = [idf_by_term[t] for t in terms]
+
+    indptr = np.zeros(len(terms) + 1, dtype="<u4")
+    indptr[1:] = np.cumsum([len(postings[t]) for t in terms])
+    post_docs = [d for t in terms for d, _ in postings[t]]
+    post_tf = [tf for t in terms for _, tf in postings[t]]
+
+    sections = {
+        f"{prefix}.meta": pack_json({
+            "n_docs": n_docs,
+            "avgdl": (sum(doc_len) / n_docs) if n_docs else 0.0,
+            "k1": k1,
+            "b": b,
+            "epsilon": epsilon,
+        }),
+        f"{prefix}.idf": pack_array(idf, "<f8"),
+        f"{prefix}.doc_len": pack_array(doc_len, "<f8"),
+        f"{prefix}.postings.indptr": ("<u4", indptr.tobytes()),
+        f"{prefix}.postings.docs": pack_array(post_docs, "<u4"),
+        f"{prefix}.postings.tf": pack_array(post_tf, "<f8"),
+    }
+    sections.update(pack_strings(f"{prefix}.terms", terms))
+    sections.update(pack_strings(f"{prefix}.texts", [doc.page_content for doc in documents]))
+    sections.update(pack_strings(f"{prefix}.metadata", [json.dumps(doc.metadata, ensure_ascii=False) for doc in documents]))
+    return sections
+
+
+class BundleBM25Retriever:
+    """
+    Drop-in replacement for the pickled BM25Retriever, scoring directly from the
+    memory-mapped postings. Exposes the same `k` attribute and `invoke(query)` API
+    and returns the same top-k ordering as BM25Okapi.get_top_n.
+    """
+
+    def __init__(self, bundle: ArtifactBundle, prefix: str, k: int = 4):
+        self.k = k
+        self.prefix = prefix
+        meta = bundle.json(f"{prefix}.meta")
+        self.n_docs = meta["n_docs"]
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+        self.idf = bundle.array(f"{prefix}.idf")
+        self.indptr = bundle.array(f"{prefix}.postings.indptr")
+        self.post_docs = bundle.array(f"{prefix}.postings.docs")
+        self.post_tf = bundle.array(f"{prefix}.postings.tf")
+        self.terms = bundle.strings(f"{prefix}.terms")
+        self.texts = bundle.strings(f"{prefix}.texts")
+        self.metadata = bundle.strings(f"{prefix}.metadata")
+        doc_len = bundle.array(f"{prefix}.doc_len")
+        avgdl = meta["avgdl"] or 1.0
+        # Per-document length normalisation, the only per-query-invariant part of BM25
+        self._norm = self.k1 * (1 - self.b + self.b * doc_len / avgdl)
+
+    def _term_id(self, term: str) -> int:
+        """Binary search the sorted term table."""
+        lo, hi = 0, len(self.terms)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.terms[mid] < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self.terms) and self.terms[lo] == term else -1
+
+    def get_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n_docs)
+        for token in tokenize(query):
+            term_id = self._term_id(token)
+            if term_id < 0:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.post_docs[start:end]
+            tf = self.post_tf[start:end]
+            scores[docs] += self.idf[term_id] * (tf * (self.k1 + 1) / (tf + self._norm[docs]))
+        return scores
+
+    def get_document(self, i: int) -> Document:
+        return Document(page_content=self.texts[i], metadata=json.loads(self.metadata[i]))
+
+    def invoke(self, query: str, config=None, **kwargs) -> List[Document]:
+        scores = self.get_scores(query)
+        top_n = np.argsort(scores)[::-1][:self.k]
+        return [self.get_document(int(i)) for i in top_n]
+
+    @property
+    def docs(self) -> List[Document]:
+        return [self.get_document(i) for i in range(self.n_docs)]
+
+
+def load_lexical_retriever(prefix: str, legacy_pickle_path: str, k: int = 4):
+    """
+    Load a BM25 retriever from the artifact bundle, falling back to the legacy pickle
+    for data directories that have not been migrated yet.
+    """
+    bundle = open_bundle()
+    if bundle and bundle.has_prefix(prefix):
+        return BundleBM25Retriever(bundle, prefix, k=k)
+
+    if not os.path.exists(legacy_pickle_path):
+        raise FileNotFoundError("BM25 retriever not found. Run ingestion first.")
+    print(f"Warning: Loading legacy pickle {legacy_pickle_path}. Run migrate_artifacts.py to convert it.")
+    import pickle
+    with open(legacy_pickle_path, "rb") as f:
+        retriever = pickle.load(f)
+    retriever.k = k
+    return retriever
+
+
+# ============================================================================
+# Course records
+# ============================================================================
+
+def build_course_sections(courses: List[Dict], course_index: Dict[str, Any]) -> Dict[str, Tuple[str, bytes]]:
+    """
+    Store course records once and the lookup index as record ids.
+    `course_index` is the structure produced by course_ingestion.build_course_index.
+    """
+    canonical = [json.dumps(c, ensure_ascii=False, sort_keys=True) for c in courses]
+    record_ids = {}
+    for rid, key in enumerate(canonical):
+        record_ids.setdefault(key, rid)
+
+    def rid_of(course):
+        return record_ids[json.dumps(course, ensure_ascii=False, sort_keys=True)]
+
+    index = {
+        "by_code": {code: rid_of(c) for code, c in course_index["by_code"].items()},
+        "by_name": {name: [rid_of(c) for c in cs] for name, cs in course_index["by_name"].items()},
+        "by_instructor": {name: [rid_of(c) for c in cs] for name, cs in course_index["by_instructor"].items()},
+        "all_codes": course_index["all_codes"],
+        "all_names": course_index["all_names"],
+        "all_instructors": list(course_index["all_instructors"]),
+    }
+    sections = {f"{COURSE_RECORDS}.index": pack_json(index)}
+    sections.update(pack_strings(f"{COURSE_RECORDS}.records", canonical))
+    return sections
+
+
+class CourseRecords(Sequence):
+    """Course JSON records decoded on first access and cached per process."""
+
+    def __init__(self, bundle: ArtifactBundle):
+        self._table = bundle.strings(f"{COURSE_RECORDS}.records")
+        self._decoded: Dict[int, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i not in self._decoded:
+            self._decoded[i] = json.loads(self._table[i])
+        return self._decoded[i]
+
+
+class _RecordMapping(Mapping):
+    """Mapping of key -> record id (or list of ids) that resolves to course dicts."""
+
+    def __init__(self, ids: Dict[str, Any], records: CourseRecords):
+        self._ids = ids
+        self._records = records
+
+    def __getitem__(self, key):
+        value = self._ids[key]
+        if isinstance(value, list):
+            return [self._records[rid] for rid in value]
+        return self._records[value]
+
+    def __contains__(self, key) -> bool:
+        return key in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def load_course_index(bundle: ArtifactBundle) -> Tuple[Dict[str, Any], CourseRecords]:
+    """Return (index, records) with the same shape as course_index.pkl / courses_raw.pkl."""
+    records = CourseRecords(bundle)
+    raw = bundle.json(f"{COURSE_RECORDS}.index")
+    index = {
+        "by_code": _RecordMapping(raw["by_code"], records),
+        "by_name": _RecordMapping(raw["by_name"], records),
+        "by_instructor": _RecordMapping(raw["by_instructor"], records),
+        "all_codes": raw["all_codes"],
+        "all_names": raw["all_names"],
+        "all_instructors": raw["all_instructors"],
+    }
+    return index, records
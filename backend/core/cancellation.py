@@ -0,0 +1,82 @@
+"""
+Request Cancellation
+/chat runs the pipeline in a worker thread and sets the request's cancel event when the
+client disconnects (tab closed, frontend timeout). The event is carried in a context
+variable, so the pipeline stages, the reranker and the LLM client can check it without
+threading it through every call:
+- `check(stage)` between stages raises RequestCancelled once the event is set
+- LLM calls made under a cancel event are streamed, and the stream is closed on cancel,
+  which drops the HTTP connection and makes llama-server stop decoding the slot
+
+RequestCancelled derives from BaseException (like asyncio.CancelledError) so the
+`except Exception` fallbacks in the router and engines don't swallow it.
+Counted under chat.cancelled.* in /metrics, with an estimate of the generation tokens saved.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from .config import Config
+from . import metrics
+
+
+GENERATION_STAGES = ("general", "course")
+
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("cancel_event", default=None)
+
+
+class RequestCancelled(BaseException):
+    """Raised inside the pipeline when the client that asked the question has gone."""
+
+    def __init__(self, stage: str, generated_tokens: int = 0):
+        super().__init__(f"Request cancelled during {stage}")
+        self.stage = stage
+        self.generated_tokens = generated_tokens
+
+
+@contextmanager
+def cancellable(cancel_event: threading.Event):
+    """Make `cancel_event` the current request's cancel event for the enclosed block."""
+    token = _cancel_event.set(cancel_event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def current_event() -> Optional[threading.Event]:
+    return _cancel_event.get()
+
+
+def is_cancelled() -> bool:
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def check(stage: str):
+    """Raise RequestCancelled if the current request has been cancelled."""
+    if is_cancelled():
+        raise RequestCancelled(stage)
+
+
+def record_generation(tokens: int):
+    """Record the length of a completed answer (for the tokens-saved estimate)."""
+    metrics.increment("llm.generation.completions")
+    metrics.increment("llm.generation.output_tokens", tokens)
+
+
+def estimate_tokens_saved(cancelled: RequestCancelled) -> float:
+    """Mean answer length minus what was decoded before the cancel (0 if generation had not started)."""
+    completions = metrics.get("llm.generation.completions")
+    mean = metrics.get("llm.generation.output_tokens") / completions if completions \
+        else Config.CANCEL_DEFAULT_GENERATION_TOKENS
+    generated = cancelled.generated_tokens if cancelled.stage in GENERATION_STAGES else 0
+    return max(0.0, mean - generated)
+
+
+def record_cancelled(cancelled: RequestCancelled):
+    saved = estimate_tokens_saved(cancelled)
+    metrics.increment("chat.cancelled")
+    metrics.increment(f"chat.cancelled.stage.{cancelled.stage}")
+    metrics.increment("chat.cancelled.tokens_saved", round(saved))
+    print(f"  [Cancel] Client disconnected during {cancelled.stage}; ~{saved:.0f} generation tokens saved")
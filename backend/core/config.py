@@ -3,12 +3,20 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _env_list(name: str, default: str = "") -> list:
+    """Comma-separated env var as a list (empty / "null" entries dropped)."""
+    return [item.strip() for item in os.getenv(name, default or "").split(",")
+            if item.strip() and item.strip().lower() != "null"]
+
+
 class Config:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     LOCAL_MODEL_API = os.getenv("LOCAL_MODEL_API")
     LOCAL_MODEL_NAME = os.getenv("LOCAL_MODEL_NAME")
     
     CHROMA_PERSIST_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "chroma_db")
+    ARTIFACT_BUNDLE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "artifacts.bin")
     KNOWLEDGE_BASE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "iiitd_kb_master.md")
     EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2" # Open source embedding
     RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2" # Open source reranker (if using cross-encoder)
@@ -16,3 +24,156 @@ class Config:
     # Retrieval settings
     TOP_K_RETRIEVAL = 30
     TOP_K_RERANK = 15
+
+    # Chunking settings (tokens of the embedding model's tokenizer)
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "250"))  # MiniLM truncates at 256
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+    CHUNK_MIN_CONTENT_TOKENS = 64  # Floor for very long header paths
+    
+    # Ingestion job settings
+    INGEST_BATCH_SIZE = 32  # Chunks embedded per batch (progress/cancellation granularity)
+    INGEST_CANCEL_GRACE_SECONDS = 10
+    INGEST_JOB_HISTORY = 20
+    INGEST_JOBS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "ingest_jobs.sqlite3")
+
+    # Pre-fork serving (serve.py)
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+    TORCH_THREADS_PER_WORKER = int(os.getenv("TORCH_THREADS_PER_WORKER", "0"))  # 0 = cores / workers
+    SERVE_PID_FILE = os.getenv("SERVE_PID_FILE", "/tmp/iiitd-chatbot-serve.json")
+
+    # Local intent classifier (skips the router LLM call for confident queries)
+    LOCAL_INTENT_CLASSIFIER = os.getenv("LOCAL_INTENT_CLASSIFIER", "true").lower() == "true"
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+    INTENT_SKIP_RETRIEVAL_THRESHOLD = 0.9  # Stricter bar for greeting/off_topic (no retrieval)
+    INTENT_KNN_K = 7
+    INTENT_KNN_TEMPERATURE = 0.05
+    INTENT_COURSE_CODE_BONUS = 1.0
+    INTENT_COURSE_KEYWORD_BONUS = 0.3
+
+    # Section selector (embedding centroids per Header 1 / Header 2, built at ingestion)
+    SECTION_CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "section_centroids.npz")
+    SECTION_SELECTOR_TOP_N = 2  # Max sections in the scoped filter
+    SECTION_SELECTOR_MARGIN = 0.05  # Keep sections scoring within this of the best one
+    SECTION_SELECTOR_MIN_SIMILARITY = 0.2
+
+    # Condense follow-ups and route them in one structured LLM call (instead of two)
+    COMBINED_CONDENSE_ROUTE = os.getenv("COMBINED_CONDENSE_ROUTE", "false").lower() == "true"
+
+    # Speculative retrieval: run Engine A prefetch and Engine B Tiers 1-3 while the router runs
+    SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+    SPECULATIVE_MAX_REQUESTS = int(os.getenv("SPECULATIVE_MAX_REQUESTS", "8"))  # Requests speculating at once; others skip it
+
+    # llama-server prompt caching (local model only). With LLAMA_PIN_SLOTS each chain keeps
+    # its static prompt prefix in its own slot (server started with `-np 4`), at the cost of
+    # serializing concurrent requests of the same chain on that slot; off by default so the
+    # server picks a free slot by prompt similarity.
+    LLAMA_PROMPT_CACHE = os.getenv("LLAMA_PROMPT_CACHE", "true").lower() == "true"
+    LLAMA_PIN_SLOTS = os.getenv("LLAMA_PIN_SLOTS", "false").lower() == "true"
+    LLAMA_SLOTS = {"router": 0, "condense": 1, "general": 2, "course": 3}
+
+    # LLM client: one keep-alive connection pool per worker, per-stage timeouts (seconds)
+    # and retries with jittered exponential backoff (core/llm_client.py)
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+    LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+    LLM_STAGE_TIMEOUTS = {"router": 10, "condense": 10, "greeting": 10, "summary": 20, "general": 90, "course": 90}
+    LLM_STAGE_RETRIES = {"router": 2, "condense": 2, "greeting": 1, "summary": 1, "general": 1, "course": 1}
+    LLM_RETRY_BACKOFF_SECONDS = 0.25  # Base delay, doubled per attempt (full jitter)
+    # Hedging: resend a short call that is slower than its recent p95 and take the first answer
+    LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+    LLM_HEDGE_STAGES = ("router", "condense")
+    LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))  # Until the stage has 20 samples
+    LLM_HEDGE_MIN_DELAY = 0.5
+
+    # LLM backend pool (core/llm_pool.py): comma-separated OpenAI-compatible base URLs,
+    # least-outstanding-requests balancing; defaults to LOCAL_MODEL_API. Router/condense
+    # calls go to LLM_FAST_BACKENDS (a smaller model) when set
+    LLM_BACKENDS = _env_list("LLM_BACKENDS", os.getenv("LOCAL_MODEL_API"))
+    LLM_FAST_BACKENDS = _env_list("LLM_FAST_BACKENDS")
+    LLM_FAST_MODEL_NAME = os.getenv("LLM_FAST_MODEL_NAME")
+    LLM_FAST_STAGES = ("router", "condense")
+    LLM_BACKEND_MAX_FAILURES = int(os.getenv("LLM_BACKEND_MAX_FAILURES", "3"))  # Consecutive, before eviction
+    # In-flight calls a stage's preferred backend may have above the least-loaded one
+    LLM_AFFINITY_MAX_EXTRA = int(os.getenv("LLM_AFFINITY_MAX_EXTRA", "2"))
+    LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "10"))  # Seconds between /health probes
+
+    # Cancel /chat work (retrieval, LLM decoding) when the client disconnects
+    CANCEL_ON_DISCONNECT = os.getenv("CANCEL_ON_DISCONNECT", "true").lower() == "true"
+    CANCEL_POLL_INTERVAL = 0.25  # Seconds between disconnect checks
+    CANCEL_DEFAULT_GENERATION_TOKENS = 300  # Tokens-saved estimate until answers have been measured
+
+    # Router output: JSON-schema constrained decoding on llama-server plus hard token caps
+    LLAMA_CONSTRAINED_ROUTER = os.getenv("LLAMA_CONSTRAINED_ROUTER", "true").lower() == "true"
+    ROUTER_MAX_TOKENS = 96
+    CONDENSE_ROUTE_MAX_TOKENS = 192  # Includes the rewritten question
+
+    # Answer cache (exact + semantic tier), invalidated when ingestion bumps the index version
+    INDEX_VERSION_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "index_version.json")
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() == "true"
+    ANSWER_CACHE_SEMANTIC_THRESHOLD = 0.95  # MiniLM cosine similarity
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(6 * 3600)))
+
+    # Retrieval cache: per-process LRU in front of a SQLite file shared by all workers
+    RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+    RETRIEVAL_CACHE_DISK = os.getenv("RETRIEVAL_CACHE_DISK", "true").lower() == "true"
+    RETRIEVAL_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "retrieval_cache.sqlite3")
+    RETRIEVAL_CACHE_MEMORY_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MEMORY_ENTRIES", "2000"))
+    RETRIEVAL_CACHE_DISK_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_DISK_MAX_ENTRIES", "50000"))
+
+    # Cross-encoder score cache keyed by (model, query, chunk); ~250 bytes per entry
+    RERANK_CACHE_ENABLED = os.getenv("RERANK_CACHE_ENABLED", "true").lower() == "true"
+    RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "20000"))
+
+    # Adaptive reranking: candidate budget from RRF scores, mini-batches with early exit
+    ADAPTIVE_RERANK = os.getenv("ADAPTIVE_RERANK", "true").lower() == "true"
+    RERANK_MIN_EXTRA = 15  # Always rerank at least TOP_K_RERANK + this many candidates
+    RERANK_RRF_RATIO = 0.5  # Rerank every doc within this fraction of the best RRF score
+    RERANK_BATCH_SIZE = 8
+    RERANK_STABLE_MARGIN = 2.0  # Cross-encoder logits: stop when a batch's best trails the k-th by this
+
+    # No-answer gate: skip generation when the best rerank/RRF scores are below thresholds
+    # fitted by fit_no_answer_gate.py (inactive until fitted). enforce | shadow | off
+    NO_ANSWER_GATE = os.getenv("NO_ANSWER_GATE", "enforce").lower()
+    NO_ANSWER_GATE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "no_answer_gate.json")
+    NO_ANSWER_AUDIT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "no_answer_audit.jsonl")
+    NO_ANSWER_MAX_FALSE_NEGATIVE_RATE = 0.02  # Share of answerable queries the fit may gate
+
+    # Server-side chat sessions: bounded history for the condenser, older turns summarized
+    SESSIONS_ENABLED = os.getenv("SESSIONS_ENABLED", "true").lower() == "true"
+    # SQLite store shared by pre-fork workers; "auto" uses it when WEB_CONCURRENCY > 1
+    SESSION_STORE_DISK = os.getenv("SESSION_STORE_DISK", "auto").lower()
+    SESSION_STORE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "sessions.sqlite3")
+    SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+    SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))  # Idle time before a session expires
+    SESSION_HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "3"))  # Turns kept verbatim
+    SESSION_HISTORY_TOKEN_BUDGET = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "600"))
+    SESSION_ANSWER_MAX_TOKENS = 150  # Answers are clipped in the history; the condenser needs the topic only
+    SESSION_SUMMARY_MAX_TOKENS = 200
+    # Follow-ups on the same courses / topic reuse the previous turn's working set
+    SESSION_REUSE = os.getenv("SESSION_REUSE", "true").lower() == "true"
+    SESSION_REUSE_SIMILARITY = float(os.getenv("SESSION_REUSE_SIMILARITY", "0.8"))  # MiniLM cosine between standalone questions
+
+    # Standalone detector: skip the condenser LLM call for self-contained follow-ups
+    STANDALONE_DETECTOR = os.getenv("STANDALONE_DETECTOR", "true").lower() == "true"
+    STANDALONE_SIMILARITY_THRESHOLD = float(os.getenv("STANDALONE_SIMILARITY_THRESHOLD", "0.45"))  # MiniLM cosine to the previous question
+
+    # Greetings: templated replies (template) or an LLM call per greeting (llm)
+    GREETING_MODE = os.getenv("GREETING_MODE", "template").lower()
+    GREETING_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "greeting_templates.json")
+
+    # Course facts: answer single-field course lookups (credits, prerequisites, ...)
+    # from the course record with templates, skipping the router and generation LLM
+    COURSE_FACTS = os.getenv("COURSE_FACTS", "true").lower() == "true"
+
+    # Context packing: token budget for the generation prompt's context (target LLM tokens)
+    CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "true").lower() == "true"
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+    COURSE_CONTEXT_TOKEN_BUDGET = int(os.getenv("COURSE_CONTEXT_TOKEN_BUDGET", "2000"))
+    CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")  # e.g. Qwen/Qwen3-14B; empty = estimate
+    CONTEXT_CHARS_PER_TOKEN = 3.5
+    CONTEXT_DEDUP_THRESHOLD = 0.95  # MiniLM cosine between chunks (the stored index vectors)
+    CONTEXT_TRIM_SENTENCES = os.getenv("CONTEXT_TRIM_SENTENCES", "true").lower() == "true"
+    CONTEXT_MIN_TRIMMED_TOKENS = 40  # Don't bother trimming into a smaller remainder
+    CONTEXT_VECTOR_CACHE_SIZE = 5000
@@ -0,0 +1,284 @@
+"""
+Context Packer
+Builds the generation context under a token budget for the target LLM instead of
+sending every retrieved chunk verbatim:
+- Greedy packing in rerank-score order until the budget is used
+- Chunks sharing a header path are grouped under one header line (the repeated
+  "Context: ... Content:" prefixes are dropped)
+- Near-duplicate chunks (embedding cosine above a threshold) are dropped, using the
+  chunk vectors already stored in Chroma (loaded once; only chunks missing from the
+  index are embedded)
+- Optionally, a chunk that does not fit is trimmed to its sentences with the most
+  query-term overlap (kept in their original order)
+
+Token counts use the target model's tokenizer if CONTEXT_TOKENIZER names one
+(needs `transformers`), otherwise a characters-per-token estimate.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from .config import Config
+from .retrieval_cache import chunk_id
+from . import metrics
+
+
+_HEADER_PATTERN = re.compile(r"^Context: (.*?)\nContent: ", re.DOTALL)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+(?=[A-Z*(\"'])")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "are", "what", "which", "who", "how", "when", "where", "does",
+    "is", "of", "to", "in", "a", "an", "on", "at", "by", "with", "about", "tell", "me",
+    "can", "there", "any", "iiitd", "iiit", "delhi",
+}
+_COURSE_IDENTITY_LINES = ("=== Course", "Code:", "Name:", "Credits:")
+
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens_before: int  # Tokens of the unpacked context
+    tokens_after: int
+    kept: int
+    dropped_duplicates: int
+    dropped_budget: int
+    trimmed: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_before - self.tokens_after)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_saved,
+            "chunks_kept": self.kept,
+            "chunks_dropped_duplicate": self.dropped_duplicates,
+            "chunks_dropped_budget": self.dropped_budget,
+            "chunks_trimmed": self.trimmed,
+        }
+
+
+def load_context_token_counter() -> Callable[[str], int]:
+    """Token counter for the generation model (tokenizer if configured, else an estimate)."""
+    if Config.CONTEXT_TOKENIZER:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(Config.CONTEXT_TOKENIZER)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            print(f"Warning: Could not load tokenizer {Config.CONTEXT_TOKENIZER}, estimating tokens: {e}")
+    chars_per_token = Config.CONTEXT_CHARS_PER_TOKEN
+    return lambda text: int(len(text) / chars_per_token) + 1
+
+
+def split_header(text: str) -> Tuple[str, str]:
+    """('Section > Subsection', content) for a chunk with the ingestion header prefix."""
+    match = _HEADER_PATTERN.match(text)
+    if not match:
+        return "", text
+    return match.group(1).strip(), text[match.end():]
+
+
+def _query_terms(question: str) -> set:
+    return {w for w in _WORD.findall(question.lower()) if w not in _STOPWORDS and len(w) > 1}
+
+
+def _units(text: str) -> List[str]:
+    """Lines, with long prose lines split further into sentences."""
+    units = []
+    for line in text.split("\n"):
+        if not line.strip():
+            continue
+        units.extend(_SENTENCE_SPLIT.split(line) if len(line) > 200 else [line])
+    return units
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+class ContextPacker:
+    def __init__(self, embeddings=None, count_tokens: Callable[[str], int] = None, vectorstore=None):
+        self.embeddings = embeddings
+        self.count_tokens = count_tokens or load_context_token_counter()
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()  # chunk id -> normalized embedding
+        self._lock = threading.Lock()
+        # Chunk id -> row of the stored vectors (built in the pre-fork parent, shared by workers)
+        self._stored_rows: Dict[str, int] = {}
+        self._stored = np.zeros((0, 0), dtype=np.float32)
+        if vectorstore is not None:
+            self._load_stored_vectors(vectorstore)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _load_stored_vectors(self, vectorstore, batch_size: int = 1000):
+        """Read every chunk's embedding from the vector store, keyed by chunk id."""
+        rows, vectors = {}, []
+        offset = 0
+        try:
+            while True:
+                page = vectorstore.get(include=["embeddings", "documents"], limit=batch_size, offset=offset)
+                embeddings = page.get("embeddings")
+                if embeddings is None or len(embeddings) == 0:
+                    break
+                for text, vector in zip(page["documents"], embeddings):
+                    rows.setdefault(chunk_id(text), len(vectors))
+                    vectors.append(vector)
+                offset += len(embeddings)
+        except Exception as e:
+            print(f"Warning: Could not load chunk vectors for context dedup, embedding per request: {e}")
+            return
+        if vectors:
+            self._stored = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+            self._stored_rows = rows
+
+    def _chunk_vectors(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Normalized embeddings for chunk texts: the stored index vectors, else computed
+        (and cached by chunk id; chunks are static per index).
+        """
+        ids = [chunk_id(text) for text in texts]
+        if all(cid in self._stored_rows for cid in ids):
+            return self._stored[[self._stored_rows[cid] for cid in ids]]
+        if self.embeddings is None:
+            return None
+        with self._lock:
+            missing = [i for i, cid in enumerate(ids) if cid not in self._vectors and cid not in self._stored_rows]
+        if missing:
+            vectors = _normalize_rows(np.asarray(self.embeddings.embed_documents([texts[i] for i in missing]), dtype=np.float32))
+            with self._lock:
+                for i, vector in zip(missing, vectors):
+                    self._vectors[ids[i]] = vector
+                while len(self._vectors) > Config.CONTEXT_VECTOR_CACHE_SIZE:
+                    self._vectors.popitem(last=False)
+        with self._lock:
+            return np.stack([
+                self._stored[self._stored_rows[cid]] if cid in self._stored_rows else self._vectors[cid]
+                for cid in ids
+            ])
+
+    def trim(self, text: str, question: str, budget: int, keep_prefixes: Tuple[str, ...] = ()) -> str:
+        """
+        Keep the units (lines/sentences) with the most query-term overlap that fit in
+        `budget` tokens, in their original order. Units starting with `keep_prefixes`
+        are always kept first.
+        """
+        terms = _query_terms(question)
+        units = _units(text)
+        pinned = [i for i, unit in enumerate(units) if unit.lstrip().startswith(keep_prefixes)] if keep_prefixes else []
+        ranked = sorted(
+            (i for i in range(len(units)) if i not in pinned),
+            key=lambda i: (-len(terms & set(_WORD.findall(units[i].lower()))), i)
+        )
+        kept, used = [], 0
+        for i in pinned + ranked:
+            cost = self.count_tokens(units[i]) + 1
+            if used + cost > budget:
+                if i in pinned:
+                    continue
+                break
+            kept.append(i)
+            used += cost
+        return "\n".join(units[i] for i in sorted(kept))
+
+    # ------------------------------------------------------------------
+    # General documents
+    # ------------------------------------------------------------------
+
+    def pack_documents(self, question: str, scored_docs: List[Tuple[Document, float]],
+                       budget: int = None) -> PackedContext:
+        """Pack reranked (doc, score) pairs, best first, into a grouped context string."""
+        budget = budget or Config.CONTEXT_TOKEN_BUDGET
+        docs = [doc for doc, _ in sorted(scored_docs, key=lambda x: x[1], reverse=True)]
+        verbatim = "\n\n".join(f"Document {i+1}:\n{doc.page_content}" for i, doc in enumerate(docs))
+        tokens_before = self.count_tokens(verbatim)
+
+        parts = [split_header(doc.page_content) for doc in docs]
+        vectors = self._chunk_vectors([doc.page_content for doc in docs]) if docs else None
+
+        groups: "OrderedDict[str, List[str]]" = OrderedDict()  # header path -> contents, in score order
+        kept_indices: List[int] = []
+        used = 0
+        dropped_duplicates = dropped_budget = trimmed = 0
+        for i, (path, content) in enumerate(parts):
+            if vectors is not None and kept_indices:
+                if float(np.max(vectors[kept_indices] @ vectors[i])) >= Config.CONTEXT_DEDUP_THRESHOLD:
+                    dropped_duplicates += 1
+                    continue
+
+            header_cost = 0 if path in groups else self.count_tokens(f"Document {len(groups)+1} ({path}):") + 1
+            cost = header_cost + self.count_tokens(content) + 1
+            if used + cost > budget:
+                remaining = budget - used - header_cost
+                if not Config.CONTEXT_TRIM_SENTENCES or remaining < Config.CONTEXT_MIN_TRIMMED_TOKENS:
+                    dropped_budget += 1
+                    continue
+                content = self.trim(content, question, remaining)
+                if not content:
+                    dropped_budget += 1
+                    continue
+                cost = header_cost + self.count_tokens(content) + 1
+                trimmed += 1
+
+            groups.setdefault(path, []).append(content.strip())
+            kept_indices.append(i)
+            used += cost
+
+        blocks = []
+        for n, (path, contents) in enumerate(groups.items(), start=1):
+            title = f"Document {n} ({path}):" if path else f"Document {n}:"
+            blocks.append(title + "\n" + "\n\n".join(contents))
+        text = "\n\n".join(blocks)
+        return self._report(PackedContext(
+            text, tokens_before, self.count_tokens(text), len(kept_indices),
+            dropped_duplicates, dropped_budget, trimmed
+        ))
+
+    # ------------------------------------------------------------------
+    # Courses
+    # ------------------------------------------------------------------
+
+    def pack_courses(self, question: str, course_blocks: List[str], budget: int = None) -> PackedContext:
+        """
+        Pack formatted course blocks (best first). Blocks that do not fit are trimmed to
+        their identity lines (code, name, credits) plus the lines most relevant to the query.
+        """
+        budget = budget or Config.COURSE_CONTEXT_TOKEN_BUDGET
+        tokens_before = self.count_tokens("\n\n".join(course_blocks))
+
+        kept, used, dropped_budget, trimmed = [], 0, 0, 0
+        for block in course_blocks:
+            cost = self.count_tokens(block) + 2
+            if used + cost > budget:
+                remaining = budget - used
+                if remaining < Config.CONTEXT_MIN_TRIMMED_TOKENS:
+                    dropped_budget += 1
+                    continue
+                block = self.trim(block, question, remaining, keep_prefixes=_COURSE_IDENTITY_LINES)
+                cost = self.count_tokens(block) + 2
+                trimmed += 1
+            kept.append(block)
+            used += cost
+
+        text = "\n\n".join(kept)
+        return self._report(PackedContext(
+            text, tokens_before, self.count_tokens(text), len(kept), 0, dropped_budget, trimmed
+        ))
+
+    def _report(self, packed: PackedContext) -> PackedContext:
+        metrics.increment("context.requests")
+        metrics.increment("context.tokens_before", packed.tokens_before)
+        metrics.increment("context.tokens_after", packed.tokens_after)
+        metrics.increment("context.tokens_saved", packed.tokens_saved)
+        metrics.increment("context.chunks_dropped_duplicate", packed.dropped_duplicates)
+        metrics.increment("context.chunks_dropped_budget", packed.dropped_budget)
+        metrics.increment("context.chunks_trimmed", packed.trimmed)
+        print(f"  [ContextPacker] {packed.tokens_before} -> {packed.tokens_after} tokens "
+              f"(saved {packed.tokens_saved}; kept {packed.kept}, duplicates {packed.dropped_duplicates}, "
+              f"over budget {packed.dropped_budget}, trimmed {packed.trimmed})")
+        return packed
@@ -0,0 +1,260 @@
+"""
+Course Fact Engine
+Answers single-field questions about specific courses ("how many credits is CSE546",
+"prerequisites of ECE315", "who teaches MTH100") straight from the course record,
+without routing, retrieval formatting or generation.
+
+A question qualifies when it names 1-3 exact course codes (Tier 1 lookup), asks for
+known fields only and has no open-ended cue ("why", "compare", "tell me about", ...).
+Several codes must be a plain enumeration ("credits of CSE101 and CSE201"); a question
+relating them ("is CSE101 a prerequisite for CSE201?") goes to the LLM.
+Fields are normalized from the messy course JSONs; when a requested field cannot be
+normalized reliably the engine declines and the question goes to the LLM as before.
+"""
+import re
+from typing import Any, Dict, List, Optional
+from .course_ingestion import normalize_course_code, extract_instructor
+from .working_set import code_parts
+from . import metrics
+
+
+FACT_PATTERNS = {
+    "credits": re.compile(r"\bcredits?\b|\bcredit hours?\b", re.IGNORECASE),
+    "prerequisites": re.compile(r"\bpre-?\s?req|\bprerequisite|\bpre-requisite|\brequired before\b", re.IGNORECASE),
+    "offered_to": re.compile(r"\boffered to\b|\bopen to\b|\bwho can (take|enrol+|register)\b|\beligible\b", re.IGNORECASE),
+    "assessment": re.compile(r"\bassessment\b|\bevaluation\b|\bgrading\b|\bweightage\b|\bmarks? (distribution|breakdown|split)\b|\bevaluated\b", re.IGNORECASE),
+    "textbook": re.compile(r"\btext ?books?\b|\breference books?\b|\bbooks?\b|\breading material", re.IGNORECASE),
+    "instructor": re.compile(r"\bwho teaches\b|\binstructors?\b|\bprofessor\b|\bfaculty\b|\btaught by\b|\bwho is teaching\b", re.IGNORECASE),
+    "name": re.compile(r"\bname of\b|\bwhat is the name\b|\bcourse name\b|\bwhat is \w{2,4}\s?\d{3}[a-z]? called\b", re.IGNORECASE),
+}
+
+# Questions needing explanation or synthesis always go to the LLM
+OPEN_ENDED_PATTERN = re.compile(
+    r"\bwhy\b|\bexplain\b|\bcompare\b|\bdifference\b|\bvs\.?\b|\bshould i\b|\bworth\b|\bhard\b|\bdifficult\b|"
+    r"\beasy\b|\brecommend|\bsummar|\bdescribe\b|\btell me\b|\btopics?\b|\bsyllabus\b|\boutcomes?\b|\bcover\b|\bif\b",
+    re.IGNORECASE
+)
+
+MAX_COURSES = 3
+# Text allowed between two course codes of an enumeration
+_ENUMERATION_GAP = re.compile(r"\s*(,|&|/)?\s*((and|or)\s+)?(also\s+)?", re.IGNORECASE)
+_PLACEHOLDERS = {"", "none", "nil", "na", "n/a", "-", "pre-requisite", "pre-requisites", "prerequisite", "prerequisites"}
+
+
+# ============================================================================
+# Field normalization
+# ============================================================================
+
+def _text(value: Any) -> str:
+    if isinstance(value, list):
+        return ", ".join(_text(v) for v in value if _text(v))
+    if isinstance(value, dict):
+        return ", ".join(f"{k}: {_text(v)}" for k, v in value.items() if _text(v))
+    return "" if value is None else re.sub(r"\s+", " ", str(value)).strip()
+
+
+def _items(value: Any) -> List[str]:
+    """Non-placeholder strings from a string or list field."""
+    values = value if isinstance(value, list) else [value]
+    items = []
+    for v in values:
+        if isinstance(v, dict) and v.get("Title"):
+            v = v["Title"]  # {"Source"/"Type": ..., "Title": ...} book entries
+        text = _text(v)
+        if text.lower().strip(" .:") not in _PLACEHOLDERS and text not in items:
+            items.append(text)
+    return items
+
+
+def normalize_credits(course: Dict) -> Optional[str]:
+    match = re.search(r"\d+(\.\d+)?", _text(course.get("Credits")))
+    return match.group(0) if match else None
+
+
+def normalize_offered_to(course: Dict) -> Optional[str]:
+    return _text(course.get("Course Offered to")) or None
+
+
+def normalize_prerequisites(course: Dict) -> Dict[str, List[str]]:
+    """{"Mandatory": [...], "Desirable": [...], "Other": [...]} without empty kinds ({} = none listed)."""
+    prereqs = course.get("Prerequisites")
+    if isinstance(prereqs, dict):
+        kinds = {kind: _items(prereqs.get(kind)) for kind in ("Mandatory", "Desirable", "Other")}
+    else:
+        kinds = {"Mandatory": _items(prereqs)}
+    return {kind: items for kind, items in kinds.items() if items}
+
+
+def normalize_assessment(course: Dict) -> Optional[List[tuple]]:
+    """[(component, percent)], or None if the plan cannot be parsed into percentages summing to ~100."""
+    plan = course.get("Assessment Plan")
+    if isinstance(plan, dict):
+        rows = list(plan.items())
+    elif isinstance(plan, list):
+        rows = []
+        for entry in plan:
+            if not isinstance(entry, dict):
+                return None
+            name = next((v for k, v in entry.items() if "type" in k.lower()), None)
+            share = next((v for k, v in entry.items() if "%" in k or "contribution" in k.lower()), None)
+            rows.append((name, share))
+    else:
+        return None
+
+    components = []
+    for name, share in rows:
+        match = re.fullmatch(r"\s*(\d+(\.\d+)?)\s*%?\s*", str(share))
+        if not name or not match:
+            return None
+        components.append((_text(name), float(match.group(1))))
+    total = sum(share for _, share in components)
+    if not components or not 95 <= total <= 105:
+        return None
+    return components
+
+
+def normalize_books(course: Dict) -> Dict[str, List[str]]:
+    """{"Textbook": [...], "Reference Book": [...], "Resource": [...]} without empty kinds."""
+    material = course.get("Resource Material")
+    books: Dict[str, List[str]] = {}
+    if isinstance(material, dict):
+        for kind, value in material.items():
+            books.setdefault(kind, []).extend(_items(value))
+    elif isinstance(material, list):
+        for entry in material:
+            if isinstance(entry, dict):
+                kind = _text(entry.get("Type")) or "Resource"
+                books.setdefault(kind, []).extend(_items(entry.get("Title")))
+            else:
+                books.setdefault("Resource", []).extend(_items(entry))
+    return {kind: items for kind, items in books.items() if items}
+
+
+# ============================================================================
+# Engine
+# ============================================================================
+
+class CourseFactEngine:
+    def __init__(self, course_retriever):
+        self.course_retriever = course_retriever
+        self.by_code = course_retriever.index["by_code"]
+        self.aliases = self._code_aliases(self.by_code)
+
+    @staticmethod
+    def _code_aliases(by_code: Dict[str, Dict]) -> Dict[str, str]:
+        """
+        Each part of cross-listed codes -> the stored code ("CSE441" -> "CSE441/541").
+        Built from the keys only, so no course record is decoded until it is asked for.
+        """
+        aliases = {}
+        for stored_code in by_code:
+            for part in code_parts(stored_code):
+                if part not in by_code:
+                    aliases.setdefault(part, stored_code)
+        return aliases
+
+    def lookup(self, code: str) -> Optional[Dict]:
+        stored_code = code if code in self.by_code else self.aliases.get(code)
+        return self.by_code[stored_code] if stored_code is not None else None
+
+    def detect_fields(self, question: str) -> List[str]:
+        """Requested fields, or [] if the question is open-ended or asks for nothing we template."""
+        if OPEN_ENDED_PATTERN.search(question):
+            return []
+        return [field for field, pattern in FACT_PATTERNS.items() if pattern.search(question)]
+
+    def match_courses(self, question: str) -> List[Dict]:
+        """Exact course-code matches (Tier 1 without wildcards), in order of mention."""
+        courses = []
+        for dept, num in self.course_retriever.code_pattern.findall(question):
+            course = self.lookup(normalize_course_code(f"{dept}{num}"))
+            if course is not None and not any(course.get("Course Code") == seen.get("Course Code") for seen in courses):
+                courses.append(course)
+        return courses
+
+    def is_enumeration(self, question: str) -> bool:
+        """True unless the question relates course codes to each other (words between two codes)."""
+        matches = list(self.course_retriever.code_pattern.finditer(question))
+        return all(
+            _ENUMERATION_GAP.fullmatch(question[a.end():b.start()])
+            for a, b in zip(matches, matches[1:])
+        )
+
+    def answer(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Templated answer for a structured course-fact question.
+
+        Returns:
+            {"answer", "courses", "fields"} or None if the question needs the LLM
+        """
+        fields = self.detect_fields(question)
+        if not fields:
+            return None
+        courses = self.match_courses(question)
+        if not courses or len(courses) > MAX_COURSES:
+            return None
+        if len(courses) > 1 and not self.is_enumeration(question):
+            metrics.increment("course_facts.relational")
+            return None
+
+        parts = []
+        for course in courses:
+            for field in fields:
+                rendered = self.render(field, course)
+                if rendered is None:
+                    metrics.increment("course_facts.declined")
+                    print(f"  [CourseFacts] '{field}' of {course.get('Course Code')} not normalizable, using LLM")
+                    return None
+                parts.append(rendered)
+
+        metrics.increment("course_facts.answered")
+        for field in fields:
+            metrics.increment(f"course_facts.field.{field}")
+        return {"answer": "\n\n".join(parts), "courses": courses, "fields": fields}
+
+    def render(self, field: str, course: Dict) -> Optional[str]:
+        label = f"{_text(course.get('Course Code'))} ({_text(course.get('Course Name'))})"
+
+        if field == "credits":
+            credits = normalize_credits(course)
+            return f"**{label}** is a {credits}-credit course." if credits else None
+
+        if field == "offered_to":
+            offered_to = normalize_offered_to(course)
+            return f"**{label}** is offered to: {offered_to}." if offered_to else None
+
+        if field == "prerequisites":
+            prereqs = normalize_prerequisites(course)
+            if not prereqs:
+                return f"No prerequisites are listed for **{label}**."
+            lines = [f"**Prerequisites for {label}:**"]
+            lines += [f"- {kind}: {'; '.join(items)}" for kind, items in prereqs.items()]
+            return "\n".join(lines)
+
+        if field == "assessment":
+            components = normalize_assessment(course)
+            if components is None:
+                return None
+            lines = [f"**Assessment plan for {label}:**"]
+            lines += [f"- {name}: {share:g}%" for name, share in components]
+            return "\n".join(lines)
+
+        if field == "textbook":
+            books = normalize_books(course)
+            if not books:
+                return f"No books are listed for **{label}**."
+            lines = [f"**Books for {label}:**"]
+            for kind, items in books.items():
+                lines += [f"- {kind}: {item}" for item in items]
+            return "\n".join(lines)
+
+        if field == "instructor":
+            instructor = extract_instructor(course)
+            if not instructor:
+                return f"The course record for **{label}** does not list an instructor."
+            return f"**{label}** is taught by {instructor}."
+
+        if field == "name":
+            return f"{_text(course.get('Course Code'))} is **{_text(course.get('Course Name'))}**."
+
+        return None
@@ -4,14 +4,18 @@ Ingests course JSONs into a separate vector collection and builds in-memory inde
 """
 import os
 import json
-import pickle
 import re
+import shutil
 from typing import Dict, List, Any, Optional
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 from .config import Config
+from .artifacts import (
+    update_bundle, build_lexical_sections, build_course_sections, replace_directory, staging_directory,
+    COURSE_LEXICAL, COURSE_RECORDS
+)
+from .index_version import bump_index_version
 
 
 def normalize_course_code(code) -> str:
@@ -128,33 +132,38 @@ def json_to_text(course_data: Dict) -> str:
     return '\n'.join(lines)
 
 
-def load_course_jsons(jsons_dir: str) -> List[Dict[str, Any]]:
+def _noop_progress(**fields):
+    pass
+
+
+def load_course_jsons(jsons_dir: str, progress=None) -> List[Dict[str, Any]]:
     """
     Load all course JSON files from directory.
     Skips error files (*_error.txt).
     """
+    progress = progress or _noop_progress
     courses = []
     
     if not os.path.exists(jsons_dir):
         print(f"Warning: JSON directory not found: {jsons_dir}")
         return courses
     
-    for filename in os.listdir(jsons_dir):
-        # Skip error files
-        if filename.endswith('_error.txt') or filename.endswith('.txt'):
-            continue
-        
-        if filename.endswith('.json'):
-            filepath = os.path.join(jsons_dir, filename)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    data['_source_file'] = filename
-                    courses.append(data)
-            except json.JSONDecodeError as e:
-                print(f"Warning: Failed to parse {filename}: {e}")
-            except Exception as e:
-                print(f"Warning: Error loading {filename}: {e}")
+    # Only JSON files (skips *_error.txt)
+    filenames = [f for f in os.listdir(jsons_dir) if f.endswith('.json')]
+    progress(stage="parsing", files_parsed=0, files_total=len(filenames))
+    
+    for files_parsed, filename in enumerate(filenames, start=1):
+        filepath = os.path.join(jsons_dir, filename)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                data['_source_file'] = filename
+                courses.append(data)
+        except json.JSONDecodeError as e:
+            print(f"Warning: Failed to parse {filename}: {e}")
+        except Exception as e:
+            print(f"Warning: Error loading {filename}: {e}")
+        progress(files_parsed=files_parsed)
     
     print(f"Loaded {len(courses)} course JSONs from {jsons_dir}")
     return courses
@@ -220,22 +229,27 @@ def build_course_index(courses: List[Dict]) -> Dict[str, Any]:
     return index
 
 
-def ingest_courses(jsons_dir: str = None):
+def ingest_courses(jsons_dir: str = None, progress=None):
     """
     Main ingestion function for course data (Silo B).
     Creates:
     - Vector Collection B (ChromaDB) for semantic search
     - BM25 Index B for keyword search  
-    - In-memory index (pickled) for exact/fuzzy lookups
+    - In-memory index (artifact bundle) for exact/fuzzy lookups
     - Master list text file
+    
+    Args:
+        jsons_dir: Directory of course JSONs (defaults to the repo's jsons/ folder)
+        progress: Optional progress callback, see core.ingestion.ingest_data
     """
+    progress = progress or _noop_progress
     if jsons_dir is None:
         jsons_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'jsons')
     
     print(f"Starting course ingestion from: {jsons_dir}")
     
     # 1. Load all course JSONs
-    courses = load_course_jsons(jsons_dir)
+    courses = load_course_jsons(jsons_dir, progress=progress)
     if not courses:
         print("No courses found. Aborting course ingestion.")
         return
@@ -277,42 +291,39 @@ def ingest_courses(jsons_dir: str = None):
     data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
     os.makedirs(data_dir, exist_ok=True)
     
-    # 5. Vector Index (ChromaDB Collection B)
+    # 5. Vector Index (ChromaDB Collection B), built in a staging directory and swapped
+    # in at the end, so a cancelled or failed job leaves the live index untouched
     course_chroma_dir = os.path.join(data_dir, 'course_chroma_db')
     embeddings = HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
+    staging_dir = staging_directory(course_chroma_dir)
+    try:
+        progress(stage="embedding", chunks_embedded=0, chunks_total=len(documents))
+        vectorstore = Chroma(
+            persist_directory=staging_dir,
+            embedding_function=embeddings
+        )
+        for start in range(0, len(documents), Config.INGEST_BATCH_SIZE):
+            batch = documents[start:start + Config.INGEST_BATCH_SIZE]
+            vectorstore.add_documents(batch)
+            progress(chunks_embedded=start + len(batch))
+        del vectorstore
+        progress(stage="indexing")
+        
+        # 6. BM25 Index B, in-memory index and raw courses -> artifact bundle
+        sections = build_lexical_sections(COURSE_LEXICAL, documents)
+        sections.update(build_course_sections(courses, course_index))
+        
+        # Commit: nothing below checks for cancellation (the job manager does not
+        # terminate a committing worker)
+        progress(stage="committing")
+        replace_directory(staging_dir, course_chroma_dir)
+        print(f"Course vector store created at {course_chroma_dir}")
+        update_bundle(Config.ARTIFACT_BUNDLE_PATH, [COURSE_LEXICAL, COURSE_RECORDS], sections)
+        print(f"Course BM25 index, course index and raw courses saved to {Config.ARTIFACT_BUNDLE_PATH}")
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
     
-    # Delete existing collection if exists
-    if os.path.exists(course_chroma_dir):
-        import shutil
-        shutil.rmtree(course_chroma_dir)
-    
-    vectorstore = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        persist_directory=course_chroma_dir
-    )
-    print(f"Course vector store created at {course_chroma_dir}")
-    
-    # 6. BM25 Index B
-    bm25_retriever = BM25Retriever.from_documents(documents)
-    bm25_path = os.path.join(data_dir, 'course_bm25_retriever.pkl')
-    with open(bm25_path, 'wb') as f:
-        pickle.dump(bm25_retriever, f)
-    print(f"Course BM25 retriever saved to {bm25_path}")
-    
-    # 7. Save in-memory index
-    index_path = os.path.join(data_dir, 'course_index.pkl')
-    with open(index_path, 'wb') as f:
-        pickle.dump(course_index, f)
-    print(f"Course index saved to {index_path}")
-    
-    # 8. Save raw courses for direct JSON access
-    courses_path = os.path.join(data_dir, 'courses_raw.pkl')
-    with open(courses_path, 'wb') as f:
-        pickle.dump(courses, f)
-    print(f"Raw courses saved to {courses_path}")
-    
-    # 9. Generate Master List text file
+    # 7. Generate Master List text file
     master_list_path = os.path.join(data_dir, 'course_master_list.txt')
     with open(master_list_path, 'w', encoding='utf-8') as f:
         f.write("IIIT Delhi Course Master List\n")
@@ -352,15 +363,17 @@ def ingest_courses(jsons_dir: str = None):
     
     print(f"Master list saved to {master_list_path}")
     
-    # 10. Summary
+    # Invalidate caches built on the previous index
+    bump_index_version("courses")
+    
+    # 8. Summary
     print("\n" + "=" * 60)
     print("COURSE INGESTION COMPLETE")
     print("=" * 60)
     print(f"  Total Courses: {len(courses)}")
     print(f"  Departments: {', '.join(sorted(by_dept.keys()))}")
     print(f"  Vector DB: {course_chroma_dir}")
-    print(f"  BM25 Index: {bm25_path}")
-    print(f"  Course Index: {index_path}")
+    print(f"  BM25 + Course Index: {Config.ARTIFACT_BUNDLE_PATH}")
 
 
 if __name__ == "__main__":
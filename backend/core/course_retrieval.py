@@ -10,6 +10,7 @@ Waterfall Hierarchy:
 """
 import os
 import re
+import time
 import pickle
 from typing import List, Dict, Any, Optional, Tuple
 from difflib import SequenceMatcher
@@ -18,6 +19,10 @@ from langchain_chroma import Chroma
 from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 from langchain_core.documents import Document
 from .config import Config
+from .artifacts import open_bundle, load_course_index, load_lexical_retriever, COURSE_LEXICAL, COURSE_RECORDS
+from .retrieval_cache import get_retrieval_cache
+from .rerank_cache import with_rerank_cache
+from .cancellation import check
 
 
 def normalize_course_code(code) -> str:
@@ -38,26 +43,27 @@ class CourseRetriever:
     Tries increasingly fuzzy search strategies until results are found.
     """
     
-    def __init__(self):
-        """Initialize the course retriever with all indexes."""
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-        
-        # Load in-memory index
-        index_path = os.path.join(data_dir, 'course_index.pkl')
-        if not os.path.exists(index_path):
-            raise FileNotFoundError("Course index not found. Run course ingestion first.")
+    def __init__(self, embeddings=None, reranker=None):
+        """
+        Initialize the course retriever with all indexes.
         
-        with open(index_path, 'rb') as f:
-            self.index = pickle.load(f)
+        Args:
+            embeddings: Embedding model to share with Engine A (loaded if not given)
+            reranker: Cross-encoder to share with Engine A (loaded if not given)
+        """
+        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
         
-        # Load raw courses for direct JSON access
-        courses_path = os.path.join(data_dir, 'courses_raw.pkl')
-        with open(courses_path, 'rb') as f:
-            self.courses = pickle.load(f)
+        # Load in-memory index and raw courses (records are decoded lazily from the bundle)
+        bundle = open_bundle()
+        if bundle and bundle.has_prefix(COURSE_RECORDS):
+            self.index, self.courses = load_course_index(bundle)
+        else:
+            self.index, self.courses = self._load_legacy_pickles(data_dir)
         
         # Load vector store
         course_chroma_dir = os.path.join(data_dir, 'course_chroma_db')
-        embeddings = HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
+        self.persist_directory = course_chroma_dir
+        embeddings = embeddings or HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
         self.vectorstore = Chroma(
             persist_directory=course_chroma_dir,
             embedding_function=embeddings
@@ -65,11 +71,13 @@ class CourseRetriever:
         
         # Load BM25
         bm25_path = os.path.join(data_dir, 'course_bm25_retriever.pkl')
-        with open(bm25_path, 'rb') as f:
-            self.bm25_retriever = pickle.load(f)
+        self.bm25_retriever = load_lexical_retriever(COURSE_LEXICAL, bm25_path)
         
         # Initialize reranker
-        self.reranker = HuggingFaceCrossEncoder(model_name=Config.RERANKER_MODEL_NAME)
+        self.reranker = with_rerank_cache(reranker or HuggingFaceCrossEncoder(model_name=Config.RERANKER_MODEL_NAME))
+        
+        # Retrieval cache (course codes + scores per query)
+        self.result_cache = get_retrieval_cache("courses")
         
         # Course code pattern for detection
         self.code_pattern = re.compile(
@@ -79,37 +87,96 @@ class CourseRetriever:
         
         print("CourseRetriever initialized successfully")
     
-    def retrieve(self, query: str, top_k: int = 5) -> Tuple[List[Dict], str]:
+    def _load_legacy_pickles(self, data_dir: str) -> Tuple[Dict, List[Dict]]:
+        """Load course_index.pkl / courses_raw.pkl for data dirs not yet migrated to the bundle."""
+        index_path = os.path.join(data_dir, 'course_index.pkl')
+        if not os.path.exists(index_path):
+            raise FileNotFoundError("Course index not found. Run course ingestion first.")
+        
+        print("Warning: Loading legacy course pickles. Run migrate_artifacts.py to convert them.")
+        with open(index_path, 'rb') as f:
+            index = pickle.load(f)
+        
+        courses_path = os.path.join(data_dir, 'courses_raw.pkl')
+        with open(courses_path, 'rb') as f:
+            courses = pickle.load(f)
+        return index, courses
+    
+    def retrieve(self, query: str, top_k: int = 5,
+                 lexical: Optional[Tuple[List[Dict], Optional[str]]] = None) -> Tuple[List[Dict], str]:
         """
         Main retrieval method implementing the waterfall strategy.
         
+        Args:
+            lexical: Result of `retrieve_lexical(query, top_k)` if already computed
+                     (speculatively, while the router was running)
+        
         Returns:
             Tuple of (list of course dicts, tier_used)
         """
         print(f"\n[CourseRetriever] Query: {query}")
         
+        cache_key = self.result_cache.make_key(query, top_k=top_k) if self.result_cache else None
+        if cache_key:
+            cached = self._cached_courses(cache_key)
+            if cached is not None:
+                return cached
+        start = time.perf_counter()
+        
+        # Tiers 1-3: Code, fuzzy name and instructor lookups
+        courses, tier_used = lexical if lexical is not None else self.retrieve_lexical(query, top_k)
+        scores = None
+        if not tier_used:
+            # Tier 4: Semantic + BM25 Search
+            scored_courses = self._tier4_scored(query, top_k)
+            courses = [course for course, score in scored_courses]
+            scores = [float(score) for course, score in scored_courses]
+            tier_used = "tier4_semantic"
+            print(f"  [Tier 4 - Semantic+BM25] Found {len(courses)} course(s)")
+        
+        if cache_key:
+            codes = [normalize_course_code(course.get('Course Code', '')) for course in courses]
+            if all(code in self.index['by_code'] for code in codes):
+                self.result_cache.put(cache_key, {"codes": codes, "scores": scores, "tier": tier_used},
+                                      time.perf_counter() - start)
+        return courses, tier_used
+    
+    def _cached_courses(self, cache_key: str) -> Optional[Tuple[List[Dict], str]]:
+        payload = self.result_cache.get(cache_key)
+        if payload is None or not all(code in self.index['by_code'] for code in payload["codes"]):
+            return None
+        print(f"  [RetrievalCache] Hit: {len(payload['codes'])} course(s) via {payload['tier']}")
+        return [self.index['by_code'][code] for code in payload["codes"]], payload["tier"]
+    
+    def retrieve_lexical(self, query: str, top_k: int = 5) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Tiers 1-3 of the waterfall (no models involved).
+        
+        Returns:
+            Tuple of (list of course dicts, tier_used), or ([], None) if no tier matched
+        """
         # Tier 1: Exact/Regex Code Match
+        check("course_retrieval")  # No-op outside a /chat request
         courses, tier = self._tier1_code_match(query)
         if courses:
             print(f"  [Tier 1 - Code Match] Found {len(courses)} course(s)")
             return courses[:top_k], "tier1_code"
         
         # Tier 2: Fuzzy Name Match
+        check("course_retrieval")
         courses, tier = self._tier2_fuzzy_name(query)
         if courses:
             print(f"  [Tier 2 - Fuzzy Name] Found {len(courses)} course(s)")
             return courses[:top_k], "tier2_fuzzy"
         
         # Tier 3: Instructor Match
+        check("course_retrieval")
         courses, tier = self._tier3_instructor(query)
         if courses:
             print(f"  [Tier 3 - Instructor] Found {len(courses)} course(s)")
             return courses[:top_k], "tier3_instructor"
         
-        # Tier 4: Semantic + BM25 Search
-        courses, tier = self._tier4_semantic_bm25(query, top_k)
-        print(f"  [Tier 4 - Semantic+BM25] Found {len(courses)} course(s)")
-        return courses, "tier4_semantic"
+        return [], None
     
     def _tier1_code_match(self, query: str) -> Tuple[List[Dict], str]:
         """
@@ -224,7 +291,12 @@ class CourseRetriever:
         """
         Tier 4: Semantic + BM25 hybrid search with reranking.
         """
+        return [course for course, score in self._tier4_scored(query, top_k)], "tier4"
+    
+    def _tier4_scored(self, query: str, top_k: int = 5) -> List[Tuple[Dict, float]]:
+        """Tier 4 courses with their best cross-encoder score."""
         # Vector search
+        check("course_retrieval")
         vector_docs = self.vectorstore.similarity_search(query, k=top_k * 2)
         
         # BM25 search
@@ -249,9 +321,10 @@ class CourseRetriever:
         candidates = [item["doc"] for item in sorted_docs][:top_k * 2]
         
         if not candidates:
-            return [], "tier4"
+            return []
         
         # Rerank with cross-encoder
+        check("rerank")
         pairs = [[query, doc.page_content] for doc in candidates]
         scores = self.reranker.score(pairs)
         
@@ -265,9 +338,18 @@ class CourseRetriever:
             code = normalize_course_code(doc.metadata.get('course_code', ''))
             if code and code in self.index['by_code'] and code not in seen:
                 seen.add(code)
-                final_courses.append(self.index['by_code'][code])
+                final_courses.append((self.index['by_code'][code], score))
         
-        return final_courses, "tier4"
+        return final_courses
+    
+    def course_codes(self, courses: List[Dict]) -> List[str]:
+        """Index keys (normalized codes) of course records."""
+        return [normalize_course_code(course.get('Course Code')) for course in courses]
+    
+    def get_courses(self, codes: List[str]) -> Optional[List[Dict]]:
+        """Course records for index keys, or None if any is no longer indexed."""
+        courses = [self.index['by_code'].get(code) for code in codes]
+        return None if any(course is None for course in courses) else courses
     
     def get_all_courses_by_dept(self, dept: str) -> List[Dict]:
         """Get all courses for a department prefix (e.g., 'CSE', 'BIO')."""
@@ -297,6 +379,6 @@ class CourseRetriever:
         return matches
 
 
-def get_course_retriever() -> CourseRetriever:
+def get_course_retriever(embeddings=None, reranker=None) -> CourseRetriever:
     """Factory function to get a CourseRetriever instance."""
-    return CourseRetriever()
+    return CourseRetriever(embeddings=embeddings, reranker=reranker)
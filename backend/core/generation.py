@@ -1,29 +1,91 @@
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from .config import Config
+from .llm import create_llm, with_cache_hints
 from .router import SitemapRouter
-from .retrieval import FilterableHybridRetriever
+from .speculation import SpeculationPool, SpeculativeRetrieval
+from .answer_cache import get_answer_cache
+from .index_version import current_index_version
+from .answer_gate import NO_ANSWER_MESSAGE, load_no_answer_gate
+from .context_packer import ContextPacker
+from .retrieval_cache import chunk_id
+from .greetings import GreetingResponder
+from .standalone import StandaloneDetector
+from .working_set import WorkingSetMatcher, build_working_set, code_parts, course_codes, known_course_codes
+from . import cancellation
+from . import metrics
+
+
+# Prompt layouts keep all static text in a byte-identical prefix (system message) and put
+# the variable parts (retrieved context, question) last, so llama-server can reuse the
+# cached KV of the prefix across calls (see core/llm.py:with_cache_hints).
+GENERAL_SYSTEM_PROMPT = """You are IIITD-CHATBOT, a helpful AI assistant for the IIIT Delhi website.
+You were built by Vinayak Agarwal and Akshat Kothari.
+
+**CRITICAL RULES - FOLLOW STRICTLY:**
+
+1. **ONLY use the Context Documents provided with the question.** Do NOT use any outside knowledge about colleges, universities, or education in general.
+
+2. **Do NOT guess or invent information.** If the answer is not explicitly stated in the context, say: "Based on the available IIITD documents, I don't have specific information about that."
+
+3. **IIIT Delhi DOES NOT have Mechanical Engineering, Civil Engineering, or Chemical Engineering.** 
+   - The ONLY B.Tech branches at IIITD are: CSE, ECE, CSAM, CSAI, CSD, CSSS, CSB, EVE, and CS+Econ.
+   - If asked about branches not in this list, clarify that IIITD does not offer them.
+
+4. **Be precise with names, codes, and numbers.** If a course code or specific detail appears in the context, quote it exactly.
+
+5. **Refuse out-of-scope queries.** Politely decline requests unrelated to IIITD.
+
+6. **Respond in English only.**"""
+
+GENERAL_HUMAN_PROMPT = """**Context Documents:**
+{context}
+
+**(Answer based ONLY on the above context. If unsure, say you don't have that information.)**
+
+**Question:** {question}"""
+
+COURSE_SYSTEM_PROMPT = """You are IIITD-CHATBOT, an AI assistant specializing in IIIT Delhi course information.
+You were built by Vinayak Agarwal and Akshat Kothari.
 
-# Try to import Google GenAI, but don't fail if not available
-try:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    GOOGLE_GENAI_AVAILABLE = True
-except ImportError:
-    GOOGLE_GENAI_AVAILABLE = False
+**CRITICAL RULES:**
+
+1. **ONLY use the Course Information provided with the question.** Do NOT invent courses or details.
+
+2. **Format nicely.** Present course information in a clean, readable format:
+   - Use bullet points for lists
+   - Highlight course codes
+   - Group related information
+
+3. **Do NOT output raw JSON.** Convert the structured data into natural language.
+
+4. **If a specific detail is not in the context, say so.** Don't make up prerequisites, credits, or instructors.
 
-# Try to import course retriever
-try:
-    from .course_retrieval import CourseRetriever
-    COURSE_RETRIEVER_AVAILABLE = True
-except ImportError:
-    COURSE_RETRIEVER_AVAILABLE = False
-    print("Warning: CourseRetriever not available. Run course ingestion first.")
+5. **For "list all" queries:** Present a clean list of matching courses with their codes and names.
+
+6. **Be concise but complete.** Include relevant details like prerequisites, credits, and key topics."""
+
+COURSE_HUMAN_PROMPT = """**Course Information:**
+{context}
+
+Answer the user's question based on the course information above.
+
+**Question:** {question}"""
+
+GENERAL_QA_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", GENERAL_SYSTEM_PROMPT),
+    ("human", GENERAL_HUMAN_PROMPT)
+])
+
+COURSE_QA_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", COURSE_SYSTEM_PROMPT),
+    ("human", COURSE_HUMAN_PROMPT)
+])
 
 
 class RAGPipeline:
-    def __init__(self, retriever, use_router: bool = True, course_retriever=None):
+    def __init__(self, retriever, use_router: bool = True, course_retriever=None, llm=None):
         """
         Initialize the RAG pipeline with dual retrieval engines.
         
@@ -31,40 +93,63 @@ class RAGPipeline:
             retriever: FilterableHybridRetriever for general queries (Engine A)
             use_router: Whether to use the LLM-based router for intent classification
             course_retriever: CourseRetriever for course queries (Engine B)
+            llm: Chat model to use (created from config if not given)
         """
         self.retriever = retriever  # Engine A: General
         self.course_retriever = course_retriever  # Engine B: Course
         self.use_router = use_router
         
-        # Determine which LLM to use
-        if Config.LOCAL_MODEL_API and Config.LOCAL_MODEL_API.lower() != "null":
-            print(f"Using Local Model: {Config.LOCAL_MODEL_NAME} at {Config.LOCAL_MODEL_API}")
-            self.llm = ChatOpenAI(
-                base_url=Config.LOCAL_MODEL_API,
-                model=Config.LOCAL_MODEL_NAME or "local-model",
-                api_key="ignore-me",
-                temperature=0
-            )
-        elif Config.GEMINI_API_KEY and GOOGLE_GENAI_AVAILABLE:
-            print("Using Gemini Model")
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-2.5-flash", 
-                temperature=0, 
-                google_api_key=Config.GEMINI_API_KEY
-            )
-        else:
-            raise ValueError("No valid API Key found. Please set LOCAL_MODEL_API or install langchain-google-genai with GEMINI_API_KEY")
+        # Determine which LLM to use (local server or Gemini)
+        self.llm = llm or create_llm(gemini_model="gemini-2.5-flash")
+        
+        # Engine A's embedding model, shared with the router and the answer cache
+        embeddings = getattr(getattr(retriever, "vectorstore", None), "embeddings", None)
         
         # Initialize router if enabled
         self.router = None
         if self.use_router:
             try:
-                self.router = SitemapRouter(llm=self.llm)
+                self.router = SitemapRouter(llm=self.llm, embeddings=embeddings)
                 print("Dual Intent Router initialized.")
             except Exception as e:
                 print(f"Warning: Could not initialize router: {e}")
                 self.router = None
         
+        # Answer cache, keyed by standalone question and index version
+        self.answer_cache = get_answer_cache()
+        if self.answer_cache:
+            self.answer_cache.configure(current_index_version(), embeddings)
+        
+        # Greetings are answered from templates unless GREETING_MODE=llm
+        self.greeting_responder = GreetingResponder() if Config.GREETING_MODE == "template" else None
+        
+        # Structured course facts (credits, prerequisites, ...) answered from the course record
+        self.course_facts = None
+        if course_retriever and Config.COURSE_FACTS:
+            from .course_facts import CourseFactEngine
+            self.course_facts = CourseFactEngine(course_retriever)
+        
+        # Context packer: fits the generation context into a token budget
+        self.context_packer = ContextPacker(
+            embeddings=embeddings, vectorstore=getattr(retriever, "vectorstore", None)
+        ) if Config.CONTEXT_PACKING else None
+        
+        # No-answer gate: skip generation when general retrieval found nothing relevant
+        self.no_answer_gate = load_no_answer_gate()
+        
+        # Skips the condenser for follow-ups that are already standalone
+        self.standalone_detector = StandaloneDetector(
+            embeddings, known_codes=known_course_codes(course_retriever)
+        ) if Config.STANDALONE_DETECTOR else None
+        
+        # Reuses the previous turn's courses / chunks for follow-ups on the same entity
+        self.working_set_matcher = WorkingSetMatcher(embeddings) if Config.SESSION_REUSE else None
+        
+        # Speculative retrieval runs both retrieval branches while the router is thinking
+        self.speculation_pool = None
+        if self.router and Config.SPECULATIVE_RETRIEVAL:
+            self.speculation_pool = SpeculationPool(Config.SPECULATIVE_MAX_REQUESTS)
+        
         # Condenser
         self.condense_q_chain = self._create_condenser_chain()
         
@@ -103,41 +188,9 @@ Just output the standalone question."""
                 ("human", "Rewrite this into a standalone question: {question}"),
             ]
         )
-        return condense_q_prompt | self.llm | StrOutputParser()
+        return condense_q_prompt | with_cache_hints(self.llm, "condense") | StrOutputParser()
 
     def _create_rag_chain(self):
-        qa_system_prompt = """You are IIITD-CHATBOT, a helpful AI assistant for the IIIT Delhi website.
-You were built by Vinayak Agarwal and Akshat Kothari.
-
-**CRITICAL RULES - FOLLOW STRICTLY:**
-
-1. **ONLY use the Context Documents below.** Do NOT use any outside knowledge about colleges, universities, or education in general.
-
-2. **Do NOT guess or invent information.** If the answer is not explicitly stated in the context, say: "Based on the available IIITD documents, I don't have specific information about that."
-
-3. **IIIT Delhi DOES NOT have Mechanical Engineering, Civil Engineering, or Chemical Engineering.** 
-   - The ONLY B.Tech branches at IIITD are: CSE, ECE, CSAM, CSAI, CSD, CSSS, CSB, EVE, and CS+Econ.
-   - If asked about branches not in this list, clarify that IIITD does not offer them.
-
-4. **Be precise with names, codes, and numbers.** If a course code or specific detail appears in the context, quote it exactly.
-
-5. **Refuse out-of-scope queries.** Politely decline requests unrelated to IIITD.
-
-6. **Respond in English only.**
-
-**Context Documents:**
-{context}
-
-**(Answer based ONLY on the above context. If unsure, say you don't have that information.)**
-"""
-        
-        qa_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", qa_system_prompt),
-                ("human", "{question}"),
-            ]
-        )
-
         def format_docs(docs):
             formatted_docs = []
             for i, doc in enumerate(docs):
@@ -146,8 +199,8 @@ You were built by Vinayak Agarwal and Akshat Kothari.
 
         rag_chain = (
             {"context": self.retriever | format_docs, "question": RunnablePassthrough()}
-            | qa_prompt
-            | self.llm
+            | GENERAL_QA_PROMPT
+            | with_cache_hints(self.llm, "general")
             | StrOutputParser()
         )
         return rag_chain
@@ -189,24 +242,121 @@ You were built by Vinayak Agarwal and Akshat Kothari.
         
         return condensed
 
-    def run(self, question: str, chat_history: list = []):
-        # 1. Condense
-        if chat_history:
-            raw_condensed = self.condense_q_chain.invoke({"question": question, "chat_history": chat_history})
-            standalone_question = self._sanitize_condensed_question(raw_condensed, question)
-        else:
-            standalone_question = question
+    def _condense_and_route(self, question: str, chat_history: list):
+        """
+        Resolve the standalone question and (if the router is enabled) its route.
+        
+        With Config.COMBINED_CONDENSE_ROUTE, follow-ups are condensed and routed in a
+        single LLM call; otherwise (or if the combined output is unusable) the condenser
+        and router run one after the other.
+        
+        Returns:
+            Tuple of (standalone question, route info or None if not routed yet)
+        """
+        if not chat_history:
+            return question, None
+        if self.standalone_detector and not self.standalone_detector.needs_condensing(question, chat_history):
+            return question, None
+        metrics.increment("condense.llm_calls")
+        
+        if Config.COMBINED_CONDENSE_ROUTE and self.router:
+            standalone_question, route_info = self.router.condense_and_route(question, chat_history)
+            if standalone_question is not None:
+                sanitized = self._sanitize_condensed_question(standalone_question, question)
+                if sanitized != standalone_question:
+                    # Route was computed for an answer-like rewrite; route the original instead
+                    return sanitized, None
+                return standalone_question, route_info
+        
+        raw_condensed = self.condense_q_chain.invoke({"question": question, "chat_history": chat_history})
+        return self._sanitize_condensed_question(raw_condensed, question), None
+
+    def run(self, question: str, chat_history: list = [], working_set: dict = None):
+        """
+        Answer a question in the context of the chat history.
+        
+        Args:
+            working_set: The previous turn's working set (see core/working_set.py), from
+                         the session; the result's "working_set" is this turn's
+        """
+        # 1. Condense (and, in combined mode, route in the same LLM call)
+        standalone_question, route_info = self._condense_and_route(question, chat_history)
+        cancellation.check("condense")
         
         print(f"\n{'='*60}")
         print(f"Standalone Question: {standalone_question}")
-
-        # 2. Route to determine intent
-        route_info = None
+        
+        # 2. Answer single-field course lookups from the course record (no LLM calls)
+        if self.course_facts:
+            fact = self.course_facts.answer(standalone_question)
+            if fact is not None:
+                print(f"Course fact answer ({', '.join(fact['fields'])})")
+                route_info = route_info or {
+                    "intent": "course",
+                    "relevant_sections": [],
+                    "keywords": fact["fields"],
+                    "reasoning": "Structured course fact",
+                    "skip_retrieval": False,
+                }
+                return {
+                    "answer": fact["answer"],
+                    "sources": self._course_sources(fact["courses"], "tier1_code"),
+                    "route_info": route_info,
+                    "working_set": self._course_working_set(standalone_question, route_info, fact["courses"]),
+                }
+        
+        # 3. Serve repeated questions from the answer cache
+        cache_lookup = None
+        if self.answer_cache:
+            cache_lookup = self.answer_cache.lookup(standalone_question)
+            if cache_lookup.result is not None:
+                print(f"Answer cache hit ({cache_lookup.tier})")
+                return {**cache_lookup.result, "cache": cache_lookup.tier}
+        
+        result = self._answer(
+            standalone_question, route_info, first_turn=not chat_history,
+            working_set=working_set if chat_history else None
+        )
+        
+        # Greeting replies depend on the conversation position and cost nothing to redo;
+        # gated fallbacks are not cached so a mis-gated question is re-tried next time
+        # (e.g. after re-fitting the gate)
+        result_route = result.get("route_info") or {}
+        cacheable = result_route.get("intent") != "greeting" and not result_route.get("no_answer")
+        if self.answer_cache and cacheable:
+            self.answer_cache.store(standalone_question, result, cache_lookup.query_vector)
+        return result
+
+    def _answer(self, standalone_question: str, route_info=None, first_turn: bool = True,
+                working_set: dict = None):
+        """
+        Route (unless already routed), retrieve and generate for a standalone question.
+        
+        Args:
+            first_turn: Whether this is the first message of the conversation
+            working_set: The previous turn's working set, reused for a follow-up on the same entity
+        """
+        # 4. Follow-ups on the previous turn's courses / chunks skip routing and search
+        if self.working_set_matcher and working_set:
+            reason = self.working_set_matcher.match(standalone_question, working_set)
+            if reason:
+                result = self._answer_from_working_set(standalone_question, working_set, reason)
+                if result is not None:
+                    return result
+        
+        # 5. Route to determine intent
         intent = "general"  # default
+        speculation = None
         
         if self.router:
             try:
-                route_info = self.router.route(standalone_question)
+                if route_info is None:
+                    if self.speculation_pool and self.speculation_pool.try_acquire():
+                        speculation = SpeculativeRetrieval(
+                            self.speculation_pool, standalone_question,
+                            retriever=self.retriever, course_retriever=self.course_retriever
+                        )
+                    route_info = self.router.route(standalone_question)
                 intent = route_info.get('intent', 'general')
                 
                 print(f"Router Output:")
@@ -218,8 +368,10 @@ You were built by Vinayak Agarwal and Akshat Kothari.
                 
                 # Handle greeting/off-topic queries without retrieval
                 if route_info.get('skip_retrieval'):
+                    if speculation:
+                        speculation.discard()
                     if intent == 'greeting':
-                        response = self._handle_greeting(standalone_question)
+                        response = self._handle_greeting(standalone_question, first_turn)
                     else:  # off_topic
                         response = self._handle_off_topic(standalone_question)
                     
@@ -228,25 +380,67 @@ You were built by Vinayak Agarwal and Akshat Kothari.
                         "sources": [],
                         "route_info": route_info
                     }
+                cancellation.check("route")
+            except cancellation.RequestCancelled:
+                if speculation:
+                    speculation.discard()
+                raise
             except Exception as e:
                 print(f"Router error: {e}")
                 intent = "general"
 
-        # 3. Dispatch to appropriate engine based on intent
+        # 6. Dispatch to appropriate engine based on intent
         if intent == "course" and self.course_retriever:
-            return self._run_course_engine(standalone_question, route_info)
+            lexical = speculation.take("course", standalone_question) if speculation else None
+            return self._run_course_engine(standalone_question, route_info, lexical=lexical)
         else:
-            return self._run_general_engine(standalone_question, route_info)
+            return self._run_general_engine(standalone_question, route_info, speculation=speculation)
 
-    def _run_course_engine(self, question: str, route_info: dict):
+    def _answer_from_working_set(self, question: str, working_set: dict, reason: str):
+        """Answer a follow-up from the previous turn's courses or chunks (None if they are gone)."""
+        route_info = {
+            **(working_set.get("route_info") or {}),
+            "reasoning": f"Follow-up on the previous turn ({reason}); working set reused",
+        }
+        if working_set["engine"] == "course" and self.course_retriever:
+            courses = self.course_retriever.get_courses(working_set["codes"])
+            if not courses:
+                return None
+            mentioned = set(course_codes(question))
+            if mentioned:
+                courses = [c for c in courses if mentioned & set(code_parts(self.course_retriever.course_codes([c])[0]))]
+            print(f"  [WorkingSet] Reusing {len(courses)} courses")
+            return self._run_course_engine(question, route_info, courses=courses)
+        
+        if working_set["engine"] == "general" and hasattr(self.retriever, "rerank_working_set"):
+            retrieval = self.retriever.rerank_working_set(
+                question, working_set["chunk_ids"], top_rrf=working_set.get("top_rrf")
+            )
+            if retrieval is None:
+                return None
+            print(f"  [WorkingSet] Re-ranked {len(retrieval.scored_docs)} chunks from the previous turn")
+            return self._run_general_engine(question, route_info, retrieval=retrieval)
+        return None
+
+    def _course_working_set(self, question: str, route_info: dict, courses: list) -> dict:
+        return build_working_set(question, route_info, "course", codes=self.course_retriever.course_codes(courses))
+
+    def _run_course_engine(self, question: str, route_info: dict, lexical=None, courses: list = None):
         """
         Engine B: Course Retriever (Waterfall).
         Used for course-specific queries.
+        
+        Args:
+            lexical: Speculatively computed Tier 1-3 result, if any
+            courses: Courses reused from the session working set (skips the waterfall)
         """
         print(f"\n[Engine B: Course Retriever]")
         
         # Use waterfall retrieval
-        courses, tier_used = self.course_retriever.retrieve(question, top_k=5)
+        if courses is not None:
+            tier_used = "working_set"
+        else:
+            courses, tier_used = self.course_retriever.retrieve(question, top_k=5, lexical=lexical)
         
         print(f"  Retrieved {len(courses)} courses via {tier_used}")
         
@@ -258,12 +452,26 @@ You were built by Vinayak Agarwal and Akshat Kothari.
             }
         
         # Format courses for LLM
-        context = self._format_courses_for_context(courses)
+        context_tokens = None
+        if self.context_packer:
+            packed = self.context_packer.pack_courses(question, self._format_course_blocks(courses))
+            context, context_tokens = packed.text, packed.stats()
+        else:
+            context = self._format_courses_for_context(courses)
         
         # Generate response with course-specific prompt
         response = self._generate_course_response(question, context)
         
-        # Format sources
+        return {
+            "answer": response,
+            "sources": self._course_sources(courses, tier_used),
+            "route_info": route_info,
+            "context_tokens": context_tokens,
+            "working_set": self._course_working_set(question, route_info, courses)
+        }
+
+    def _course_sources(self, courses: list, tier_used: str) -> list:
+        """Source entries for course results."""
         sources = []
         for course in courses:
             sources.append({
@@ -276,17 +484,17 @@ You were built by Vinayak Agarwal and Akshat Kothari.
                     "type": "course"
                 }
             })
-        
-        return {
-            "answer": response,
-            "sources": sources,
-            "route_info": route_info
-        }
+        return sources
 
-    def _run_general_engine(self, question: str, route_info: dict):
+    def _run_general_engine(self, question: str, route_info: dict, speculation=None, retrieval=None):
         """
         Engine A: General Retriever (3-source RAG).
         Used for general IIITD queries.
+        
+        Args:
+            speculation: SpeculativeRetrieval holding the unfiltered sources (see
+                         FilterableHybridRetriever.prefetch), if any
+            retrieval: RetrievalResult re-ranked from the session working set (skips search)
         """
         print(f"\n[Engine A: General Retriever]")
         
@@ -301,13 +509,57 @@ You were built by Vinayak Agarwal and Akshat Kothari.
                 )
                 print(f"  Filter Applied: {route_info.get('chroma_filter')}")
 
-        # Retrieve
-        docs = active_retriever.invoke(question)
+        # Retrieve: retrieval cache first, then the full pipeline (reusing speculative
+        # BM25/global vector results when available)
+        if retrieval is not None:
+            docs = retrieval.docs
+        elif hasattr(active_retriever, 'retrieve_scored'):
+            retrieval = active_retriever.cached_scored(question)
+            if retrieval is not None:
+                if speculation:
+                    speculation.discard()
+            else:
+                prefetched = speculation.take("general", question) if speculation else None
+                retrieval = active_retriever.retrieve_scored(question, prefetched=prefetched, use_cache=False)
+            docs = retrieval.docs
+        else:
+            if speculation:
+                speculation.discard()
+            retrieval = None
+            docs = active_retriever.invoke(question)
         print(f"  Retrieved {len(docs)} chunks")
 
+        # No-answer gate on the best rerank / RRF scores
+        gated = False
+        if self.no_answer_gate and retrieval is not None:
+            top_rerank = float(retrieval.scored_docs[0][1]) if retrieval.scored_docs else float("-inf")
+            gated = self.no_answer_gate.check(top_rerank, retrieval.top_rrf)
+            if gated:
+                suggestions = self.router.suggest_sections(question) if self.router else []
+                print(f"  [NoAnswerGate] Fired (top rerank {top_rerank:.2f}, top RRF {retrieval.top_rrf}), "
+                      f"mode={self.no_answer_gate.mode}")
+                if self.no_answer_gate.enforced:
+                    self.no_answer_gate.audit(question, top_rerank, retrieval.top_rrf, suggestions)
+                    return {
+                        "answer": self._no_answer_response(suggestions),
+                        "sources": [],
+                        "route_info": {**(route_info or {}), "no_answer": True}
+                    }
+
         # Generate
-        context = self._format_docs_for_context(docs)
+        context_tokens = None
+        if self.context_packer:
+            scored_docs = retrieval.scored_docs if retrieval is not None else [
+                (doc, -rank) for rank, doc in enumerate(docs)
+            ]
+            packed = self.context_packer.pack_documents(question, scored_docs)
+            context, context_tokens = packed.text, packed.stats()
+        else:
+            context = self._format_docs_for_context(docs)
         response = self._generate_general_response(question, context)
+        if gated:
+            # Shadow mode: log what the LLM answered, to audit false negatives
+            self.no_answer_gate.audit(question, top_rerank, retrieval.top_rrf, suggestions, answer=response)
         
         return {
             "answer": response,
@@ -315,11 +567,28 @@ You were built by Vinayak Agarwal and Akshat Kothari.
                 {"content": doc.page_content, "metadata": doc.metadata} 
                 for doc in docs
             ],
-            "route_info": route_info
+            "route_info": route_info,
+            "context_tokens": context_tokens,
+            "working_set": build_working_set(
+                question, route_info, "general",
+                chunk_ids=[chunk_id(doc.page_content) for doc in docs],
+                top_rrf=retrieval.top_rrf if retrieval is not None else None
+            )
         }
 
+    def _no_answer_response(self, suggestions: list) -> str:
+        """Fallback message for gated queries, pointing at the closest sitemap sections."""
+        if not suggestions:
+            return NO_ANSWER_MESSAGE
+        topics = "\n".join(f"- {section}" for section in suggestions)
+        return f"{NO_ANSWER_MESSAGE}\n\nYou could try asking about one of these topics instead:\n{topics}"
+
     def _format_courses_for_context(self, courses: list) -> str:
         """Format course JSONs into readable context for LLM."""
+        return '\n\n'.join(self._format_course_blocks(courses))
+
+    def _format_course_blocks(self, courses: list) -> list:
+        """One formatted text block per course JSON."""
         formatted = []
         for i, course in enumerate(courses):
             lines = [f"=== Course {i+1} ==="]
@@ -388,7 +657,7 @@ You were built by Vinayak Agarwal and Akshat Kothari.
             
             formatted.append('\n'.join(lines))
         
-        return '\n\n'.join(formatted)
+        return formatted
 
     def _format_docs_for_context(self, docs: list) -> str:
         """Format retrieved documents into context string."""
@@ -399,73 +668,20 @@ You were built by Vinayak Agarwal and Akshat Kothari.
 
     def _generate_course_response(self, question: str, context: str) -> str:
         """Generate response for course queries."""
-        course_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are IIITD-CHATBOT, an AI assistant specializing in IIIT Delhi course information.
-You were built by Vinayak Agarwal and Akshat Kothari.
-
-**CRITICAL RULES:**
-
-1. **ONLY use the Course Information below.** Do NOT invent courses or details.
-
-2. **Format nicely.** Present course information in a clean, readable format:
-   - Use bullet points for lists
-   - Highlight course codes
-   - Group related information
-
-3. **Do NOT output raw JSON.** Convert the structured data into natural language.
-
-4. **If a specific detail is not in the context, say so.** Don't make up prerequisites, credits, or instructors.
-
-5. **For "list all" queries:** Present a clean list of matching courses with their codes and names.
-
-6. **Be concise but complete.** Include relevant details like prerequisites, credits, and key topics.
-
-**Course Information:**
-{context}
-
-Answer the user's question based on the course information above:"""),
-            ("human", "{question}")
-        ])
-        
-        chain = course_prompt | self.llm | StrOutputParser()
+        chain = COURSE_QA_PROMPT | with_cache_hints(self.llm, "course") | StrOutputParser()
         return chain.invoke({"context": context, "question": question})
 
     def _generate_general_response(self, question: str, context: str) -> str:
         """Generate response for general IIITD queries."""
-        qa_system_prompt = """You are IIITD-CHATBOT, a helpful AI assistant for the IIIT Delhi website.
-You were built by Vinayak Agarwal and Akshat Kothari.
-
-**CRITICAL RULES - FOLLOW STRICTLY:**
-
-1. **ONLY use the Context Documents below.** Do NOT use any outside knowledge about colleges, universities, or education in general.
-
-2. **Do NOT guess or invent information.** If the answer is not explicitly stated in the context, say: "Based on the available IIITD documents, I don't have specific information about that."
-
-3. **IIIT Delhi DOES NOT have Mechanical Engineering, Civil Engineering, or Chemical Engineering.** 
-   - The ONLY B.Tech branches at IIITD are: CSE, ECE, CSAM, CSAI, CSD, CSSS, CSB, EVE, and CS+Econ.
-   - If asked about branches not in this list, clarify that IIITD does not offer them.
-
-4. **Be precise with names, codes, and numbers.** If a course code or specific detail appears in the context, quote it exactly.
-
-5. **Refuse out-of-scope queries.** Politely decline requests unrelated to IIITD.
-
-6. **Respond in English only.**
-
-**Context Documents:**
-{context}
-
-**(Answer based ONLY on the above context. If unsure, say you don't have that information.)**
-"""
-        qa_prompt = ChatPromptTemplate.from_messages([
-            ("system", qa_system_prompt),
-            ("human", "{question}")
-        ])
-        
-        chain = qa_prompt | self.llm | StrOutputParser()
+        chain = GENERAL_QA_PROMPT | with_cache_hints(self.llm, "general") | StrOutputParser()
         return chain.invoke({"context": context, "question": question})
 
-    def _handle_greeting(self, query: str) -> str:
-        """Generate a friendly response for greetings without RAG."""
+    def _handle_greeting(self, query: str, first_turn: bool = True) -> str:
+        """Respond to greetings without RAG (templated reply, or the LLM with GREETING_MODE=llm)."""
+        if self.greeting_responder:
+            return self.greeting_responder.respond(query, first_turn)
+        
+        metrics.increment("greeting.llm")
         greeting_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are IIITD-CHATBOT, a friendly AI assistant for IIIT Delhi.
 You were built by Vinayak Agarwal and Akshat Kothari.
@@ -476,7 +692,7 @@ The user has sent a greeting or casual message. Respond warmly and briefly.
 - Keep it short (1-2 sentences max)."""),
             ("human", "{query}")
         ])
-        chain = greeting_prompt | self.llm | StrOutputParser()
+        chain = greeting_prompt | with_cache_hints(self.llm, "greeting") | StrOutputParser()
         return chain.invoke({"query": query})
 
     def _handle_off_topic(self, query: str) -> str:
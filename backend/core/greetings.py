@@ -0,0 +1,120 @@
+"""
+Greeting Responder
+Answers greetings and small talk ("hi", "thanks", "bye", "ok cool") from a pool of
+templated replies instead of an LLM call. Replies are keyed by greeting class and
+conversation position (first message vs. later in the conversation).
+
+Replies can be replaced per class and position without code changes in
+data/greeting_templates.json ({"thanks": {"followup": [...]}, ...}). Set
+GREETING_MODE=llm to generate greeting replies with the LLM instead.
+"""
+import os
+import re
+import json
+import random
+from typing import Dict, List
+from .config import Config
+from . import metrics
+
+
+GREETING_CLASSES = {
+    "identity": re.compile(r"\bwho\s*(are|r)\s*(you|u)\b|\bwhat\s*are\s*you\b", re.IGNORECASE),
+    "thanks": re.compile(r"\b(thanks|thank\s*(you|u)|thx|ty|appreciate)\b", re.IGNORECASE),
+    "bye": re.compile(r"\b(bye|goodbye|see\s*(you|ya)|cya|good\s*night|take\s*care)\b", re.IGNORECASE),
+    "acknowledgement": re.compile(
+        r"^(ok|okay|sure|yes|no|yep|nope|alright|cool|great|got\s*it|nice|makes\s*sense|that\s*helps)\b",
+        re.IGNORECASE
+    ),
+    "hello": re.compile(
+        r"\b(hi|hello|hey|hola|namaste|good\s*(morning|afternoon|evening)|how\s*are\s*you|what'?s\s*up|wassup)\b",
+        re.IGNORECASE
+    ),
+}
+
+_INTRO = "I'm IIITD-CHATBOT, an assistant for IIIT Delhi built by Vinayak Agarwal and Akshat Kothari."
+
+# class -> position ("first" | "followup") -> replies
+GREETING_TEMPLATES = {
+    "identity": {
+        "first": [
+            f"{_INTRO} I can answer questions about academics, courses, admissions, campus facilities and student life.",
+        ],
+    },
+    "hello": {
+        "first": [
+            f"Hi! {_INTRO} Ask me anything about academics, courses, admissions or campus life.",
+            f"Hello! {_INTRO} How can I help you with IIITD today?",
+        ],
+        "followup": [
+            "Hi again! What else would you like to know about IIITD?",
+            "Hello! Is there anything else about IIITD I can help with?",
+        ],
+    },
+    "thanks": {
+        "first": [
+            f"You're welcome! {_INTRO} Let me know if you have any questions about IIITD.",
+        ],
+        "followup": [
+            "You're welcome! Feel free to ask if anything else comes up.",
+            "Glad I could help! Anything else about IIITD you'd like to know?",
+            "Happy to help! Let me know if you have more questions.",
+        ],
+    },
+    "bye": {
+        "first": [
+            "Goodbye! Come back any time you have questions about IIITD.",
+        ],
+        "followup": [
+            "Goodbye! Good luck, and come back any time you have questions about IIITD.",
+            "See you! Feel free to return whenever you need information about IIITD.",
+        ],
+    },
+    "acknowledgement": {
+        "first": [
+            f"{_INTRO} What would you like to know about IIITD?",
+        ],
+        "followup": [
+            "Great! Let me know if you have any other questions.",
+            "Sure! What else would you like to know?",
+            "Alright! I'm here if you need anything else about IIITD.",
+        ],
+    },
+}
+
+
+def classify_greeting(query: str) -> str:
+    """Greeting class of a message ('hello' if no class matches)."""
+    text = query.strip()
+    for greeting_class, pattern in GREETING_CLASSES.items():
+        if pattern.search(text):
+            return greeting_class
+    return "hello"
+
+
+def load_greeting_templates() -> Dict[str, Dict[str, List[str]]]:
+    """Built-in templates with per-position overrides from data/greeting_templates.json, if present."""
+    templates = {cls: {pos: list(replies) for pos, replies in by_pos.items()}
+                 for cls, by_pos in GREETING_TEMPLATES.items()}
+    if os.path.exists(Config.GREETING_TEMPLATES_PATH):
+        try:
+            with open(Config.GREETING_TEMPLATES_PATH, "r", encoding="utf-8") as f:
+                for greeting_class, by_pos in json.load(f).items():
+                    for position, replies in by_pos.items():
+                        if replies:
+                            templates.setdefault(greeting_class, {})[position] = list(replies)
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Warning: Could not load greeting templates: {e}")
+    return templates
+
+
+class GreetingResponder:
+    def __init__(self, templates: Dict[str, Dict[str, List[str]]] = None):
+        self.templates = templates or load_greeting_templates()
+
+    def respond(self, query: str, first_turn: bool = True) -> str:
+        greeting_class = classify_greeting(query)
+        by_position = self.templates.get(greeting_class) or self.templates["hello"]
+        position = "first" if first_turn else "followup"
+        replies = by_position.get(position) or by_position.get("followup") or by_position.get("first")
+        metrics.increment(f"greeting.template.{greeting_class}")
+        return random.choice(replies)
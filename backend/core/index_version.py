@@ -0,0 +1,41 @@
+"""
+Index Version
+A small version stamp of the ingested indexes (data/index_version.json). Ingestion
+bumps it after rebuilding the general or course indexes, and caches key their entries
+by it so that anything computed from an older index is never served.
+"""
+import os
+import json
+import time
+import uuid
+from typing import Dict
+from .config import Config
+
+
+def read_index_versions() -> Dict[str, str]:
+    """Per-index versions, e.g. {"general": "...", "courses": "..."} ({} before first ingestion)."""
+    if not os.path.exists(Config.INDEX_VERSION_PATH):
+        return {}
+    try:
+        with open(Config.INDEX_VERSION_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def current_index_version() -> str:
+    """Single version string covering all indexes."""
+    versions = read_index_versions()
+    return "|".join(f"{kind}={versions[kind]}" for kind in sorted(versions)) or "unversioned"
+
+
+def bump_index_version(kind: str) -> str:
+    """Record that the `kind` index ("general" or "courses") was rebuilt. Returns the new version."""
+    versions = read_index_versions()
+    versions[kind] = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    tmp_path = Config.INDEX_VERSION_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(versions, f, indent=2)
+    os.replace(tmp_path, Config.INDEX_VERSION_PATH)
+    print(f"Index version for '{kind}' bumped to {versions[kind]}")
+    return versions[kind]
@@ -1,13 +1,17 @@
 import os
 import json
 import re
-import pickle
-from langchain_text_splitters import MarkdownHeaderTextSplitter
+import shutil
+from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 from .config import Config
+from .artifacts import (
+    update_bundle, build_lexical_sections, replace_directory, staging_directory, GENERAL_LEXICAL
+)
+from .section_selector import build_section_centroids
+from .index_version import bump_index_version
 
 
 def clean_header(header: str) -> str:
@@ -91,8 +95,96 @@ def generate_sitemap(documents: list) -> dict:
     return sitemap
 
 
-def ingest_data():
+def header_context_prefix(metadata: dict) -> str:
+    """The 'Context: ...' header path prepended to every chunk."""
+    header_context = " > ".join(filter(None, [
+        metadata.get("Header 1"), 
+        metadata.get("Header 2"), 
+        metadata.get("Header 3")
+    ]))
+    return f"Context: {header_context}\nContent: "
+
+
+def load_token_counter():
+    """Count tokens with the embedding model's tokenizer (the binding truncation limit)."""
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(Config.EMBEDDING_MODEL_NAME)
+    return lambda text: len(tokenizer.tokenize(text))
+
+
+def split_oversized_sections(documents: list, count_tokens, max_tokens: int = None, overlap_tokens: int = None) -> list:
+    """
+    Sub-split header sections whose chunk (including the Context prefix) exceeds the
+    token budget. Splits prefer paragraph, then line, then sentence boundaries, with
+    `overlap_tokens` of overlap between consecutive parts. Header metadata is kept on
+    every part and the Context prefix is injected into each resulting chunk.
+    """
+    max_tokens = max_tokens or Config.CHUNK_MAX_TOKENS
+    overlap_tokens = Config.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    splitters = {}  # content budget -> splitter
+    chunks = []
+
+    for doc in documents:
+        prefix = header_context_prefix(doc.metadata)
+        if count_tokens(prefix + doc.page_content) <= max_tokens:
+            parts = [doc.page_content]
+        else:
+            # The prefix is repeated on every part, so it comes out of each part's budget
+            budget = max(max_tokens - count_tokens(prefix), Config.CHUNK_MIN_CONTENT_TOKENS)
+            if budget not in splitters:
+                splitters[budget] = RecursiveCharacterTextSplitter(
+                    chunk_size=budget,
+                    chunk_overlap=min(overlap_tokens, budget // 2),
+                    length_function=count_tokens,
+                    separators=["\n\n", "\n", ". ", "? ", "! ", "; ", " ", ""],
+                    keep_separator="end"
+                )
+            parts = splitters[budget].split_text(doc.page_content)
+
+        for i, part in enumerate(parts):
+            metadata = dict(doc.metadata)
+            if len(parts) > 1:
+                metadata["Chunk Part"] = i + 1
+                metadata["Chunk Parts"] = len(parts)
+            chunks.append(Document(page_content=prefix + part, metadata=metadata))
+
+    split_count = sum(1 for c in chunks if c.metadata.get("Chunk Part") == 1)
+    print(f"Sub-split {split_count} oversized sections (budget {max_tokens} tokens, overlap {overlap_tokens}).")
+    return chunks
+
+
+def token_length_histogram(token_counts: list, bucket_size: int = 32) -> list:
+    """Render a text histogram of chunk token lengths."""
+    if not token_counts:
+        return []
+    buckets = {}
+    for n in token_counts:
+        buckets[n // bucket_size] = buckets.get(n // bucket_size, 0) + 1
+    peak = max(buckets.values())
+    lines = []
+    for b in range(max(buckets) + 1):
+        count = buckets.get(b, 0)
+        bar = "#" * max(1 if count else 0, round(40 * count / peak))
+        lines.append(f"  {b * bucket_size:>5}-{(b + 1) * bucket_size - 1:<5} | {count:>4} {bar}")
+    return lines
+
+
+def _noop_progress(**fields):
+    pass
+
+
+def ingest_data(progress=None):
+    """
+    Ingest the general knowledge base (Engine A).
+
+    Args:
+        progress: Optional callback receiving progress fields (stage, files_parsed,
+                  chunks_embedded, ...). Used by background ingestion jobs; it may raise
+                  to cancel ingestion between embedding batches.
+    """
+    progress = progress or _noop_progress
     print("Starting ingestion...")
+    progress(stage="parsing", files_parsed=0, files_total=1)
     # 1. Load Data
     if not os.path.exists(Config.KNOWLEDGE_BASE_PATH):
         raise FileNotFoundError(f"Knowledge base file not found at {Config.KNOWLEDGE_BASE_PATH}")
@@ -117,61 +209,85 @@ def ingest_data():
             doc.metadata["Header 2"] = clean_header(doc.metadata["Header 2"])
         if "Header 3" in doc.metadata:
             doc.metadata["Header 3"] = clean_header(doc.metadata["Header 3"])
-        
-        # Create a context string from cleaned headers
-        header_context = " > ".join(filter(None, [
-            doc.metadata.get("Header 1"), 
-            doc.metadata.get("Header 2"), 
-            doc.metadata.get("Header 3")
-        ]))
-        
-        # Prepend to content
-        doc.page_content = f"Context: {header_context}\nContent: {doc.page_content}"
 
+    # Sub-split oversized sections so every chunk fits the embedding/reranker budget
+    count_tokens = load_token_counter()
+    md_header_splits = split_oversized_sections(md_header_splits, count_tokens)
+
+    if not md_header_splits:
+        # Keep the live index rather than replacing it with an empty one
+        raise ValueError(f"No chunks produced from {Config.KNOWLEDGE_BASE_PATH}; is the knowledge base empty?")
     print(f"Split into {len(md_header_splits)} chunks (with Context Injection).")
 
-    # 3. Vector Index (Chroma)
+    # 3. Vector Index (Chroma), built in a staging directory and swapped in at the end,
+    # so a cancelled or failed job leaves the live index untouched
     embeddings = HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
-    
-    # Initialize Chroma
-    # Note: Chroma automatically persists if persist_directory is set
-    vectorstore = Chroma.from_documents(
-        documents=md_header_splits,
-        embedding=embeddings,
-        persist_directory=Config.CHROMA_PERSIST_DIRECTORY
-    )
-    print(f"Vector store created at {Config.CHROMA_PERSIST_DIRECTORY}")
-
-    # 4. Sparse Index (BM25)
-    bm25_retriever = BM25Retriever.from_documents(md_header_splits)
-    
-    # Save BM25 retriever
-    bm25_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "bm25_retriever.pkl")
-    os.makedirs(os.path.dirname(bm25_path), exist_ok=True)
-    with open(bm25_path, "wb") as f:
-        pickle.dump(bm25_retriever, f)
-    print(f"BM25 retriever saved to {bm25_path}")
-
-    # 5. Generate and save sitemap for routing
-    sitemap = generate_sitemap(md_header_splits)
-    sitemap_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "sitemap.json")
-    with open(sitemap_path, "w", encoding="utf-8") as f:
-        json.dump(sitemap, f, indent=2, ensure_ascii=False)
-    print(f"Sitemap saved to {sitemap_path}")
-    print(f"  - {len(sitemap['sections'])} top-level sections found")
-
-    # 6. Save chunks summary to a text file for inspection
+    # Reported once the model is loaded: the job's ETA measures the embedding rate from here
+    progress(stage="embedding", files_parsed=1, chunks_embedded=0, chunks_total=len(md_header_splits))
+    staging_dir = staging_directory(Config.CHROMA_PERSIST_DIRECTORY)
+    centroids_staging_path = Config.SECTION_CENTROIDS_PATH.replace(".npz", ".staging.npz")
+    try:
+        vectorstore = Chroma(
+            persist_directory=staging_dir,
+            embedding_function=embeddings
+        )
+        # Embed in batches so progress can be reported (and cancellation honoured) along the way
+        for start in range(0, len(md_header_splits), Config.INGEST_BATCH_SIZE):
+            batch = md_header_splits[start:start + Config.INGEST_BATCH_SIZE]
+            vectorstore.add_documents(batch)
+            progress(chunks_embedded=start + len(batch))
+        progress(stage="indexing")
+
+        # 4. Sparse Index (BM25) + chunk text for the artifact bundle
+        lexical_sections = build_lexical_sections(GENERAL_LEXICAL, md_header_splits)
+
+        # 5. Sitemap for routing and section/subsection embedding centroids for
+        # LLM-free section selection
+        sitemap = generate_sitemap(md_header_splits)
+        progress(stage="centroids")
+        build_section_centroids(vectorstore, path=centroids_staging_path)
+        del vectorstore
+
+        # Commit: nothing below checks for cancellation (the job manager does not
+        # terminate a committing worker)
+        progress(stage="committing")
+        replace_directory(staging_dir, Config.CHROMA_PERSIST_DIRECTORY)
+        print(f"Vector store created at {Config.CHROMA_PERSIST_DIRECTORY}")
+        os.replace(centroids_staging_path, Config.SECTION_CENTROIDS_PATH)
+        update_bundle(Config.ARTIFACT_BUNDLE_PATH, [GENERAL_LEXICAL], lexical_sections)
+        print(f"BM25 index saved to {Config.ARTIFACT_BUNDLE_PATH}")
+
+        sitemap_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "sitemap.json")
+        with open(sitemap_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(sitemap, f, indent=2, ensure_ascii=False)
+        os.replace(sitemap_path + ".tmp", sitemap_path)
+        print(f"Sitemap saved to {sitemap_path}")
+        print(f"  - {len(sitemap['sections'])} top-level sections found")
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        if os.path.exists(centroids_staging_path):
+            os.remove(centroids_staging_path)
+
+    # 6. Save chunks summary (with token-length histogram) to a text file for inspection
+    token_counts = [count_tokens(doc.page_content) for doc in md_header_splits]
     chunks_info_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "chunks_summary.txt")
     with open(chunks_info_path, "w", encoding="utf-8") as f:
         f.write(f"Total Chunks: {len(md_header_splits)}\n")
+        f.write(f"Token Budget: {Config.CHUNK_MAX_TOKENS} (overlap {Config.CHUNK_OVERLAP_TOKENS}), tokenizer: {Config.EMBEDDING_MODEL_NAME}\n")
+        f.write(f"Tokens per Chunk: min {min(token_counts)}, mean {sum(token_counts) / len(token_counts):.0f}, max {max(token_counts)}\n")
+        f.write("Token Length Histogram:\n")
+        f.write("\n".join(token_length_histogram(token_counts)) + "\n")
         f.write("=" * 80 + "\n\n")
         for i, doc in enumerate(md_header_splits):
             f.write(f"Chunk {i+1}:\n")
             f.write(f"  Metadata: {doc.metadata}\n")
-            f.write(f"  Content Length: {len(doc.page_content)} chars\n")
+            f.write(f"  Content Length: {len(doc.page_content)} chars, {token_counts[i]} tokens\n")
             f.write(f"  Content Preview: {doc.page_content[:200]}...\n")
             f.write("-" * 80 + "\n")
     print(f"Chunks summary saved to {chunks_info_path}")
 
+    # Invalidate caches built on the previous index
+    bump_index_version("general")
+
 if __name__ == "__main__":
     ingest_data()
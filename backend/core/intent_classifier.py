@@ -0,0 +1,160 @@
+"""
+Local Intent Classifier
+Resolves the router intent ('course', 'general', 'greeting', 'off_topic') without an
+LLM call, using a kNN vote over labeled exemplar queries embedded with the already
+loaded MiniLM model, plus the router's course-code / course-keyword features.
+
+Only confident predictions are used; the router falls back to the LLM below the
+confidence threshold.
+"""
+import os
+import json
+from typing import Dict, List, Tuple, Optional
+import numpy as np
+from .config import Config
+
+
+# Labeled exemplar queries per intent. Extra exemplars can be added without code
+# changes in data/intent_exemplars.json ({"course": [...], "general": [...], ...}).
+INTENT_EXEMPLARS = {
+    "course": [
+        "CSE101 syllabus",
+        "What are the prerequisites for Machine Learning?",
+        "How many credits is the Operating Systems course?",
+        "Who teaches Discrete Mathematics?",
+        "What topics are covered in Linear Algebra?",
+        "List all ECE courses",
+        "Which courses cover deep learning?",
+        "Is there a course on computer vision?",
+        "What is the assessment plan for Data Structures?",
+        "Textbook for the Signals and Systems course",
+        "Course outcomes of Introduction to Programming",
+        "What electives are available on natural language processing?",
+        "Give me the weekly lecture plan for Probability and Statistics",
+        "Which BIO courses are offered to postgraduates?",
+        "courses related to cryptography",
+        "Tell me about the Computer Networks course",
+        "What does the Algorithm Design course teach?",
+        "Courses taught by the mathematics department",
+        "Which course covers compilers?",
+        "Does MTH100 have any prerequisites?",
+    ],
+    "general": [
+        "What is the fee structure for B.Tech?",
+        "How do I apply for admission to M.Tech?",
+        "What is the attendance policy?",
+        "Tell me about hostel facilities",
+        "How is the mess food on campus?",
+        "What are the library timings?",
+        "What was the placement record last year?",
+        "Which companies visit for internships?",
+        "What is the grading system and how is CGPA calculated?",
+        "What B.Tech branches does IIITD offer?",
+        "Who is the director of IIIT Delhi?",
+        "What research centers are there at IIITD?",
+        "Tell me about student clubs and fests",
+        "How do I reach the campus by metro?",
+        "What scholarships are available?",
+        "What is the anti-ragging policy?",
+        "Is there a gym on campus?",
+        "What is the research area of the CSE faculty?",
+        "When does the monsoon semester start?",
+        "How many semesters are there in a year?",
+        "Is IIITD a state university?",
+        "What is the PhD admission process?",
+    ],
+    "greeting": [
+        "hi",
+        "hello there",
+        "hey, good morning",
+        "thanks a lot",
+        "thank you so much for the help",
+        "bye, see you later",
+        "how are you doing?",
+        "okay cool",
+        "great, that helps",
+        "who are you?",
+    ],
+    "off_topic": [
+        "What's the weather like today?",
+        "Give me a recipe for pasta",
+        "Tell me a joke",
+        "Who won the cricket world cup?",
+        "What is the capital of France?",
+        "Write a poem about the sea",
+        "What is the stock price of Apple?",
+        "Recommend a good movie to watch",
+        "How do I fix my car engine?",
+        "Translate this sentence into Spanish",
+        "What is the best smartphone to buy?",
+        "Explain the plot of Harry Potter",
+    ],
+}
+
+INTENTS = ("course", "general", "greeting", "off_topic")
+
+
+def load_exemplars() -> Dict[str, List[str]]:
+    """Built-in exemplars merged with data/intent_exemplars.json, if present."""
+    exemplars = {intent: list(queries) for intent, queries in INTENT_EXEMPLARS.items()}
+    extra_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "intent_exemplars.json")
+    if os.path.exists(extra_path):
+        with open(extra_path, "r", encoding="utf-8") as f:
+            for intent, queries in json.load(f).items():
+                if intent in exemplars:
+                    exemplars[intent].extend(queries)
+    return exemplars
+
+
+class IntentClassifier:
+    """kNN intent classifier over embedded exemplars."""
+
+    def __init__(self, embeddings, exemplars: Optional[Dict[str, List[str]]] = None,
+                 k: int = None, temperature: float = None):
+        self.embeddings = embeddings
+        self.k = k or Config.INTENT_KNN_K
+        self.temperature = temperature or Config.INTENT_KNN_TEMPERATURE
+
+        exemplars = exemplars or load_exemplars()
+        texts, labels = [], []
+        for intent, queries in exemplars.items():
+            texts.extend(queries)
+            labels.extend([intent] * len(queries))
+        self.labels = np.array(labels)
+        self.matrix = self._normalize(np.array(embeddings.embed_documents(texts)))
+        print(f"IntentClassifier initialized with {len(texts)} exemplars")
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed(self, query: str) -> np.ndarray:
+        return self._normalize(np.array(self.embeddings.embed_query(query)))
+
+    def classify(self, query: str, has_course_code: bool = False, has_course_keyword: bool = False,
+                 query_vector: Optional[np.ndarray] = None) -> Tuple[str, float, Dict[str, float]]:
+        """
+        Returns:
+            Tuple of (intent, confidence, per-intent probabilities)
+        """
+        vector = query_vector if query_vector is not None else self.embed(query)
+        sims = self.matrix @ vector
+        top = np.argsort(-sims)[:self.k]
+
+        # Similarity-weighted vote among the k nearest exemplars
+        weights = np.exp(sims[top] / self.temperature)
+        probs = {intent: float(weights[self.labels[top] == intent].sum()) for intent in INTENTS}
+
+        # Router fast-path features: course codes are near-certain, keywords are a hint
+        total = sum(probs.values())
+        if has_course_code:
+            probs["course"] += total * Config.INTENT_COURSE_CODE_BONUS
+        elif has_course_keyword:
+            probs["course"] += total * Config.INTENT_COURSE_KEYWORD_BONUS
+
+        total = sum(probs.values())
+        probs = {intent: p / total for intent, p in probs.items()}
+        intent = max(probs, key=probs.get)
+        return intent, probs[intent], probs
+
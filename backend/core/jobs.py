@@ -0,0 +1,372 @@
+"""
+Background Ingestion Jobs
+Runs the embed-and-index workloads (general KB and course JSONs) in a separate
+process so they never block the API event loop or compete with serving for the GIL.
+
+Each job reports progress (files parsed, chunks embedded, ETA) back to the API
+process over a queue and can be cancelled cooperatively between embedding batches and
+before each write stage. Indexes are built in staging paths and swapped in during the
+final "committing" stage, which is never interrupted.
+
+Job state lives in a SQLite file (INGEST_JOBS_PATH) shared by all pre-fork workers:
+any worker can report on or cancel a job started by another one, and the
+one-job-at-a-time rule is enforced under SQLite's write lock across processes.
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+import multiprocessing
+from typing import Dict, Any, Optional, Callable, List
+from .config import Config
+
+
+JOB_KINDS = ("general", "courses")
+
+
+class IngestionCancelled(Exception):
+    """Raised inside the worker process when a job has been cancelled."""
+
+
+def _job_entrypoint(kind: str, kwargs: Dict[str, Any], progress_queue, cancel_event):
+    """
+    Worker process entrypoint.
+    Imports the ingestion modules lazily so the API process never pays for them.
+    """
+    def report(**fields):
+        if cancel_event.is_set():
+            raise IngestionCancelled()
+        progress_queue.put({"type": "progress", **fields})
+
+    try:
+        if kind == "general":
+            from .ingestion import ingest_data
+            ingest_data(progress=report)
+        elif kind == "courses":
+            from .course_ingestion import ingest_courses
+            ingest_courses(kwargs.get("jsons_dir"), progress=report)
+        else:
+            raise ValueError(f"Unknown ingestion kind: {kind}")
+        progress_queue.put({"type": "done"})
+    except IngestionCancelled:
+        progress_queue.put({"type": "cancelled"})
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        progress_queue.put({"type": "error", "error": str(e)})
+
+
+class IngestionJob:
+    """State of a single ingestion job as seen from the API process."""
+
+    def __init__(self, kind: str, kwargs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.kwargs = kwargs
+        self.status = "queued"  # queued -> running -> succeeded | failed | cancelled
+        self.error: Optional[str] = None
+        self.progress: Dict[str, Any] = {}
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.embed_started_at: Optional[float] = None
+        self.owner_pid = os.getpid()  # API worker that started (and watches) the job
+        self.process = None
+        self.cancel_event = None
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "IngestionJob":
+        job = cls(row["kind"], json.loads(row["kwargs"]))
+        job.id = row["id"]
+        job.status = row["status"]
+        job.error = row["error"]
+        job.progress = json.loads(row["progress"])
+        job.created_at = row["created_at"]
+        job.started_at = row["started_at"]
+        job.finished_at = row["finished_at"]
+        job.embed_started_at = row["embed_started_at"]
+        job.owner_pid = row["owner_pid"]
+        return job
+
+    def to_row(self) -> tuple:
+        return (self.id, self.kind, json.dumps(self.kwargs), self.status, self.error, json.dumps(self.progress),
+                self.created_at, self.started_at, self.finished_at, self.embed_started_at, self.owner_pid)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def apply_progress(self, fields: Dict[str, Any], now: Optional[float] = None):
+        """Merge a progress message; the embedding clock starts when the stage begins (0 chunks embedded)."""
+        if fields.get("stage") == "embedding" and self.embed_started_at is None:
+            self.embed_started_at = now if now is not None else time.time()
+        self.progress.update(fields)
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate remaining time from the chunk embedding rate."""
+        done = self.progress.get("chunks_embedded", 0)
+        total = self.progress.get("chunks_total", 0)
+        if self.finished or not self.embed_started_at or not done or not total:
+            return None
+        elapsed = time.time() - self.embed_started_at
+        return round(elapsed / done * (total - done), 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.progress.get("stage"),
+            "files_parsed": self.progress.get("files_parsed", 0),
+            "files_total": self.progress.get("files_total", 0),
+            "chunks_embedded": self.progress.get("chunks_embedded", 0),
+            "chunks_total": self.progress.get("chunks_total", 0),
+            "eta_seconds": self.eta_seconds(),
+            "elapsed_seconds": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "error": self.error,
+        }
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """
+    Submits ingestion jobs to worker processes and tracks their progress.
+    Only one job runs at a time because every job writes to the shared data directory.
+
+    The worker that submits a job owns its process and watcher thread and writes its
+    progress to the jobs table; other workers read the table and request cancellation
+    through it.
+    """
+
+    COLUMNS = ("id", "kind", "kwargs", "status", "error", "progress", "created_at",
+               "started_at", "finished_at", "embed_started_at", "owner_pid")
+
+    def __init__(self, on_success: Optional[Callable[[IngestionJob], None]] = None, path: Optional[str] = None):
+        self.on_success = on_success
+        self.path = path or Config.INGEST_JOBS_PATH
+        self.jobs: Dict[str, IngestionJob] = {}  # Jobs owned by this process
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Spawn (not fork) so the worker does not inherit loaded models and thread pools
+        self._ctx = multiprocessing.get_context("spawn")
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # SQLite connections must not cross a fork (serve.py workers); jobs stay with their owner
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.jobs = {}
+
+    # ------------------------------------------------------------------
+    # SQLite (one connection per thread)
+    # ------------------------------------------------------------------
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT, kwargs TEXT, status TEXT, "
+                "error TEXT, progress TEXT, created_at REAL, started_at REAL, finished_at REAL, "
+                "embed_started_at REAL, owner_pid INTEGER, cancel_requested INTEGER DEFAULT 0)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _save(self, job: IngestionJob):
+        # Upsert rather than REPLACE, which would reset a cancel_requested set by another worker
+        updates = ", ".join(f"{column} = excluded.{column}" for column in self.COLUMNS[1:])
+        self._db().execute(
+            f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))}) "
+            f"ON CONFLICT (id) DO UPDATE SET {updates}",
+            job.to_row()
+        )
+
+    def _reap_orphans(self, conn: sqlite3.Connection):
+        """Fail unfinished jobs whose owning API worker has died (nobody is watching them)."""
+        rows = conn.execute("SELECT id, owner_pid FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+        for row in rows:
+            if row["owner_pid"] != os.getpid() and not _process_alive(row["owner_pid"]):
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (f"API worker {row['owner_pid']} exited while the job was running", time.time(), row["id"])
+                )
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def active_job(self) -> Optional[IngestionJob]:
+        conn = self._db()
+        self._reap_orphans(conn)
+        row = conn.execute("SELECT * FROM jobs WHERE status IN ('queued', 'running') LIMIT 1").fetchone()
+        return IngestionJob.from_row(row) if row else None
+
+    def submit(self, kind: str, **kwargs) -> IngestionJob:
+        """Start a new ingestion job. Raises RuntimeError if one is already running (in any worker)."""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown ingestion kind: {kind}")
+
+        conn = self._db()
+        # BEGIN IMMEDIATE takes the database write lock: check-and-insert is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._reap_orphans(conn)
+            existing = conn.execute("SELECT id, status FROM jobs WHERE status IN ('queued', 'running')").fetchone()
+            if existing:
+                raise RuntimeError(f"Ingestion job {existing['id']} is already {existing['status']}")
+            job = IngestionJob(kind, kwargs)
+            self._save(job)
+            self._prune(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        progress_queue = self._ctx.Queue()
+        job.cancel_event = self._ctx.Event()
+        job.process = self._ctx.Process(
+            target=_job_entrypoint,
+            args=(kind, kwargs, progress_queue, job.cancel_event),
+            name=f"ingest-{kind}-{job.id}",
+            daemon=True
+        )
+        with self._lock:
+            self.jobs[job.id] = job
+
+        try:
+            job.process.start()
+        except Exception as e:
+            job.status, job.error, job.finished_at = "failed", f"Could not start worker: {e}", time.time()
+            self._save(job)
+            raise
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        print(f"[Jobs] Started {kind} ingestion job {job.id} (pid {job.process.pid})")
+
+        watcher = threading.Thread(
+            target=self._watch, args=(job, progress_queue), name=f"watch-{job.id}", daemon=True
+        )
+        watcher.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        conn = self._db()
+        self._reap_orphans(conn)
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return IngestionJob.from_row(row) if row else None
+
+    def list(self) -> List[IngestionJob]:
+        conn = self._db()
+        self._reap_orphans(conn)
+        rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC").fetchall()
+        return [IngestionJob.from_row(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Request cancellation. The worker stops at the next batch boundary or write stage;
+        if it does not exit within the grace period the process is terminated, unless it
+        is already committing (swapping the new indexes in), which then runs to completion.
+        A job started by another API worker is cancelled by that worker's watcher.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        self._db().execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        with self._lock:
+            owned = self.jobs.get(job_id)
+        if owned is not None:
+            self._enforce_cancel(owned)
+        return job
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        row = self._db().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def _enforce_cancel(self, job: IngestionJob):
+        if job.cancel_event.is_set():
+            return
+        print(f"[Jobs] Cancelling job {job.id}")
+        job.cancel_event.set()
+
+        def enforce():
+            job.process.join(Config.INGEST_CANCEL_GRACE_SECONDS)
+            if job.process.is_alive() and job.progress.get("stage") == "committing":
+                print(f"[Jobs] Job {job.id} is committing its indexes, letting it finish")
+            elif job.process.is_alive():
+                print(f"[Jobs] Job {job.id} did not stop in time, terminating worker")
+                job.process.terminate()
+
+        threading.Thread(target=enforce, name=f"cancel-{job.id}", daemon=True).start()
+
+    def _watch(self, job: IngestionJob, progress_queue):
+        """Drain progress messages until the worker exits, mirroring them to the jobs table."""
+        outcome = None
+        last_poll = 0.0
+        while True:
+            if time.time() - last_poll >= 0.5:
+                last_poll = time.time()
+                if self._cancel_requested(job.id):
+                    self._enforce_cancel(job)
+            try:
+                message = progress_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not job.process.is_alive():
+                    break
+                continue
+
+            if message["type"] == "progress":
+                job.apply_progress({k: v for k, v in message.items() if k != "type"})
+                self._save(job)
+            else:
+                outcome = message
+                break
+
+        job.process.join()
+        job.finished_at = time.time()
+
+        if outcome and outcome["type"] == "done":
+            job.status = "succeeded"
+        elif job.cancel_event.is_set():
+            job.status = "cancelled"
+        else:
+            job.status = "failed"
+            job.error = (outcome or {}).get("error") or f"Worker exited with code {job.process.exitcode}"
+
+        self._save(job)
+        with self._lock:
+            self.jobs.pop(job.id, None)
+        print(f"[Jobs] Job {job.id} {job.status} after {job.finished_at - job.started_at:.1f}s")
+
+        if job.status == "succeeded" and self.on_success:
+            try:
+                self.on_success(job)
+            except Exception as e:
+                print(f"[Jobs] Post-ingestion hook failed: {e}")
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Forget the oldest finished jobs beyond the history limit."""
+        conn.execute(
+            "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN "
+            "(SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?)",
+            (Config.INGEST_JOB_HISTORY,)
+        )
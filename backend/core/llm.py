@@ -0,0 +1,96 @@
+"""
+LLM Client Factory
+Builds the chat model used by the router, condenser and generator.
+Provider SDKs (langchain_openai, langchain_google_genai) are imported only when the
+corresponding backend is actually selected, keeping them off the import path.
+Also binds llama-server request options (prompt-cache/slot hints, JSON-schema
+constrained decoding, token caps) per chain, and wraps every chain's model in the
+shared client policy (connection pool, timeouts, retries, hedging; see core/llm_client.py).
+"""
+from .config import Config
+from .llm_client import with_stage_policy
+
+
+def local_model_configured() -> bool:
+    return bool(Config.LLM_BACKENDS)
+
+
+def create_llm(gemini_model: str = "gemini-2.5-flash"):
+    """
+    Create the chat model: the pool of local OpenAI-compatible servers if configured,
+    otherwise Gemini.
+    """
+    if local_model_configured():
+        from .llm_pool import PooledChatModel, get_pool
+        print(f"Using Local Model: {Config.LOCAL_MODEL_NAME} at {', '.join(Config.LLM_BACKENDS)}")
+        if Config.LLM_FAST_BACKENDS:
+            print(f"Using Fast Model for {'/'.join(Config.LLM_FAST_STAGES)}: "
+                  f"{Config.LLM_FAST_MODEL_NAME or Config.LOCAL_MODEL_NAME} at {', '.join(Config.LLM_FAST_BACKENDS)}")
+        return PooledChatModel(get_pool("main"))
+
+    if Config.GEMINI_API_KEY:
+        try:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+        except ImportError:
+            ChatGoogleGenerativeAI = None
+        if ChatGoogleGenerativeAI:
+            print(f"Using Gemini Model ({gemini_model})")
+            return ChatGoogleGenerativeAI(
+                model=gemini_model,
+                temperature=0,
+                google_api_key=Config.GEMINI_API_KEY,
+                timeout=max(Config.LLM_STAGE_TIMEOUTS.values()),
+                max_retries=0
+            )
+
+    raise ValueError("No valid API Key found. Please set LOCAL_MODEL_API (or LLM_BACKENDS) or install langchain-google-genai with GEMINI_API_KEY")
+
+
+def stage_model(llm, chain: str):
+    """
+    The chain's pooled model, with affinity to one backend per chain: the fast pool for
+    the short stages (router, condense) if LLM_FAST_BACKENDS is set, else the main pool.
+    """
+    from .llm_pool import PooledChatModel, get_pool
+    if not isinstance(llm, PooledChatModel):
+        return llm
+    if chain in Config.LLM_FAST_STAGES and get_pool("fast"):
+        return PooledChatModel(get_pool("fast"), affinity=chain)
+    return PooledChatModel(llm.pool, affinity=chain)
+
+
+def with_cache_hints(llm, chain: str, json_schema: dict = None, max_tokens: int = None):
+    """
+    Bind llama-server request options for one chain: `cache_prompt` keeps the KV of the
+    previous prompt in the slot, and `id_slot` pins the chain to its own slot (see
+    Config.LLAMA_SLOTS; on the fast pool, the position in LLM_FAST_STAGES) so that the
+    router, condenser and generators do not evict each other's static prefixes. The pool
+    drops the pin for servers without that slot. `json_schema` constrains decoding to the
+    schema (the server compiles it to a grammar) and `max_tokens` caps generation. The
+    request options are llama-server only; the stage's timeout/retry/hedging policy
+    applies to every backend.
+    """
+    if not local_model_configured():
+        return with_stage_policy(llm, chain, local=False)
+    from .llm_pool import PooledChatModel, get_pool
+    fast = chain in Config.LLM_FAST_STAGES and get_pool("fast") is not None
+    llm = stage_model(llm, chain)
+    # Hedges go to the least-loaded backend, not the stage's preferred one (where the
+    # slow primary is running)
+    hedge_llm = PooledChatModel(llm.pool) if isinstance(llm, PooledChatModel) else llm
+
+    extra_body = {}
+    if Config.LLAMA_PROMPT_CACHE:
+        extra_body["cache_prompt"] = True
+        if Config.LLAMA_PIN_SLOTS and chain in Config.LLAMA_SLOTS:
+            extra_body["id_slot"] = Config.LLM_FAST_STAGES.index(chain) if fast else Config.LLAMA_SLOTS[chain]
+    if json_schema is not None and Config.LLAMA_CONSTRAINED_ROUTER:
+        extra_body["json_schema"] = json_schema
+    if max_tokens:
+        extra_body["max_tokens"] = max_tokens
+    # ... and to any free slot rather than queueing behind the pinned one
+    unpinned = {key: value for key, value in extra_body.items() if key != "id_slot"}
+    return with_stage_policy(
+        llm.bind(extra_body=extra_body) if extra_body else llm, chain,
+        unpinned=hedge_llm.bind(extra_body=unpinned) if unpinned else hedge_llm,
+    )
@@ -0,0 +1,301 @@
+"""
+LLM Client Layer
+Shared transport and call policy for every chat-model call:
+- One persistent HTTP connection pool (httpx, keep-alive) per process for the
+  OpenAI-compatible server, sized by LLM_MAX_CONNECTIONS
+- Per-stage timeouts (router / condense / summary / course / general)
+- Jittered exponential-backoff retries on transient errors (timeouts, connection
+  errors, 429/5xx), retried by this layer rather than the SDK so they are counted.
+  Generation stages are not retried after a read timeout: the server may still be
+  decoding the first request, and a retry would double its load
+- Optional hedging for the short router/condense calls: if the first request has not
+  answered after the stage's recent p95 latency, a second one is sent (without slot
+  pinning, from its own thread pool so it never queues behind primaries) and the
+  first answer wins; the losing request is streamed and closed, freeing its slot
+- Cancellation: under a request's cancel event (core/cancellation.py) calls are streamed
+  and the stream is closed as soon as the client disconnects, aborting decoding (both
+  requests of a hedged call)
+
+Metrics: llm.<stage>.calls / retries / errors / hedged / hedge_wins, latency series
+llm.<stage> (p50/p95/p99), and llm_http.requests / connections_opened / connection_reuse
+for the pool.
+"""
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Iterator, Optional, Tuple
+from langchain_core.runnables import Runnable
+from .config import Config
+from .cancellation import GENERATION_STAGES, RequestCancelled, check, current_event, record_generation
+from . import metrics
+
+
+RETRYABLE_ERRORS = {
+    # openai / httpx
+    "APITimeoutError", "APIConnectionError", "InternalServerError", "RateLimitError",
+    "TimeoutException", "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+    # google api_core
+    "ServiceUnavailable", "DeadlineExceeded", "ResourceExhausted",
+}
+# Timeouts after the request reached the server (it may still be working on it)
+READ_TIMEOUT_ERRORS = {"APITimeoutError", "TimeoutException", "ReadTimeout", "DeadlineExceeded"}
+
+_http_client = None
+_http_client_lock = threading.Lock()
+_pools_lock = threading.Lock()
+_primary_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+
+
+# ============================================================================
+# HTTP connection pool
+# ============================================================================
+
+def _trace(event_name: str, info: dict):
+    if event_name == "connection.connect_tcp.complete":
+        metrics.increment("llm_http.connections_opened")
+
+
+def _on_request(request):
+    metrics.increment("llm_http.requests")
+    request.extensions["trace"] = _trace
+
+
+def get_http_client():
+    """Process-wide keep-alive httpx client for the OpenAI-compatible model server."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=Config.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=Config.LLM_KEEPALIVE_SECONDS,
+                ),
+                timeout=httpx.Timeout(max(Config.LLM_STAGE_TIMEOUTS.values()), connect=Config.LLM_CONNECT_TIMEOUT),
+                event_hooks={"request": [_on_request]},
+            )
+    return _http_client
+
+
+def _reset_after_fork():
+    # Pooled sockets must not be shared with a forked worker (serve.py)
+    global _http_client, _http_client_lock, _pools_lock, _primary_pool, _hedge_pool
+    _http_client = None
+    _http_client_lock = threading.Lock()
+    _pools_lock = threading.Lock()
+    _primary_pool = None
+    _hedge_pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def http_stats():
+    requests = metrics.get("llm_http.requests")
+    opened = metrics.get("llm_http.connections_opened")
+    return {"llm_http.connection_reuse": round(1 - opened / requests, 4) if requests else 0.0}
+
+
+# ============================================================================
+# Stage policy
+# ============================================================================
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, connection errors, 429 and 5xx (also when wrapped by the langchain client)."""
+    while error is not None:
+        status = getattr(error, "status_code", None)
+        if status is not None:
+            return status == 429 or status >= 500
+        if type(error).__name__ in RETRYABLE_ERRORS:
+            return True
+        error = error.__cause__
+    return False
+
+
+def is_read_timeout(error: Exception) -> bool:
+    """A timeout waiting for the response (not while connecting)."""
+    names = set()
+    while error is not None:
+        names.add(type(error).__name__)
+        error = error.__cause__
+    return "ConnectTimeout" not in names and bool(names & READ_TIMEOUT_ERRORS)
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, Config.LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+def _get_hedge_pools() -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+    """(primary, hedge) pools for hedged stages; separate so hedges never wait behind primaries."""
+    global _primary_pool, _hedge_pool
+    with _pools_lock:
+        if _primary_pool is None:
+            _primary_pool = ThreadPoolExecutor(max_workers=Config.LLM_MAX_CONNECTIONS, thread_name_prefix="llm-primary")
+            _hedge_pool = ThreadPoolExecutor(max_workers=Config.LLM_MAX_CONNECTIONS, thread_name_prefix="llm-hedge")
+        return _primary_pool, _hedge_pool
+
+
+class StageLLM(Runnable):
+    """
+    A chat model bound for one pipeline stage, applying its timeout, retries and
+    (optionally) hedging. `unpinned` is the same model without slot pinning, used for
+    the hedge request so it does not queue behind the first one in the same slot.
+    """
+
+    def __init__(self, llm, stage: str, unpinned=None):
+        self.llm = llm
+        self.stage = stage
+        self.unpinned = unpinned or llm
+        self.retries = Config.LLM_STAGE_RETRIES.get(stage, 0)
+        self.hedge = Config.LLM_HEDGING and stage in Config.LLM_HEDGE_STAGES
+
+    @property
+    def InputType(self):
+        return self.llm.InputType
+
+    @property
+    def OutputType(self):
+        return self.llm.OutputType
+
+    def _hedge_delay(self) -> float:
+        """Recent p95 latency of the stage (floored), or the configured delay until there are samples."""
+        name = f"llm.{self.stage}"
+        if metrics.get(f"{name}.calls") >= 20:
+            p95 = metrics.percentile(name, 95)
+            if p95 is not None:
+                return max(Config.LLM_HEDGE_MIN_DELAY, p95)
+        return Config.LLM_HEDGE_DELAY
+
+    def _wait(self, futures, timeout: Optional[float] = None):
+        """wait(FIRST_COMPLETED) that raises RequestCancelled once the current request is cancelled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            check(self.stage)
+            step = 0.1 if deadline is None else max(0.0, min(0.1, deadline - time.monotonic()))
+            done, pending = wait(futures, timeout=step, return_when=FIRST_COMPLETED)
+            if done or (deadline is not None and time.monotonic() >= deadline):
+                return done, pending
+
+    def _invoke_hedged(self, input, config, event=None, **kwargs):
+        """
+        Both requests are streamed and stop between chunks once `abort` is set: when the
+        other one has won, or when the request's cancel `event` is set.
+        """
+        primary_pool, hedge_pool = _get_hedge_pools()
+        abort = threading.Event()
+        stop = (lambda: abort.is_set() or event.is_set()) if event is not None else abort.is_set
+        primary = primary_pool.submit(self._stream_message, self.llm, input, config, stop, **kwargs)
+        try:
+            done, _ = self._wait([primary], timeout=self._hedge_delay())
+            if done:
+                return primary.result()
+
+            metrics.increment(f"llm.{self.stage}.hedged")
+            hedge = hedge_pool.submit(self._stream_message, self.unpinned, input, config, stop, **kwargs)
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = self._wait(pending)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            metrics.increment(f"llm.{self.stage}.hedge_wins")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            abort.set()  # Closes the losing request's stream
+
+    def _should_retry(self, error: Exception) -> bool:
+        if self.stage in GENERATION_STAGES and is_read_timeout(error):
+            metrics.increment(f"llm.{self.stage}.timeouts_not_retried")
+            return False
+        return is_retryable(error)
+
+    def _call(self, call):
+        name = f"llm.{self.stage}"
+        for attempt in range(self.retries + 1):
+            check(self.stage)
+            start = time.perf_counter()
+            try:
+                metrics.increment(f"{name}.calls")
+                result = call()
+                metrics.observe(name, time.perf_counter() - start)
+                return result
+            except Exception as e:
+                if attempt >= self.retries or not self._should_retry(e):
+                    metrics.increment(f"{name}.errors")
+                    raise
+                delay = _backoff(attempt)
+                metrics.increment(f"{name}.retries")
+                print(f"  [LLM] {self.stage} call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def _stream_message(self, model, input, config, stop, **kwargs):
+        """Invoke `model` by streaming, closing the stream (and its HTTP connection) once `stop()` is true."""
+        message, tokens = None, 0
+        stream = model.stream(input, config, **kwargs)
+        try:
+            for chunk in stream:
+                message = chunk if message is None else message + chunk
+                tokens += 1  # llama-server streams one token per chunk
+                if stop():
+                    raise RequestCancelled(self.stage, tokens)
+        finally:
+            stream.close()
+        if self.stage in GENERATION_STAGES:
+            record_generation(tokens)
+        return message
+
+    def _record_output(self, result):
+        usage = getattr(result, "usage_metadata", None)
+        if self.stage in GENERATION_STAGES and usage:
+            record_generation(usage.get("output_tokens", 0))
+        return result
+
+    def invoke(self, input, config=None, **kwargs):
+        event = current_event()
+        if self.hedge:
+            return self._call(lambda: self._invoke_hedged(input, config, event, **kwargs))
+        if event is not None:
+            return self._call(lambda: self._stream_message(self.llm, input, config, event.is_set, **kwargs))
+        return self._record_output(self._call(lambda: self.llm.invoke(input, config, **kwargs)))
+
+    def stream(self, input, config=None, **kwargs) -> Iterator[Any]:
+        """Stream chunks; retried only if the failure happens before the first chunk."""
+        name = f"llm.{self.stage}"
+        event = current_event()
+        for attempt in range(self.retries + 1):
+            check(self.stage)
+            start = time.perf_counter()
+            started = False
+            try:
+                metrics.increment(f"{name}.calls")
+                for chunk in self.llm.stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+                    if event is not None and event.is_set():
+                        raise RequestCancelled(self.stage)
+                metrics.observe(name, time.perf_counter() - start)
+                return
+            except Exception as e:
+                if started or attempt >= self.retries or not self._should_retry(e):
+                    metrics.increment(f"{name}.errors")
+                    raise
+                metrics.increment(f"{name}.retries")
+                time.sleep(_backoff(attempt))
+
+
+def with_stage_policy(llm, stage: str, unpinned=None, local: bool = True):
+    """Bind the stage's timeout (OpenAI-compatible backends) and wrap it in its retry/hedging policy."""
+    timeout = Config.LLM_STAGE_TIMEOUTS.get(stage)
+    if local and timeout:
+        llm = llm.bind(timeout=timeout)
+        unpinned = unpinned.bind(timeout=timeout) if unpinned is not None else None
+    return StageLLM(llm, stage, unpinned)
@@ -0,0 +1,264 @@
+"""
+LLM Backend Pool
+Spreads chat-model calls over several OpenAI-compatible servers (e.g. llama-server
+instances) listed in LLM_BACKENDS, so throughput scales by adding model servers:
+- Least-outstanding-requests balancing: each call goes to the healthy backend with the
+  fewest in-flight calls from this worker (ties broken by recent failures, then at random)
+- Stage affinity: each stage (router, condense, general, ...) prefers one backend, chosen
+  by rendezvous hashing of the stage name, so its static prompt prefix stays in that
+  server's KV cache; the call goes elsewhere only when the preferred backend has more than
+  LLM_AFFINITY_MAX_EXTRA in-flight calls above the least-loaded one
+- Slot pinning: an `id_slot` hint is dropped for servers that do not have that slot
+  (slot count read from llama-server's /props)
+- Health checks: a backend whose calls fail LLM_BACKEND_MAX_FAILURES times in a row
+  (timeouts, connection errors, 5xx) or whose /health probe fails is evicted; it is
+  re-admitted once /health answers again (probed every LLM_HEALTH_INTERVAL seconds)
+- Per-stage pools: with LLM_FAST_BACKENDS set, the short stages in LLM_FAST_STAGES
+  (router, condense) use that pool and LLM_FAST_MODEL_NAME, answers stay on the main pool
+
+If every backend of a pool is evicted, calls still go to the least-loaded one rather
+than failing without trying. Counted under llm_pool.* in /metrics.
+"""
+import os
+import time
+import random
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from .config import Config
+from .llm_client import get_http_client, is_retryable
+from . import metrics
+
+
+_pools: Dict[str, "BackendPool"] = {}
+_pools_lock = threading.Lock()
+
+
+class Backend:
+    """One OpenAI-compatible server. The chat client is built lazily in each process."""
+
+    def __init__(self, url: str, model: str):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.label = urlparse(self.url).netloc or self.url
+        self.outstanding = 0
+        self.failures = 0  # Consecutive
+        self.healthy = True
+        self.requests = 0
+        self.errors = 0
+        self.slots: Optional[int] = None  # llama-server slot count (None: not known yet)
+        self._slots_checked_at = 0.0
+        self._llm = None
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from langchain_openai import ChatOpenAI
+            self._llm = ChatOpenAI(
+                base_url=self.url,
+                model=self.model,
+                api_key="ignore-me",
+                temperature=0,
+                http_client=get_http_client(),
+                timeout=max(Config.LLM_STAGE_TIMEOUTS.values()),
+                max_retries=0  # Retried per stage by core/llm_client.py
+            )
+        return self._llm
+
+    @property
+    def root_url(self) -> str:
+        return self.url[:-len("/v1")] if self.url.endswith("/v1") else self.url
+
+    @property
+    def health_url(self) -> str:
+        return f"{self.root_url}/health"
+
+    def has_slot(self, slot: int) -> bool:
+        """Whether the server has slot `slot` (unknown slot counts are re-read at most every health interval)."""
+        if self.slots is None and time.time() - self._slots_checked_at >= Config.LLM_HEALTH_INTERVAL:
+            self._slots_checked_at = time.time()
+            try:
+                response = get_http_client().get(f"{self.root_url}/props", timeout=Config.LLM_CONNECT_TIMEOUT)
+                self.slots = int(response.json()["total_slots"])
+            except Exception:
+                pass  # Not llama-server, or not up yet: don't pin
+        return self.slots is not None and 0 <= slot < self.slots
+
+    def affinity_weight(self, key: str) -> int:
+        """Rendezvous-hash weight of this backend for `key` (stable across processes)."""
+        return int.from_bytes(hashlib.md5(f"{key}|{self.url}".encode("utf-8")).digest()[:8], "big")
+
+
+class BackendPool:
+    def __init__(self, name: str, urls: List[str], model: str):
+        self.name = name
+        self.backends = [Backend(url, model) for url in urls]
+        self._lock = threading.Lock()
+        self._checker: Optional[threading.Thread] = None
+
+    def acquire(self, affinity: Optional[str] = None) -> Backend:
+        """
+        Reserve a healthy backend: the one `affinity` (a stage name) hashes to unless it is
+        overloaded, otherwise the one with the fewest outstanding calls.
+        """
+        if len(self.backends) > 1:
+            self._ensure_checker()
+        with self._lock:
+            candidates = [b for b in self.backends if b.healthy] or self.backends
+            fewest = min((b.outstanding, b.failures) for b in candidates)
+            preferred = max(candidates, key=lambda b: b.affinity_weight(affinity)) if affinity else None
+            if preferred is not None and preferred.outstanding - fewest[0] <= Config.LLM_AFFINITY_MAX_EXTRA:
+                backend = preferred
+            else:
+                backend = random.choice([b for b in candidates if (b.outstanding, b.failures) == fewest])
+                if preferred is not None:
+                    metrics.increment(f"llm_pool.{self.name}.affinity_overflow")
+            backend.outstanding += 1
+            backend.requests += 1
+        return backend
+
+    def release(self, backend: Backend, error: Exception = None):
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.failures = 0
+                return
+            if not is_retryable(error):
+                return  # A rejected request is not the backend's fault
+            backend.errors += 1
+            backend.failures += 1
+            evict = backend.healthy and backend.failures >= Config.LLM_BACKEND_MAX_FAILURES
+            if evict:
+                backend.healthy = False
+        if evict:
+            self._evicted(backend, f"{backend.failures} failed calls")
+
+    def _evicted(self, backend: Backend, reason: str):
+        metrics.increment(f"llm_pool.{self.name}.evictions")
+        print(f"  [LLMPool] Evicted {backend.label} from the {self.name} pool ({reason})")
+        self._ensure_checker()
+
+    # ------------------------------------------------------------------
+    # Health checks
+    # ------------------------------------------------------------------
+
+    def _ensure_checker(self):
+        if self._checker is None or not self._checker.is_alive():
+            with self._lock:
+                if self._checker is None or not self._checker.is_alive():
+                    self._checker = threading.Thread(
+                        target=self._check_loop, name=f"llm-pool-{self.name}", daemon=True
+                    )
+                    self._checker.start()
+
+    def _probe(self, backend: Backend) -> bool:
+        """llama-server answers /health with 503 while loading; servers without it 404 (still up)."""
+        try:
+            response = get_http_client().get(backend.health_url, timeout=Config.LLM_CONNECT_TIMEOUT)
+            return response.status_code < 500
+        except Exception:
+            return False
+
+    def _check_loop(self):
+        while True:
+            time.sleep(Config.LLM_HEALTH_INTERVAL)
+            for backend in self.backends:
+                ok = self._probe(backend)
+                with self._lock:
+                    changed = ok != backend.healthy
+                    backend.healthy = ok
+                    if ok:
+                        backend.failures = 0
+                if changed and ok:
+                    metrics.increment(f"llm_pool.{self.name}.readmissions")
+                    print(f"  [LLMPool] Re-admitted {backend.label} to the {self.name} pool")
+                elif changed:
+                    self._evicted(backend, "health check failed")
+
+    def stats(self) -> Dict[str, float]:
+        prefix = f"llm_pool.{self.name}"
+        with self._lock:
+            stats = {f"{prefix}.healthy": sum(1 for b in self.backends if b.healthy)}
+            for b in self.backends:
+                stats[f"{prefix}.{b.label}.requests"] = b.requests
+                stats[f"{prefix}.{b.label}.errors"] = b.errors
+                stats[f"{prefix}.{b.label}.outstanding"] = b.outstanding
+        return stats
+
+
+class PooledChatModel(Runnable[LanguageModelInput, BaseMessage]):
+    """Chat model that sends each call to a backend picked by its pool (see BackendPool.acquire)."""
+
+    def __init__(self, pool: BackendPool, affinity: Optional[str] = None):
+        self.pool = pool
+        self.affinity = affinity
+
+    @staticmethod
+    def _for_backend(backend: Backend, kwargs: dict) -> dict:
+        """Drop an `id_slot` hint the chosen server has no slot for."""
+        extra_body = kwargs.get("extra_body")
+        if not extra_body or "id_slot" not in extra_body or backend.has_slot(extra_body["id_slot"]):
+            return kwargs
+        extra_body = {key: value for key, value in extra_body.items() if key != "id_slot"}
+        return {**kwargs, "extra_body": extra_body}
+
+    def invoke(self, input, config=None, **kwargs):
+        backend = self.pool.acquire(self.affinity)
+        error = None
+        try:
+            return backend.llm.invoke(input, config, **self._for_backend(backend, kwargs))
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.pool.release(backend, error)
+
+    def stream(self, input, config=None, **kwargs):
+        backend = self.pool.acquire(self.affinity)
+        error = None
+        try:
+            yield from backend.llm.stream(input, config, **self._for_backend(backend, kwargs))
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.pool.release(backend, error)
+
+
+def get_pool(name: str = "main") -> Optional[BackendPool]:
+    """The configured pool ('main' or 'fast'), or None if it has no backends."""
+    with _pools_lock:
+        if name not in _pools:
+            if name == "fast":
+                urls, model = Config.LLM_FAST_BACKENDS, Config.LLM_FAST_MODEL_NAME or Config.LOCAL_MODEL_NAME
+            else:
+                urls, model = Config.LLM_BACKENDS, Config.LOCAL_MODEL_NAME
+            _pools[name] = BackendPool(name, urls, model or "local-model") if urls else None
+        return _pools[name]
+
+
+def pool_stats() -> Dict[str, float]:
+    stats = {}
+    for pool in list(_pools.values()):
+        if pool is not None:
+            stats.update(pool.stats())
+    return stats
+
+
+def _reset_after_fork():
+    # Clients hold the parent's pooled sockets and checker threads do not survive a fork
+    for pool in _pools.values():
+        if pool is not None:
+            pool._lock = threading.Lock()
+            pool._checker = None
+            for backend in pool.backends:
+                backend._llm = None
+                backend.outstanding = 0
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,102 @@
+"""
+Metrics Module
+Lightweight in-process instrumentation helpers: named counters and latency percentiles
+(exposed at /metrics), block timers and process memory.
+"""
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+
+
+_counters: Dict[str, float] = {}
+_counters_lock = threading.Lock()
+
+LATENCY_WINDOW = 1000  # Most recent samples kept per latency series
+_latencies: Dict[str, Deque[float]] = {}
+
+
+def increment(name: str, value: float = 1):
+    """Add `value` to the named counter."""
+    with _counters_lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def get(name: str) -> float:
+    return _counters.get(name, 0)
+
+
+def snapshot() -> Dict[str, float]:
+    """Copy of all counters, sorted by name."""
+    with _counters_lock:
+        return dict(sorted(_counters.items()))
+
+
+def observe(name: str, seconds: float):
+    """Record a latency sample for the named series."""
+    with _counters_lock:
+        samples = _latencies.get(name)
+        if samples is None:
+            samples = _latencies[name] = deque(maxlen=LATENCY_WINDOW)
+        samples.append(seconds)
+
+
+def _nearest_rank(sorted_samples, q: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(round(q / 100 * (len(sorted_samples) - 1))))]
+
+
+def percentile(name: str, q: float) -> Optional[float]:
+    """q-th percentile (0-100) of the recent samples of a series, in seconds (None if empty)."""
+    with _counters_lock:
+        samples = sorted(_latencies.get(name, ()))
+    return _nearest_rank(samples, q) if samples else None
+
+
+def latencies() -> Dict[str, float]:
+    """p50/p95/p99 (ms) and sample count of every latency series, sorted by name."""
+    with _counters_lock:
+        series = {name: sorted(samples) for name, samples in _latencies.items()}
+    result = {}
+    for name, samples in sorted(series.items()):
+        if not samples:
+            continue
+        for q in (50, 95, 99):
+            result[f"{name}.p{q}_ms"] = round(_nearest_rank(samples, q) * 1000, 1)
+        result[f"{name}.samples"] = len(samples)
+    return result
+
+
+@contextmanager
+def timed(timings: Optional[Dict[str, float]], name: str):
+    """Record the wall time of a block (in seconds) into `timings[name]`, if given."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = round(time.perf_counter() - start, 3)
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """
+    Memory of a process in KB from /proc/<pid>/smaps_rollup (Linux):
+    - rss: resident set size (counts shared pages in full)
+    - pss: proportional set size (shared pages divided among sharers)
+    - uss: unique set size (private pages; what the process would free on exit)
+    """
+    pid = pid or os.getpid()
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "pid": pid,
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
@@ -0,0 +1,77 @@
+"""
+Rerank Cache
+Wraps the cross-encoder so that (query, chunk) pairs scored before are served from
+a bounded LRU instead of another forward pass. Keys are (model name, normalized
+query hash, chunk content hash); only the missing pairs of a request are sent to the
+model, in one batch, and merged with the cached scores in the original order.
+
+Drop-in for HuggingFaceCrossEncoder: exposes the same `score(pairs)` method.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Sequence, Tuple
+from .config import Config
+from .answer_cache import normalize_question
+from .retrieval_cache import chunk_id
+from . import metrics
+
+
+class CachedReranker:
+    def __init__(self, cross_encoder, model_name: str = None, max_entries: int = None):
+        self.cross_encoder = cross_encoder
+        self.model_name = model_name or Config.RERANKER_MODEL_NAME
+        self.max_entries = max_entries or Config.RERANK_CACHE_MAX_ENTRIES
+        self._scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _query_key(self, query: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{normalize_question(query)}".encode("utf-8")).hexdigest()[:16]
+
+    def score(self, pairs: Sequence[Sequence[str]]) -> List[float]:
+        """Cross-encoder scores for (query, text) pairs, running the model only on uncached pairs."""
+        keys = [(self._query_key(query), chunk_id(text)) for query, text in pairs]
+        scores: List[Any] = [None] * len(pairs)
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._scores.get(key)
+                if cached is not None:
+                    self._scores.move_to_end(key)
+                    scores[i] = cached
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        metrics.increment("rerank_cache.hits", len(pairs) - len(missing))
+        metrics.increment("rerank_cache.misses", len(missing))
+        if not missing:
+            return scores
+
+        computed = self.cross_encoder.score([list(pairs[i]) for i in missing])
+        with self._lock:
+            for i, score in zip(missing, computed):
+                scores[i] = float(score)
+                self._scores[keys[i]] = scores[i]
+                self._scores.move_to_end(keys[i])
+            evicted = max(0, len(self._scores) - self.max_entries)
+            for _ in range(evicted):
+                self._scores.popitem(last=False)
+        if evicted:
+            metrics.increment("rerank_cache.evictions", evicted)
+        return scores
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        hits, misses = metrics.get("rerank_cache.hits"), metrics.get("rerank_cache.misses")
+        return {
+            "rerank_cache.entries": len(self._scores),
+            "rerank_cache.hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+
+def with_rerank_cache(cross_encoder):
+    """Wrap a cross-encoder in a CachedReranker (unless disabled or already wrapped)."""
+    if not Config.RERANK_CACHE_ENABLED or isinstance(cross_encoder, CachedReranker):
+        return cross_encoder
+    return CachedReranker(cross_encoder)
@@ -1,13 +1,48 @@
 import os
-import pickle
+import time
+import threading
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.cross_encoders import HuggingFaceCrossEncoder
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, NamedTuple
 from pydantic import Field
 from .config import Config
+from .cancellation import check
+from .artifacts import load_lexical_retriever, GENERAL_LEXICAL
+from .metrics import timed
+from . import metrics
+from .retrieval_cache import ChunkStore, chunk_id, get_retrieval_cache
+from .rerank_cache import with_rerank_cache
+
+
+# RRF weight per source. Scoped results get slightly higher weight since they're targeted.
+RRF_SOURCE_WEIGHTS = {"BM25": 1.0, "GlobalVector": 1.0, "ScopedVector": 1.2}
+
+
+def reset_chroma_clients():
+    """
+    Drop chromadb's per-path System cache so the next Chroma(persist_directory=...) opens
+    the directory afresh. Needed after a fork (SQLite connections must not cross it) and
+    after ingestion has swapped a rebuilt index in at the same path: the cached System
+    still reads the replaced directory. Clients opened before keep their own System.
+    """
+    try:
+        from chromadb.api.client import SharedSystemClient
+    except ImportError:
+        return
+    SharedSystemClient.clear_system_cache()
+
+
+class RetrievalResult(NamedTuple):
+    """Final reranked docs with their cross-encoder scores, plus the best RRF score."""
+    scored_docs: List[Tuple[Document, float]]
+    top_rrf: Optional[float]  # None for cache entries written before it was recorded
+
+    @property
+    def docs(self) -> List[Document]:
+        return [doc for doc, score in self.scored_docs]
 
 
 class FilterableHybridRetriever(BaseRetriever):
@@ -21,7 +56,7 @@ class FilterableHybridRetriever(BaseRetriever):
     """
     vectorstore: Any = Field(description="ChromaDB vectorstore instance")
     bm25_retriever: Any = Field(description="BM25 retriever instance")
-    reranker: HuggingFaceCrossEncoder
+    reranker: Any = Field(description="Cross-encoder (HuggingFaceCrossEncoder or CachedReranker)")
     top_k_retrieval: int
     top_k_rerank: int
     
@@ -29,74 +64,246 @@ class FilterableHybridRetriever(BaseRetriever):
     chroma_filter: Optional[Dict[str, Any]] = Field(default=None, description="Metadata filter for scoped vector search")
     keyword_boost: Optional[List[str]] = Field(default=None, description="Keywords to boost in BM25")
 
+    # Retrieval cache (chunk ids + rerank scores) and the store resolving ids to chunks
+    result_cache: Any = Field(default=None, description="RetrievalCache for the general engine")
+    chunk_store: Any = Field(default=None, description="ChunkStore over the BM25 chunks")
+
     class Config:
         arbitrary_types_allowed = True
 
     def _get_relevant_documents(self, query: str) -> List[Document]:
-        all_docs = {}
+        return self.retrieve(query)
+
+    def retrieve(self, query: str, prefetched: Optional[Dict[str, Any]] = None,
+                 use_cache: bool = True) -> List[Document]:
+        """
+        Run the 3-source retrieval, fusion and rerank stages.
         
-        def apply_rrf(docs, weight=1.0, source_name=""):
-            """Apply RRF scoring to a list of documents."""
-            for rank, doc in enumerate(docs):
-                if doc.page_content not in all_docs:
-                    all_docs[doc.page_content] = {"doc": doc, "score": 0.0, "sources": []}
-                # RRF score: weight / (k + rank)
-                all_docs[doc.page_content]["score"] += weight * (1.0 / (60 + rank + 1))
-                if source_name and source_name not in all_docs[doc.page_content]["sources"]:
-                    all_docs[doc.page_content]["sources"].append(source_name)
+        Args:
+            query: The search query
+            prefetched: Output of `prefetch(query)` computed speculatively (e.g. while the
+                        router was running); sources it already holds are not re-run.
+            use_cache: Check the retrieval cache first (False if the caller already did)
+        """
+        return self.retrieve_scored(query, prefetched=prefetched, use_cache=use_cache).docs
+
+    def retrieve_scored(self, query: str, prefetched: Optional[Dict[str, Any]] = None,
+                        use_cache: bool = True) -> RetrievalResult:
+        """Like `retrieve`, keeping the rerank and RRF scores (see RetrievalResult)."""
+        if use_cache:
+            cached = self.cached_scored(query)
+            if cached is not None:
+                return cached
+        start = time.perf_counter()
+
+        if prefetched and prefetched.get("query") != query:
+            prefetched = None
+        sources = dict(prefetched["sources"]) if prefetched else {}
+        query_vector = prefetched.get("query_vector") if prefetched else None
 
         # === SOURCE 1: BM25 (Keyword Search) ===
         # The "Exact Match" anchor - catches course codes, names, specific terms
-        bm25_query = query
-        if self.keyword_boost:
-            bm25_query = f"{query} {' '.join(self.keyword_boost)}"
-        
-        self.bm25_retriever.k = self.top_k_retrieval
-        bm25_docs = self.bm25_retriever.invoke(bm25_query)
-        apply_rrf(bm25_docs, weight=1.0, source_name="BM25")
-        print(f"  [BM25] Retrieved {len(bm25_docs)} docs")
+        bm25_query = self._bm25_query(query)
+        if "BM25" not in sources or prefetched.get("bm25_query") != bm25_query:
+            sources["BM25"] = self.bm25_search(bm25_query)
+        print(f"  [BM25] Retrieved {len(sources['BM25'])} docs")
+
+        # Embed once for both vector sources
+        if query_vector is None and ("GlobalVector" not in sources or self.chroma_filter):
+            query_vector = self.vectorstore.embeddings.embed_query(query)
 
         # === SOURCE 2: Global Vector Search (No Filter) ===
         # The "Vibe" anchor - catches semantic meaning across entire KB
-        global_vector_docs = self.vectorstore.similarity_search(
-            query, 
-            k=self.top_k_retrieval
-        )
-        apply_rrf(global_vector_docs, weight=1.0, source_name="GlobalVector")
-        print(f"  [GlobalVector] Retrieved {len(global_vector_docs)} docs")
+        if "GlobalVector" not in sources:
+            sources["GlobalVector"] = self.vector_search(query_vector)
+        print(f"  [GlobalVector] Retrieved {len(sources['GlobalVector'])} docs")
 
         # === SOURCE 3: Scoped Vector Search (With Router Filter) ===
         # The "Specialist" - drills down into specific sections
         if self.chroma_filter:
-            scoped_vector_docs = self.vectorstore.similarity_search(
-                query, 
-                k=self.top_k_retrieval,
-                filter=self.chroma_filter
-            )
-            # Give scoped results slightly higher weight since they're targeted
-            apply_rrf(scoped_vector_docs, weight=1.2, source_name="ScopedVector")
-            print(f"  [ScopedVector] Retrieved {len(scoped_vector_docs)} docs with filter: {self.chroma_filter}")
+            sources["ScopedVector"] = self.vector_search(query_vector, self.chroma_filter)
+            print(f"  [ScopedVector] Retrieved {len(sources['ScopedVector'])} docs with filter: {self.chroma_filter}")
         else:
             print(f"  [ScopedVector] Skipped (no filter provided)")
 
-        # === RRF Fusion ===
+        fused = self.fuse_scored(sources)
+        if Config.ADAPTIVE_RERANK:
+            scored_docs = self.rerank_adaptive(query, fused) if fused else []
+        else:
+            candidates = [item["doc"] for item in fused][:self.top_k_retrieval * 2]
+            print(f"  [RRF Fusion] {len(fused)} unique docs -> {len(candidates)} candidates for reranking")
+            scored_docs = self.rerank_scored(query, candidates) if candidates else []
+        result = RetrievalResult(scored_docs, fused[0]["score"] if fused else 0.0)
+        self._store_in_cache(query, result, time.perf_counter() - start)
+        return result
+
+    def rerank_working_set(self, query: str, ids: List[str], top_rrf: Optional[float] = None) -> Optional[RetrievalResult]:
+        """
+        Re-rank a previous turn's chunks (by chunk id) for a follow-up on the same topic,
+        skipping BM25, vector search and fusion. `top_rrf` is the best RRF score of the
+        retrieval the chunks came from. None if the chunks are no longer indexed.
+        """
+        if self.chunk_store is None or not ids:
+            return None
+        docs = self.chunk_store.get(ids)
+        if docs is None:
+            return None
+        return RetrievalResult(self.rerank_scored(query, docs), top_rrf)
+
+    def _cache_key(self, query: str) -> str:
+        return self.result_cache.make_key(
+            query,
+            chroma_filter=self.chroma_filter,
+            keywords=sorted(k.lower() for k in self.keyword_boost or []),
+            top_k=[self.top_k_retrieval, self.top_k_rerank],
+            adaptive=Config.ADAPTIVE_RERANK,
+        )
+
+    def cached_scored(self, query: str) -> Optional[RetrievalResult]:
+        """Result for `query` under the current filter from the retrieval cache, or None."""
+        if self.result_cache is None or self.chunk_store is None:
+            return None
+        payload = self.result_cache.get(self._cache_key(query))
+        if payload is None:
+            return None
+        docs = self.chunk_store.get(payload["ids"])
+        if docs is None:
+            return None
+        print(f"  [RetrievalCache] Hit: {len(docs)} docs (retrieval and rerank skipped)")
+        return RetrievalResult(list(zip(docs, payload["scores"])), payload.get("top_rrf"))
+
+    def _store_in_cache(self, query: str, result: RetrievalResult, compute_seconds: float):
+        if self.result_cache is None or self.chunk_store is None:
+            return
+        self.result_cache.put(self._cache_key(query), {
+            "ids": [chunk_id(doc.page_content) for doc, score in result.scored_docs],
+            "scores": [float(score) for doc, score in result.scored_docs],
+            "top_rrf": result.top_rrf,
+        }, compute_seconds)
+
+    def prefetch(self, query: str, cancel_event: Optional[threading.Event] = None) -> Optional[Dict[str, Any]]:
+        """
+        Compute the filter-independent sources (plain BM25 and global vector search)
+        ahead of routing. Returns None if cancelled before finishing.
+        """
+        sources = {"BM25": self.bm25_search(query)}
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        query_vector = self.vectorstore.embeddings.embed_query(query)
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        sources["GlobalVector"] = self.vector_search(query_vector)
+        return {"query": query, "bm25_query": query, "query_vector": query_vector, "sources": sources}
+
+    def _bm25_query(self, query: str) -> str:
+        if self.keyword_boost:
+            return f"{query} {' '.join(self.keyword_boost)}"
+        return query
+
+    def bm25_search(self, bm25_query: str) -> List[Document]:
+        self.bm25_retriever.k = self.top_k_retrieval
+        return self.bm25_retriever.invoke(bm25_query)
+
+    def vector_search(self, query_vector: List[float], chroma_filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return self.vectorstore.similarity_search_by_vector(
+            query_vector,
+            k=self.top_k_retrieval,
+            filter=chroma_filter
+        )
+
+    def fuse(self, sources: Dict[str, List[Document]]) -> List[Document]:
+        """RRF fusion of per-source rankings into rerank candidates."""
+        fused = self.fuse_scored(sources)
+        candidates = [item["doc"] for item in fused][:self.top_k_retrieval * 2]
+        
+        print(f"  [RRF Fusion] {len(fused)} unique docs -> {len(candidates)} candidates for reranking")
+        return candidates
+
+    def fuse_scored(self, sources: Dict[str, List[Document]]) -> List[Dict[str, Any]]:
+        """All fused docs as {"doc", "score", "sources"} dicts, best RRF score first."""
+        all_docs = {}
+        for source_name, docs in sources.items():
+            weight = RRF_SOURCE_WEIGHTS.get(source_name, 1.0)
+            for rank, doc in enumerate(docs):
+                if doc.page_content not in all_docs:
+                    all_docs[doc.page_content] = {"doc": doc, "score": 0.0, "sources": []}
+                # RRF score: weight / (k + rank)
+                all_docs[doc.page_content]["score"] += weight * (1.0 / (60 + rank + 1))
+                if source_name not in all_docs[doc.page_content]["sources"]:
+                    all_docs[doc.page_content]["sources"].append(source_name)
+
         # Sort by combined RRF score
-        sorted_docs = sorted(all_docs.values(), key=lambda x: x["score"], reverse=True)
-        candidates = [item["doc"] for item in sorted_docs][:self.top_k_retrieval * 2]
+        return sorted(all_docs.values(), key=lambda x: x["score"], reverse=True)
+
+    def candidate_budget(self, fused: List[Dict[str, Any]]) -> int:
+        """
+        Number of fused docs worth reranking. Always covers the docs several sources
+        agree on and those within RERANK_RRF_RATIO of the best RRF score, clamped to
+        [top_k_rerank + RERANK_MIN_EXTRA, top_k_retrieval * 2].
+        """
+        floor = min(len(fused), self.top_k_rerank + Config.RERANK_MIN_EXTRA)
+        ceiling = min(len(fused), self.top_k_retrieval * 2)
+        top_score = fused[0]["score"]
+        agreed = sum(1 for item in fused[:ceiling] if len(item["sources"]) > 1)
+        close = sum(1 for item in fused[:ceiling] if item["score"] >= Config.RERANK_RRF_RATIO * top_score)
+        # Docs are sorted by RRF score, so agreed docs (which score higher) come first
+        return max(floor, min(ceiling, max(agreed, close)))
+
+    def rerank_adaptive(self, query: str, fused: List[Dict[str, Any]]) -> List[Tuple[Document, float]]:
+        """
+        Rerank the candidate budget in RRF-ordered mini-batches, stopping early once
+        the top_k_rerank is stable: a whole batch adds nothing to it and its best score
+        trails the current k-th score by RERANK_STABLE_MARGIN.
+        """
+        budget = self.candidate_budget(fused)
+        candidates = [item["doc"] for item in fused[:budget]]
+        batch_size = Config.RERANK_BATCH_SIZE
         
-        print(f"  [RRF Fusion] {len(all_docs)} unique docs -> {len(candidates)} candidates for reranking")
+        scored_docs: List[Tuple[Document, float]] = []
+        early_exit = False
+        for start in range(0, len(candidates), batch_size):
+            check("rerank")  # No-op outside a /chat request
+            batch = candidates[start:start + batch_size]
+            scores = self.reranker.score([[query, doc.page_content] for doc in batch])
+            batch_scored = [(doc, float(scores[i])) for i, doc in enumerate(batch)]
+            
+            if len(scored_docs) >= self.top_k_rerank:
+                kth_score = scored_docs[self.top_k_rerank - 1][1]
+                stable = max(score for doc, score in batch_scored) < kth_score - Config.RERANK_STABLE_MARGIN
+            else:
+                stable = False
+            scored_docs = sorted(scored_docs + batch_scored, key=lambda x: x[1], reverse=True)
+            
+            remaining = len(candidates) - (start + len(batch))
+            if stable and remaining > 0:
+                early_exit = True
+                break
+        
+        metrics.increment("rerank.requests")
+        metrics.increment("rerank.candidates_budgeted", budget)
+        metrics.increment("rerank.candidates_fused", min(len(fused), self.top_k_retrieval * 2))
+        metrics.increment("rerank.pairs_scored", len(scored_docs))
+        if early_exit:
+            metrics.increment("rerank.early_exits")
+        
+        final_docs = scored_docs[:self.top_k_rerank]
+        print(f"  [Rerank] Scored {len(scored_docs)}/{budget} budgeted of {len(fused)} fused docs"
+              f"{' (early exit)' if early_exit else ''}, final {len(final_docs)} docs returned")
+        return final_docs
 
-        if not candidates:
-            return []
+    def rerank(self, query: str, candidates: List[Document]) -> List[Document]:
+        """Rerank candidates with the cross-encoder and keep the top_k_rerank."""
+        return [doc for doc, score in self.rerank_scored(query, candidates)]
 
-        # === Rerank with Cross-Encoder ===
+    def rerank_scored(self, query: str, candidates: List[Document]) -> List[Tuple[Document, float]]:
+        """Like `rerank`, returning (doc, cross-encoder score) pairs."""
         pairs = [[query, doc.page_content] for doc in candidates]
         scores = self.reranker.score(pairs)
         
         scored_docs = [(doc, scores[i]) for i, doc in enumerate(candidates)]
         scored_docs.sort(key=lambda x: x[1], reverse=True)
         
-        final_docs = [doc for doc, score in scored_docs[:self.top_k_rerank]]
+        final_docs = scored_docs[:self.top_k_rerank]
         print(f"  [Rerank] Final {len(final_docs)} docs returned")
         
         return final_docs
@@ -136,7 +343,9 @@ class FilterableHybridRetriever(BaseRetriever):
             top_k_retrieval=self.top_k_retrieval,
             top_k_rerank=self.top_k_rerank,
             chroma_filter=chroma_filter,
-            keyword_boost=keywords
+            keyword_boost=keywords,
+            result_cache=self.result_cache,
+            chunk_store=self.chunk_store
         )
 
 
@@ -205,14 +414,9 @@ def get_retriever():
     )
     vector_retriever = vectorstore.as_retriever(search_kwargs={"k": Config.TOP_K_RETRIEVAL})
 
-    # 2. Load BM25 Retriever
+    # 2. Load BM25 Retriever (memory-mapped artifact bundle)
     bm25_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "bm25_retriever.pkl")
-    if not os.path.exists(bm25_path):
-        raise FileNotFoundError("BM25 retriever not found. Run ingestion first.")
-    
-    with open(bm25_path, "rb") as f:
-        bm25_retriever = pickle.load(f)
-    bm25_retriever.k = Config.TOP_K_RETRIEVAL
+    bm25_retriever = load_lexical_retriever(GENERAL_LEXICAL, bm25_path, k=Config.TOP_K_RETRIEVAL)
 
     # 3. Initialize Reranker
     reranker = HuggingFaceCrossEncoder(model_name=Config.RERANKER_MODEL_NAME)
@@ -227,28 +431,31 @@ def get_retriever():
     )
 
 
-def get_filterable_retriever() -> FilterableHybridRetriever:
+def get_filterable_retriever(timings: Optional[Dict[str, float]] = None) -> FilterableHybridRetriever:
     """
     Get a filterable hybrid retriever that supports metadata filtering.
     Use .with_filter(chroma_filter, keywords) to apply filters.
+    
+    Args:
+        timings: Optional dict that receives per-component load times (seconds)
     """
     # 1. Load Vector Store
-    embeddings = HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
-    vectorstore = Chroma(
-        persist_directory=Config.CHROMA_PERSIST_DIRECTORY,
-        embedding_function=embeddings
-    )
+    with timed(timings, "embedding_model"):
+        embeddings = HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
+    with timed(timings, "general_vectorstore"):
+        vectorstore = Chroma(
+            persist_directory=Config.CHROMA_PERSIST_DIRECTORY,
+            embedding_function=embeddings
+        )
 
-    # 2. Load BM25 Retriever
-    bm25_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "bm25_retriever.pkl")
-    if not os.path.exists(bm25_path):
-        raise FileNotFoundError("BM25 retriever not found. Run ingestion first.")
-    
-    with open(bm25_path, "rb") as f:
-        bm25_retriever = pickle.load(f)
+    # 2. Load BM25 Retriever (memory-mapped artifact bundle)
+    with timed(timings, "general_bm25"):
+        bm25_path = os.path.join(os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY), "bm25_retriever.pkl")
+        bm25_retriever = load_lexical_retriever(GENERAL_LEXICAL, bm25_path, k=Config.TOP_K_RETRIEVAL)
 
     # 3. Initialize Reranker
-    reranker = HuggingFaceCrossEncoder(model_name=Config.RERANKER_MODEL_NAME)
+    with timed(timings, "reranker_model"):
+        reranker = with_rerank_cache(HuggingFaceCrossEncoder(model_name=Config.RERANKER_MODEL_NAME))
 
     # 4. Return Filterable Retriever
     return FilterableHybridRetriever(
@@ -258,5 +465,7 @@ def get_filterable_retriever() -> FilterableHybridRetriever:
         top_k_retrieval=Config.TOP_K_RETRIEVAL,
         top_k_rerank=Config.TOP_K_RERANK,
         chroma_filter=None,
-        keyword_boost=None
+        keyword_boost=None,
+        result_cache=get_retrieval_cache("general"),
+        chunk_store=ChunkStore(bm25_retriever)
     )
@@ -0,0 +1,243 @@
+"""
+Retrieval Cache
+Caches the output of the retrieval engines, which is deterministic for a given
+(query, filter, keywords, index version):
+- Engine A: FilterableHybridRetriever.retrieve (BM25 + vectors + RRF + rerank)
+- Engine B: CourseRetriever.retrieve (waterfall)
+
+Two levels:
+- Memory: per-process LRU
+- Disk: SQLite file shared by every worker process (data/retrieval_cache.sqlite3)
+
+Entries hold chunk ids (content hashes) or course codes plus scores, never pickled
+Documents; hits are resolved against the loaded indexes. Queries are normalized
+(case, whitespace, trailing punctuation) so near-repeats share an entry.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from .config import Config
+from .answer_cache import normalize_question
+from .index_version import read_index_versions
+from . import metrics
+
+
+def chunk_id(text: str) -> str:
+    """Stable id of a chunk: hash of its text (identical in Chroma and the BM25 bundle)."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class ChunkStore:
+    """Resolves chunk ids back to Documents via the BM25 index, which holds every chunk."""
+
+    def __init__(self, bm25_retriever):
+        self.bm25_retriever = bm25_retriever
+        self._positions: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def _build(self) -> Dict[str, int]:
+        texts = getattr(self.bm25_retriever, "texts", None)
+        if texts is None:
+            # Legacy pickled BM25Retriever
+            texts = [doc.page_content for doc in self.bm25_retriever.docs]
+        return {chunk_id(text): i for i, text in enumerate(texts)}
+
+    def get(self, ids: List[str]) -> Optional[List[Document]]:
+        """Documents for `ids`, or None if any id is unknown (index changed underneath)."""
+        with self._lock:
+            if self._positions is None:
+                self._positions = self._build()
+        positions = [self._positions.get(i) for i in ids]
+        if any(p is None for p in positions):
+            return None
+        if hasattr(self.bm25_retriever, "get_document"):
+            return [self.bm25_retriever.get_document(p) for p in positions]
+        docs = self.bm25_retriever.docs
+        return [docs[p] for p in positions]
+
+
+class RetrievalCache:
+    """Memory LRU in front of a shared SQLite table, for one engine ("general" or "courses")."""
+
+    def __init__(self, engine: str, path: Optional[str] = None, max_entries: int = None):
+        self.engine = engine
+        self.path = path if path is not None else (Config.RETRIEVAL_CACHE_PATH if Config.RETRIEVAL_CACHE_DISK else None)
+        self.max_entries = max_entries or Config.RETRIEVAL_CACHE_MEMORY_ENTRIES
+        self.version: Optional[str] = None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts = 0
+
+    # ------------------------------------------------------------------
+    # SQLite (one connection per thread)
+    # ------------------------------------------------------------------
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS retrieval_cache ("
+                " key TEXT PRIMARY KEY, engine TEXT, version TEXT, payload TEXT,"
+                " compute_seconds REAL, created_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS retrieval_cache_age ON retrieval_cache (engine, created_at)")
+            self._local.conn = conn
+        return conn
+
+    def _disk(self, operation: str, *args):
+        """Run a disk operation; the disk level is best effort and never fails a request."""
+        try:
+            conn = self._db()
+            return operation(conn, *args) if conn is not None else None
+        except sqlite3.Error as e:
+            print(f"  [RetrievalCache] Disk cache unavailable: {e}")
+            metrics.increment(f"retrieval_cache.{self.engine}.disk_errors")
+            return None
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def configure(self, version: str):
+        """Attach to an index version; memory entries and disk rows of other versions are dropped."""
+        with self._lock:
+            if version == self.version:
+                return
+            self._entries.clear()
+            self.version = version
+
+        def prune(conn):
+            with conn:
+                deleted = conn.execute(
+                    "DELETE FROM retrieval_cache WHERE engine = ? AND version != ?", (self.engine, version)
+                ).rowcount
+            if deleted:
+                print(f"[RetrievalCache] Dropped {deleted} '{self.engine}' entries from older indexes")
+
+        self._disk(prune)
+
+    def make_key(self, query: str, **params) -> str:
+        key = {"engine": self.engine, "version": self.version, "query": normalize_question(query), **params}
+        return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached payload for `key` (memory first, then disk), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._record_hit("memory", entry)
+                return entry["payload"]
+
+        def read(conn):
+            return conn.execute(
+                "SELECT payload, compute_seconds FROM retrieval_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+        row = self._disk(read)
+        if row is not None:
+            entry = {"payload": json.loads(row[0]), "compute_seconds": row[1]}
+            self._remember(key, entry)
+            self._record_hit("disk", entry)
+            return entry["payload"]
+
+        metrics.increment(f"retrieval_cache.{self.engine}.misses")
+        return None
+
+    def put(self, key: str, payload: Dict[str, Any], compute_seconds: float):
+        entry = {"payload": payload, "compute_seconds": compute_seconds}
+        self._remember(key, entry)
+        metrics.increment(f"retrieval_cache.{self.engine}.stores")
+
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % 100 == 0
+
+        def write(conn):
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO retrieval_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, self.engine, self.version, json.dumps(payload), compute_seconds, time.time())
+                )
+                if prune:
+                    # Keep the newest rows per engine
+                    conn.execute(
+                        "DELETE FROM retrieval_cache WHERE engine = ? AND key NOT IN ("
+                        " SELECT key FROM retrieval_cache WHERE engine = ? ORDER BY created_at DESC LIMIT ?)",
+                        (self.engine, self.engine, Config.RETRIEVAL_CACHE_DISK_MAX_ENTRIES)
+                    )
+
+        self._disk(write)
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _reset_after_fork(self):
+        # The parent's warm-up opened connections; SQLite handles must not cross a fork
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _record_hit(self, level: str, entry: Dict[str, Any]):
+        metrics.increment(f"retrieval_cache.{self.engine}.hits.{level}")
+        metrics.increment(f"retrieval_cache.{self.engine}.seconds_saved", entry["compute_seconds"] or 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        prefix = f"retrieval_cache.{self.engine}"
+        hits = metrics.get(f"{prefix}.hits.memory") + metrics.get(f"{prefix}.hits.disk")
+        lookups = hits + metrics.get(f"{prefix}.misses")
+        return {
+            f"{prefix}.entries": len(self._entries),
+            f"{prefix}.hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_caches: Dict[str, RetrievalCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_retrieval_cache(engine: str) -> Optional[RetrievalCache]:
+    """Process-wide cache for `engine`, attached to its current index version (None if disabled)."""
+    if not Config.RETRIEVAL_CACHE_ENABLED:
+        return None
+    with _caches_lock:
+        cache = _caches.get(engine)
+        if cache is None:
+            cache = _caches[engine] = RetrievalCache(engine)
+    cache.configure(read_index_versions().get(engine, "unversioned"))
+    return cache
+
+
+def _reset_after_fork():
+    # Pre-fork workers (serve.py) reopen the disk level lazily on first use
+    global _caches_lock
+    _caches_lock = threading.Lock()
+    for cache in _caches.values():
+        cache._reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def retrieval_cache_stats() -> Dict[str, Any]:
+    stats = {}
+    for cache in list(_caches.values()):
+        stats.update(cache.stats())
+    return stats
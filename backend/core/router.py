@@ -9,19 +9,15 @@ Also handles greetings and off-topic queries.
 import os
 import json
 import re
-from typing import Optional, List, Dict, Any
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+import time
+from typing import Optional, List, Dict, Any, Tuple
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from pydantic import BaseModel, Field
 from .config import Config
-
-# Try to import Google GenAI, but don't fail if not available
-try:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-    GOOGLE_GENAI_AVAILABLE = True
-except ImportError:
-    GOOGLE_GENAI_AVAILABLE = False
+from .llm import create_llm, with_cache_hints
+from .section_selector import load_section_selector, sections_filter
+from . import metrics
 
 
 # Common greetings and off-topic patterns (checked before LLM call)
@@ -50,6 +46,70 @@ COURSE_KEYWORDS = [
 ]
 
 
+# Intent definitions shared by the router and the combined condense+route prompts
+# (a prompt template fragment: literal braces must be doubled)
+INTENT_DEFINITIONS = """**Your job:** Classify user queries into one of these intents:
+
+1. **"course"** - Questions about SPECIFIC COURSES:
+   - Syllabus, prerequisites, credits, lecture topics
+   - Course codes (CSE101, BIO213, ECE314, MTH100, etc.)
+   - Course instructors/professors
+   - Course descriptions, textbooks, outcomes
+   - "What courses cover X topic?"
+   - "List all CSE/ECE/BIO courses"
+
+2. **"general"** - Questions about IIITD in general:
+   - Admissions, fees, scholarships
+   - Campus facilities, hostels, mess, library
+   - Academic rules, attendance, grading, CGPA
+   - Placements, internships, companies
+   - Faculty research (NOT course teaching)
+   - Student clubs, events, fests
+   - Branches offered (CSE, ECE, CSAM, etc.)
+
+3. **"greeting"** - Casual greetings: hi, hello, thanks, bye
+
+4. **"off_topic"** - Completely unrelated to IIITD: weather, recipes, jokes
+"""
+
+
+def section_id_for(index: int) -> str:
+    """Short section id for the router output: A, B, ..., Z, AA, AB, ..."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def router_output_schema(section_ids: List[str], standalone_question: bool = False) -> Dict[str, Any]:
+    """
+    Compact JSON schema for router output, used for constrained decoding: the intent is
+    an enum, sections are short ids and every list/string is length-capped.
+    """
+    properties = {}
+    if standalone_question:
+        properties["standalone_question"] = {"type": "string", "maxLength": 300}
+    properties["intent"] = {"type": "string", "enum": ["course", "general", "greeting", "off_topic"]}
+    properties["sections"] = {
+        "type": "array",
+        "items": {"type": "string", "enum": section_ids} if section_ids else {"type": "string"},
+        "maxItems": 3 if section_ids else 0
+    }
+    properties["keywords"] = {
+        "type": "array",
+        "items": {"type": "string", "maxLength": 40},
+        "maxItems": 5
+    }
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
 class RouterOutput(BaseModel):
     """Schema for router output"""
     query_type: str = Field(
@@ -67,33 +127,39 @@ class RouterOutput(BaseModel):
 
 
 class SitemapRouter:
-    def __init__(self, llm=None):
-        """Initialize the router with an LLM and load the sitemap."""
+    def __init__(self, llm=None, embeddings=None):
+        """
+        Initialize the router with an LLM and load the sitemap.
+        
+        Args:
+            llm: Chat model for LLM routing (created from config if not given)
+            embeddings: Embedding model for the local intent classifier and the section
+                        selector (both disabled if not given)
+        """
         # Use provided LLM or create one based on config
-        if llm:
-            self.llm = llm
-        elif Config.LOCAL_MODEL_API and Config.LOCAL_MODEL_API.lower() != "null":
-            self.llm = ChatOpenAI(
-                base_url=Config.LOCAL_MODEL_API,
-                model=Config.LOCAL_MODEL_NAME or "local-model",
-                api_key="ignore-me",
-                temperature=0
-            )
-        elif Config.GEMINI_API_KEY and GOOGLE_GENAI_AVAILABLE:
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-2.0-flash",
-                temperature=0,
-                google_api_key=Config.GEMINI_API_KEY
-            )
-        else:
-            raise ValueError("No valid API Key found for Router LLM. Set LOCAL_MODEL_API or install langchain-google-genai.")
+        self.llm = llm or create_llm(gemini_model="gemini-2.0-flash")
+        self.embeddings = embeddings
+        
+        # Section selector picks Header 1 sections from embedding centroids
+        self.section_selector = load_section_selector() if embeddings is not None else None
         
-        # Load sitemap
+        # Local intent classifier resolves confident queries without the LLM
+        self.intent_classifier = None
+        if embeddings is not None and Config.LOCAL_INTENT_CLASSIFIER:
+            try:
+                from .intent_classifier import IntentClassifier
+                self.intent_classifier = IntentClassifier(embeddings)
+            except Exception as e:
+                print(f"Warning: Could not initialize local intent classifier: {e}")
+        
+        # Load sitemap (sections are referred to by short ids in router output)
         self.sitemap = self._load_sitemap()
+        self.section_ids = [section_id_for(i) for i in range(len(self.sitemap.get("sections", [])))]
         self.sitemap_text = self._format_sitemap_for_prompt()
         
-        # Create router chain
+        # Create router chains
         self.router_chain = self._create_router_chain()
+        self.condense_route_chain = self._create_condense_route_chain()
     
     def _load_sitemap(self) -> Dict[str, Any]:
         """Load the sitemap JSON file."""
@@ -113,10 +179,10 @@ class SitemapRouter:
         if not self.sitemap.get("sections"):
             return "No sitemap available."
         
-        lines = ["## Knowledge Base Sitemap (Header 1 Sections):\n"]
-        for section in self.sitemap.get("sections", []):
+        lines = ["## Knowledge Base Sitemap (Header 1 Sections, with section ids):\n"]
+        for section_id, section in zip(self.section_ids, self.sitemap.get("sections", [])):
             h1 = section.get("header_1", "Unknown")
-            lines.append(f"- **{h1}**")
+            lines.append(f"- [{section_id}] **{h1}**")
             
             # Add subsections (Header 2) as a brief preview
             subsections = section.get("subsections", [])
@@ -143,50 +209,94 @@ class SitemapRouter:
         router_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a query classifier for IIIT Delhi's dual knowledge base system.
 
-**Your job:** Classify user queries into one of these intents:
+""" + INTENT_DEFINITIONS + """
+{sitemap}
 
-1. **"course"** - Questions about SPECIFIC COURSES:
-   - Syllabus, prerequisites, credits, lecture topics
-   - Course codes (CSE101, BIO213, ECE314, MTH100, etc.)
-   - Course instructors/professors
-   - Course descriptions, textbooks, outcomes
-   - "What courses cover X topic?"
-   - "List all CSE/ECE/BIO courses"
+---
 
-2. **"general"** - Questions about IIITD in general:
-   - Admissions, fees, scholarships
-   - Campus facilities, hostels, mess, library
-   - Academic rules, attendance, grading, CGPA
-   - Placements, internships, companies
-   - Faculty research (NOT course teaching)
-   - Student clubs, events, fests
-   - Branches offered (CSE, ECE, CSAM, etc.)
+**Output a JSON object with:**
+- "intent": one of ["course", "general", "greeting", "off_topic"]
+- "sections": Ids of the relevant sections, at most 3 (for "general" only, empty for others)
+- "keywords": Key terms from query, at most 5
 
-3. **"greeting"** - Casual greetings: hi, hello, thanks, bye
+**Examples:**
+- "CSE101 syllabus" → {{"intent": "course", "sections": [], "keywords": ["CSE101", "syllabus"]}}
+- "What are the prerequisites for Machine Learning?" → {{"intent": "course", "sections": [], "keywords": ["prerequisites", "Machine Learning"]}}
+- "Fee structure?" → {{"intent": "general", "sections": """ + self._example_sections() + """, "keywords": ["fee", "structure"]}}
+- "hello" → {{"intent": "greeting", "sections": [], "keywords": []}}
 
-4. **"off_topic"** - Completely unrelated to IIITD: weather, recipes, jokes
+Output ONLY valid JSON:"""),
+            ("human", "Query: {query}")
+        ])
+        
+        llm = with_cache_hints(
+            self.llm, "router",
+            json_schema=router_output_schema(self.section_ids),
+            max_tokens=Config.ROUTER_MAX_TOKENS
+        )
+        return router_prompt | llm | StrOutputParser()
+    
+    def _create_condense_route_chain(self):
+        """
+        Create the combined chain that rewrites a follow-up into a standalone question
+        and classifies it in a single LLM call.
+        """
+        condense_route_prompt = ChatPromptTemplate.from_messages([
+            ("system", """You are the query processor for IIIT Delhi's dual knowledge base system.
+For the user's latest input you do TWO things in one response:
 
+**A. Rewrite** it into a standalone question using the chat history:
+- Do NOT answer the question. Do NOT add explanations.
+- If it references previous conversation ("what about that?", "tell me more"), combine it with context from the chat history.
+- If it is already a clear question or a greeting, keep it as-is.
+
+**B. Classify** the standalone question.
+
+""" + INTENT_DEFINITIONS + """
 {sitemap}
 
 ---
 
 **Output a JSON object with:**
+- "standalone_question": The rewritten question (a question, never an answer)
 - "intent": one of ["course", "general", "greeting", "off_topic"]
-- "relevant_sections": List of section names (for "general" only, empty for others)
-- "keywords": Key terms from query
-- "reasoning": Brief explanation (1 sentence)
+- "sections": Ids of the relevant sections, at most 3 (for "general" only, empty for others)
+- "keywords": Key terms from the standalone question, at most 5
 
 **Examples:**
-- "CSE101 syllabus" → {{"intent": "course", "relevant_sections": [], "keywords": ["CSE101", "syllabus"], "reasoning": "Asking for course syllabus"}}
-- "What are the prerequisites for Machine Learning?" → {{"intent": "course", "relevant_sections": [], "keywords": ["prerequisites", "Machine Learning"], "reasoning": "Course prerequisite query"}}
-- "Fee structure?" → {{"intent": "general", "relevant_sections": ["Section 20: Academic Eligibility, Regulations & Ordinances"], "keywords": ["fee", "structure"], "reasoning": "General fees query"}}
-- "hello" → {{"intent": "greeting", "relevant_sections": [], "keywords": [], "reasoning": "Greeting"}}
+- "what about its fees?" (after asking about M.Tech) → {{"standalone_question": "What are the fees for M.Tech?", "intent": "general", "sections": """ + self._example_sections() + """, "keywords": ["fees", "M.Tech"]}}
+- "and its prerequisites?" (after asking about CSE101) → {{"standalone_question": "What are the prerequisites for CSE101?", "intent": "course", "sections": [], "keywords": ["CSE101", "prerequisites"]}}
+- "thanks" → {{"standalone_question": "thanks", "intent": "greeting", "sections": [], "keywords": []}}
 
 Output ONLY valid JSON:"""),
-            ("human", "Query: {query}")
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "Latest input: {question}")
         ])
         
-        return router_prompt | self.llm | StrOutputParser()
+        llm = with_cache_hints(
+            self.llm, "condense",
+            json_schema=router_output_schema(self.section_ids, standalone_question=True),
+            max_tokens=Config.CONDENSE_ROUTE_MAX_TOKENS
+        )
+        return condense_route_prompt | llm | StrOutputParser()
+    
+    def _example_sections(self) -> str:
+        """Section ids for the fees example in the prompts (JSON list literal)."""
+        names = self.get_section_names()
+        example = "Section 20: Academic Eligibility, Regulations & Ordinances"
+        ids = [self.section_ids[names.index(example)]] if example in names else []
+        return json.dumps(ids)
+    
+    def _sections_from_output(self, result: Dict[str, Any]) -> List[str]:
+        """Section names for the ids in router output (older outputs carry names directly)."""
+        if "sections" not in result:
+            return result.get("relevant_sections") or []
+        names = dict(zip(self.section_ids, self.get_section_names()))
+        sections = []
+        for section in result.get("sections") or []:
+            section = str(section).strip().strip("[]")
+            sections.append(names.get(section.upper(), section))
+        return sections
     
     def _is_greeting(self, query: str) -> bool:
         """Fast check for common greetings without LLM."""
@@ -196,36 +306,100 @@ Output ONLY valid JSON:"""),
                 return True
         return False
     
+    def _course_features(self, query: str) -> Tuple[bool, bool]:
+        """(has course code, has course keyword) for a query."""
+        query_lower = query.lower()
+        has_code = bool(COURSE_CODE_PATTERN.search(query))
+        has_keyword = any(keyword in query_lower for keyword in COURSE_KEYWORDS)
+        return has_code, has_keyword
+    
     def _is_course_query(self, query: str) -> bool:
         """Fast check if query is likely course-related."""
-        query_lower = query.lower()
+        has_code, has_keyword = self._course_features(query)
+        return has_code or has_keyword
+    
+    def _embed_query(self, query: str):
+        """Normalized query embedding, shared by the intent classifier and section selector."""
+        import numpy as np
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+    
+    def _select_sections(self, query_vector, llm_sections: List[str] = None) -> List[str]:
+        """
+        Relevant Header 1 sections: from the centroid selector when available, otherwise
+        the LLM's suggestions restricted to names that actually exist in the sitemap.
+        """
+        if self.section_selector is not None and query_vector is not None:
+            selected = self.section_selector.select(query_vector)
+            if selected:
+                return [name for name, _ in selected]
         
-        # Check for course code pattern
-        if COURSE_CODE_PATTERN.search(query):
-            return True
+        if not llm_sections:
+            return []
+        known = set(self.get_section_names())
+        if self.section_selector is not None:
+            valid = self.section_selector.validate(llm_sections)
+        else:
+            valid = [s for s in llm_sections if s in known]
+        if len(valid) < len(llm_sections):
+            metrics.increment("router.invalid_llm_sections", len(llm_sections) - len(valid))
+            print(f"  [Router] Dropped unknown sections from LLM: {[s for s in llm_sections if s not in valid]}")
+        return valid
+    
+    def _classify_locally(self, query: str, query_vector=None) -> Optional[Dict[str, Any]]:
+        """
+        Route with the local embedding classifier. Returns None when it is not
+        confident enough and the LLM should decide.
+        """
+        if not self.intent_classifier:
+            return None
         
-        # Check for course keywords
-        for keyword in COURSE_KEYWORDS:
-            if keyword in query_lower:
-                return True
+        has_code, has_keyword = self._course_features(query)
+        intent, confidence, _ = self.intent_classifier.classify(
+            query, has_course_code=has_code, has_course_keyword=has_keyword, query_vector=query_vector
+        )
+        skip_retrieval = intent in ["greeting", "off_topic"]
+        threshold = Config.INTENT_SKIP_RETRIEVAL_THRESHOLD if skip_retrieval else Config.INTENT_CONFIDENCE_THRESHOLD
+        if confidence < threshold:
+            metrics.increment("router.local_classifier.deferred")
+            print(f"  [Router] Local classifier unsure ({intent}, {confidence:.2f}), deferring to LLM")
+            return None
         
-        return False
+        metrics.increment("router.local_classifier.resolved")
+        metrics.increment("router.llm_calls_avoided")
+        sections = self._select_sections(query_vector) if intent == "general" else []
+        return {
+            "intent": intent,
+            "relevant_sections": sections,
+            "keywords": [],
+            "reasoning": f"Local classifier ({confidence:.2f} confidence)",
+            "chroma_filter": sections_filter(sections),
+            "skip_retrieval": skip_retrieval
+        }
 
     def _parse_llm_output(self, output: str) -> Dict[str, Any]:
         """Parse LLM output with fallback handling for malformed JSON."""
         output = output.strip()
         
-        # Try direct JSON parse
+        # Try direct JSON parse (the only path taken with constrained decoding)
         try:
-            return json.loads(output)
+            result = json.loads(output)
+            if isinstance(result, dict):
+                metrics.increment("router.parse.json")
+                return result
         except json.JSONDecodeError:
             pass
         
+        # Cold path: prose around the JSON, truncated output, etc.
+        print(f"  [Router] Output was not plain JSON, using fallback parsing")
+        
         # Try to find JSON in the output (between { and })
         json_match = re.search(r'\{[^{}]*\}', output, re.DOTALL)
         if json_match:
             try:
-                return json.loads(json_match.group())
+                result = json.loads(json_match.group())
+                metrics.increment("router.parse.fallback_flat")
+                return result
             except json.JSONDecodeError:
                 pass
         
@@ -233,11 +407,14 @@ Output ONLY valid JSON:"""),
         json_match = re.search(r'\{.*\}', output, re.DOTALL)
         if json_match:
             try:
-                return json.loads(json_match.group())
+                result = json.loads(json_match.group())
+                metrics.increment("router.parse.fallback_nested")
+                return result
             except json.JSONDecodeError:
                 pass
         
         # Fallback: try to extract key information with regex
+        metrics.increment("router.parse.fallback_keywords")
         result = {
             "intent": "general",
             "relevant_sections": [],
@@ -256,6 +433,50 @@ Output ONLY valid JSON:"""),
         
         return result
 
+    def _build_route(self, result: Dict[str, Any], query: str, query_vector=None) -> Dict[str, Any]:
+        """Turn parsed LLM router output into the route dict returned by `route`."""
+        # Get intent (handle both old 'query_type' and new 'intent' keys)
+        intent = result.get("intent") or result.get("query_type", "general")
+        
+        # Override with fast path detection if LLM missed it
+        if self._is_course_query(query) and intent == "general":
+            intent = "course"
+            print(f"  [Router] Overriding to 'course' based on fast path detection")
+        
+        # Map old values to new
+        if intent == "rag":
+            intent = "general"
+        
+        # Determine if we should skip retrieval
+        skip_retrieval = intent in ["greeting", "off_topic"]
+        
+        # Build ChromaDB filter from sections (only for general intent)
+        sections = []
+        if intent == "general":
+            sections = self._select_sections(query_vector, self._sections_from_output(result))
+        chroma_filter = sections_filter(sections)
+        
+        return {
+            "intent": intent,
+            "relevant_sections": sections,
+            "keywords": result.get("keywords", []),
+            "reasoning": result.get("reasoning", "LLM router"),
+            "chroma_filter": chroma_filter,
+            "skip_retrieval": skip_retrieval
+        }
+
+    def _greeting_route(self) -> Dict[str, Any]:
+        metrics.increment("router.greeting_fast_path")
+        metrics.increment("router.llm_calls_avoided")
+        return {
+            "intent": "greeting",
+            "relevant_sections": [],
+            "keywords": [],
+            "reasoning": "Detected as greeting (fast path)",
+            "chroma_filter": None,
+            "skip_retrieval": True
+        }
+
     def route(self, query: str) -> Dict[str, Any]:
         """
         Route a query to determine intent and relevant filters.
@@ -269,62 +490,38 @@ Output ONLY valid JSON:"""),
             - chroma_filter: Filter for ChromaDB (general only)
             - skip_retrieval: Whether to skip retrieval entirely
         """
+        metrics.increment("router.requests")
+        
         # Fast path: check for common greetings without LLM
         if self._is_greeting(query):
-            return {
-                "intent": "greeting",
-                "relevant_sections": [],
-                "keywords": [],
-                "reasoning": "Detected as greeting (fast path)",
-                "chroma_filter": None,
-                "skip_retrieval": True
-            }
+            return self._greeting_route()
+        
+        # Embed once for the local classifier and the section selector
+        query_vector = None
+        if self.intent_classifier is not None or self.section_selector is not None:
+            query_vector = self._embed_query(query)
+        
+        # Fast path: local embedding classifier for confident cases
+        local_route = self._classify_locally(query, query_vector)
+        if local_route:
+            return local_route
         
         # Fast path: check for obvious course queries
         is_likely_course = self._is_course_query(query)
         
         try:
             # Call LLM router
+            metrics.increment("router.llm_calls")
+            start = time.perf_counter()
             raw_output = self.router_chain.invoke({
                 "query": query,
                 "sitemap": self.sitemap_text
             })
+            metrics.increment("router.llm_seconds", time.perf_counter() - start)
             
             # Parse with fallback handling
             result = self._parse_llm_output(raw_output)
-            
-            # Get intent (handle both old 'query_type' and new 'intent' keys)
-            intent = result.get("intent") or result.get("query_type", "general")
-            
-            # Override with fast path detection if LLM missed it
-            if is_likely_course and intent == "general":
-                intent = "course"
-                print(f"  [Router] Overriding to 'course' based on fast path detection")
-            
-            # Map old values to new
-            if intent == "rag":
-                intent = "general"
-            
-            # Determine if we should skip retrieval
-            skip_retrieval = intent in ["greeting", "off_topic"]
-            
-            # Build ChromaDB filter from sections (only for general intent)
-            chroma_filter = None
-            if intent == "general" and result.get("relevant_sections"):
-                sections = result["relevant_sections"]
-                if len(sections) == 1:
-                    chroma_filter = {"Header 1": sections[0]}
-                elif len(sections) > 1:
-                    chroma_filter = {"$or": [{"Header 1": s} for s in sections]}
-            
-            return {
-                "intent": intent,
-                "relevant_sections": result.get("relevant_sections", []),
-                "keywords": result.get("keywords", []),
-                "reasoning": result.get("reasoning", ""),
-                "chroma_filter": chroma_filter,
-                "skip_retrieval": skip_retrieval
-            }
+            return self._build_route(result, query, query_vector)
         except Exception as e:
             print(f"Router error: {e}")
             # Fallback: use fast path detection or default to general
@@ -338,6 +535,66 @@ Output ONLY valid JSON:"""),
                 "skip_retrieval": False
             }
     
+    def condense_and_route(self, question: str, chat_history: list) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Rewrite a follow-up into a standalone question and route it with ONE LLM call,
+        instead of a condense round trip followed by a router round trip.
+        
+        Returns:
+            Tuple of (standalone question, route info as returned by `route`), or
+            (None, None) if the LLM output had no usable standalone question and the
+            caller should condense and route separately.
+        """
+        metrics.increment("router.requests")
+        
+        # Greetings need neither rewriting nor the LLM
+        if self._is_greeting(question):
+            return question, self._greeting_route()
+        
+        try:
+            metrics.increment("router.llm_calls")
+            metrics.increment("router.combined_calls")
+            start = time.perf_counter()
+            raw_output = self.condense_route_chain.invoke({
+                "question": question,
+                "chat_history": chat_history,
+                "sitemap": self.sitemap_text
+            })
+            metrics.increment("router.llm_seconds", time.perf_counter() - start)
+            result = self._parse_llm_output(raw_output)
+        except Exception as e:
+            print(f"Router error (condense+route): {e}")
+            result = {}
+        
+        standalone = result.get("standalone_question")
+        if not isinstance(standalone, str) or not standalone.strip():
+            metrics.increment("router.combined_fallbacks")
+            print("  [Router] Combined output had no standalone question, falling back")
+            return None, None
+        
+        # The separate condense call is what this saves
+        metrics.increment("router.llm_calls_avoided")
+        standalone = standalone.strip()
+        query_vector = self._embed_query(standalone) if self.section_selector is not None else None
+        return standalone, self._build_route(result, standalone, query_vector)
+    
+    def suggest_sections(self, query: str, n: int = 3) -> List[str]:
+        """Sitemap sections closest to a query (for "try asking about" suggestions)."""
+        if self.section_selector is not None and self.embeddings is not None:
+            selected = self.section_selector.select(self._embed_query(query), top_n=n, margin=1.0, min_similarity=0.0)
+            return [name for name, score in selected]
+        
+        # No centroids: rank sections by word overlap with their header and subsections
+        query_words = {w for w in re.findall(r"[a-z]+", query.lower()) if len(w) > 3}
+        ranked = []
+        for section in self.sitemap.get("sections", []):
+            text = " ".join([section.get("header_1", "")] + section.get("subsections", []))
+            overlap = len(query_words & set(re.findall(r"[a-z]+", text.lower())))
+            if overlap:
+                ranked.append((overlap, section.get("header_1", "")))
+        ranked.sort(key=lambda x: x[0], reverse=True)
+        return [name for _, name in ranked[:n]]
+    
     def get_section_names(self) -> List[str]:
         """Get list of all Header 1 section names."""
         return [s.get("header_1", "") for s in self.sitemap.get("sections", [])]
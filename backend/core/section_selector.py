@@ -0,0 +1,175 @@
+"""
+Section Selector
+Picks the knowledge-base sections relevant to a query by comparing the query embedding
+against per-section (Header 1) and per-subsection (Header 1 > Header 2) embedding
+centroids, instead of asking the router LLM for section names.
+
+Centroids are computed from the chunk embeddings already stored in Chroma, so every
+selected name is an exact `Header 1` value and the resulting `chroma_filter` always
+matches documents.
+
+Usage (rebuild centroids without re-ingesting):
+    python -m core.section_selector
+"""
+import os
+from typing import Dict, List, Tuple, Optional, Any
+import numpy as np
+from .config import Config
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def build_section_centroids(vectorstore, path: str = None, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Compute section and subsection centroids from the chunk embeddings in a Chroma
+    vector store and save them to `path` (default: Config.SECTION_CENTROIDS_PATH).
+
+    Returns:
+        Dict with the number of sections and subsections written
+    """
+    path = path or Config.SECTION_CENTROIDS_PATH
+    sums: Dict[Tuple[str, str], np.ndarray] = {}
+    counts: Dict[Tuple[str, str], int] = {}
+
+    offset = 0
+    while True:
+        page = vectorstore.get(include=["embeddings", "metadatas"], limit=batch_size, offset=offset)
+        embeddings = page.get("embeddings")
+        if embeddings is None or len(embeddings) == 0:
+            break
+        for vector, metadata in zip(embeddings, page["metadatas"]):
+            h1 = (metadata or {}).get("Header 1")
+            if not h1:
+                continue
+            # Normalize per chunk so long and short chunks weigh the same
+            vector = _normalize(np.asarray(vector, dtype=np.float32))
+            # A set: chunks without a Header 2 count once towards their section, not twice
+            for key in {(h1, ""), (h1, (metadata or {}).get("Header 2") or "")}:
+                if key in sums:
+                    sums[key] += vector
+                    counts[key] += 1
+                else:
+                    sums[key] = vector.copy()
+                    counts[key] = 1
+        offset += len(embeddings)
+
+    sections = sorted(key for key in sums if not key[1])
+    subsections = sorted(key for key in sums if key[1])
+
+    def centroids(keys):
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return _normalize(np.stack([sums[k] / counts[k] for k in keys])).astype(np.float32)
+
+    tmp_path = path + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        section_names=np.array([h1 for h1, _ in sections], dtype=str),
+        section_centroids=centroids(sections),
+        section_counts=np.array([counts[k] for k in sections], dtype=np.int32),
+        subsection_parents=np.array([h1 for h1, _ in subsections], dtype=str),
+        subsection_names=np.array([h2 for _, h2 in subsections], dtype=str),
+        subsection_centroids=centroids(subsections),
+    )
+    os.replace(tmp_path, path)
+    print(f"Section centroids saved to {path} ({len(sections)} sections, {len(subsections)} subsections)")
+    return {"sections": len(sections), "subsections": len(subsections)}
+
+
+class SectionSelector:
+    """Vectorized cosine-similarity lookup over precomputed section centroids."""
+
+    def __init__(self, path: str = None):
+        path = path or Config.SECTION_CENTROIDS_PATH
+        data = np.load(path)
+        self.section_names: List[str] = [str(n) for n in data["section_names"]]
+        self.section_matrix = data["section_centroids"]
+        self.subsection_parents: List[str] = [str(n) for n in data["subsection_parents"]]
+        self.subsection_names: List[str] = [str(n) for n in data["subsection_names"]]
+        self.subsection_matrix = data["subsection_centroids"]
+
+        # Subsection row -> parent section column, for max-pooling subsection scores
+        index = {name: i for i, name in enumerate(self.section_names)}
+        self.subsection_section = np.array([index[p] for p in self.subsection_parents], dtype=np.int64)
+        self._casefolded = {name.casefold(): name for name in self.section_names}
+        print(f"SectionSelector loaded {len(self.section_names)} sections, {len(self.subsection_names)} subsections")
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """
+        Per-section score: the best of the section centroid and its subsection centroids
+        (narrow subsections are often a much closer match than the whole section).
+        """
+        query_vector = _normalize(np.asarray(query_vector, dtype=np.float32))
+        scores = self.section_matrix @ query_vector
+        if len(self.subsection_names):
+            np.maximum.at(scores, self.subsection_section, self.subsection_matrix @ query_vector)
+        return scores
+
+    def select(self, query_vector: np.ndarray, top_n: int = None,
+               margin: float = None, min_similarity: float = None) -> List[Tuple[str, float]]:
+        """
+        Top sections for a query: at most `top_n`, within `margin` of the best score and
+        above `min_similarity`.
+
+        Returns:
+            List of (section name, score), best first
+        """
+        top_n = top_n or Config.SECTION_SELECTOR_TOP_N
+        margin = Config.SECTION_SELECTOR_MARGIN if margin is None else margin
+        min_similarity = Config.SECTION_SELECTOR_MIN_SIMILARITY if min_similarity is None else min_similarity
+        if not self.section_names:
+            return []
+
+        scores = self.scores(query_vector)
+        order = np.argsort(-scores)[:top_n]
+        best = scores[order[0]]
+        return [
+            (self.section_names[i], float(scores[i]))
+            for i in order
+            if scores[i] >= min_similarity and scores[i] >= best - margin
+        ]
+
+    def validate(self, sections: List[str]) -> List[str]:
+        """Map section names (e.g. from the LLM) to exact known names, dropping unknown ones."""
+        valid = []
+        for section in sections:
+            name = self._casefolded.get(str(section).strip().casefold())
+            if name and name not in valid:
+                valid.append(name)
+        return valid
+
+
+def load_section_selector(path: str = None) -> Optional[SectionSelector]:
+    """Load the selector, or None if centroids have not been built yet."""
+    path = path or Config.SECTION_CENTROIDS_PATH
+    if not os.path.exists(path):
+        print(f"Warning: Section centroids not found at {path}. Run ingestion first.")
+        return None
+    try:
+        return SectionSelector(path)
+    except Exception as e:
+        print(f"Warning: Could not load section centroids: {e}")
+        return None
+
+
+def sections_filter(sections: List[str]) -> Optional[Dict[str, Any]]:
+    """ChromaDB metadata filter matching any of the given Header 1 sections."""
+    if len(sections) == 1:
+        return {"Header 1": sections[0]}
+    if len(sections) > 1:
+        return {"$or": [{"Header 1": s} for s in sections]}
+    return None
+
+
+if __name__ == "__main__":
+    from langchain_chroma import Chroma
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    vectorstore = Chroma(
+        persist_directory=Config.CHROMA_PERSIST_DIRECTORY,
+        embedding_function=HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
+    )
+    build_section_centroids(vectorstore)
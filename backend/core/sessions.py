@@ -0,0 +1,278 @@
+"""
+Chat Sessions
+Server-side conversation state, so clients send a session id instead of the whole
+chat history and the condenser sees a bounded history however long the chat runs:
+- The last SESSION_HISTORY_TURNS turns are kept verbatim (long answers clipped), within
+  SESSION_HISTORY_TOKEN_BUDGET tokens
+- Turns leaving the window are folded into a running summary by a background LLM call
+  (incremental: previous summary + evicted turns -> new summary)
+
+Sessions live in a per-process LRU (SESSION_MAX_ENTRIES, idle TTL). With
+SESSION_STORE_DISK (automatic when serving with more than one worker) the SQLite file
+data/sessions.sqlite3 is the source of truth instead, so sessions survive restarts and
+are shared by all pre-fork workers.
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from .config import Config
+from .llm import with_cache_hints
+from .context_packer import load_context_token_counter
+from . import metrics
+
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You maintain a running summary of a conversation between a user and IIITD-CHATBOT, an assistant for IIIT Delhi.
+Update the summary with the new turns. Keep the topics, programs, course codes, names and facts the user may refer back to.
+Write at most 5 short sentences. Output ONLY the updated summary."""),
+    ("human", "Current summary:\n{summary}\n\nNew turns:\n{turns}"),
+])
+
+
+class Session:
+    def __init__(self, session_id: str, summary: str = "", summarized_turns: int = 0,
+                 turns: List[Tuple[str, str]] = None, working_set: Optional[Dict[str, Any]] = None,
+                 created_at: float = None, updated_at: float = None):
+        self.id = session_id
+        self.summary = summary
+        self.summarized_turns = summarized_turns  # Turns folded into the summary so far
+        self.turns = [tuple(turn) for turn in (turns or [])]  # Turns not summarized yet, oldest first
+        self.working_set = working_set  # Courses / chunks of the last answer (see working_set.py)
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "summary": self.summary,
+            "summarized_turns": self.summarized_turns,
+            "turns": [list(turn) for turn in self.turns],
+            "working_set": self.working_set,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, session_id: str, data: Dict[str, Any]) -> "Session":
+        return cls(session_id, **data)
+
+
+@lru_cache(maxsize=1)
+def _default_token_counter():
+    return load_context_token_counter()
+
+
+def window_history(turns: List[Tuple[str, str]], summary: str = "", count_tokens=None,
+                   max_turns: int = None, budget: int = None) -> list:
+    """
+    Chat history messages for the condenser: the summary (if any) followed by the newest
+    turns that fit in `max_turns` and the token budget, with long answers clipped.
+    """
+    count_tokens = count_tokens or _default_token_counter()
+    max_turns = max_turns or Config.SESSION_HISTORY_TURNS
+    budget = budget or Config.SESSION_HISTORY_TOKEN_BUDGET
+    max_answer_chars = int(Config.SESSION_ANSWER_MAX_TOKENS * Config.CONTEXT_CHARS_PER_TOKEN)
+
+    kept, used = [], 0
+    if summary:
+        summary_message = AIMessage(content=f"Summary of the earlier conversation: {summary}")
+        used += count_tokens(summary_message.content)
+    for human, ai in reversed(turns[-max_turns:]):
+        if len(ai) > max_answer_chars:
+            ai = ai[:max_answer_chars].rsplit(" ", 1)[0] + " ..."
+        cost = count_tokens(human) + count_tokens(ai)
+        if kept and used + cost > budget:
+            break
+        kept.append((human, ai))
+        used += cost
+
+    messages = [summary_message] if summary else []
+    for human, ai in reversed(kept):
+        messages.append(HumanMessage(content=human))
+        messages.append(AIMessage(content=ai))
+    return messages
+
+
+def use_disk_store() -> bool:
+    """SESSION_STORE_DISK true/false, or "auto": on when several workers serve the API."""
+    if Config.SESSION_STORE_DISK == "auto":
+        return Config.WEB_CONCURRENCY > 1
+    if Config.SESSION_STORE_DISK != "true" and Config.WEB_CONCURRENCY > 1:
+        print(f"Warning: SESSION_STORE_DISK is off with {Config.WEB_CONCURRENCY} workers; "
+              f"sessions are per worker and will be lost when a request lands on another one")
+    return Config.SESSION_STORE_DISK == "true"
+
+
+class SessionStore:
+    def __init__(self, path: Optional[str] = None, max_entries: int = None, ttl_seconds: int = None):
+        self.path = path if path is not None else (Config.SESSION_STORE_PATH if use_disk_store() else None)
+        self.max_entries = max_entries or Config.SESSION_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.SESSION_TTL_SECONDS
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.count_tokens = _default_token_counter()
+        self._local = threading.local()
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-summary")
+        self._saves = 0
+
+    # ------------------------------------------------------------------
+    # SQLite (one connection per thread)
+    # ------------------------------------------------------------------
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, payload TEXT, updated_at REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_age ON sessions (updated_at)")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def get_or_create(self, session_id: Optional[str]) -> Session:
+        """The session for `session_id`, or a new one if it is unknown or expired."""
+        session = self.get(session_id) if session_id else None
+        if session is None:
+            session = Session(uuid.uuid4().hex)
+            metrics.increment("sessions.created")
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        if self.path:
+            try:
+                row = self._db().execute(
+                    "SELECT payload FROM sessions WHERE id = ? AND updated_at > ?",
+                    (session_id, time.time() - self.ttl_seconds)
+                ).fetchone()
+                return Session.from_dict(session_id, json.loads(row[0])) if row else None
+            except sqlite3.Error as e:
+                print(f"  [Sessions] Session store unavailable: {e}")
+                metrics.increment("sessions.disk_errors")
+                return None
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or time.time() - session.updated_at > self.ttl_seconds:
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def save(self, session: Session):
+        session.updated_at = time.time()
+        if self.path:
+            try:
+                conn = self._db()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                        (session.id, json.dumps(session.to_dict()), session.updated_at)
+                    )
+                    self._saves += 1
+                    if self._saves % 100 == 0:
+                        conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            except sqlite3.Error as e:
+                print(f"  [Sessions] Could not save session: {e}")
+                metrics.increment("sessions.disk_errors")
+            return
+
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+                metrics.increment("sessions.evictions")
+
+    def history(self, session: Session) -> list:
+        """Bounded chat history (summary + recent turns) for the condenser."""
+        return window_history(session.turns, session.summary, self.count_tokens)
+
+    def record_turn(self, session: Session, question: str, answer: str, llm=None,
+                    working_set: Optional[Dict[str, Any]] = None):
+        """Append a turn; turns leaving the window are summarized in the background."""
+        with self._lock:
+            # Re-read: the background summarizer may have saved a newer state meanwhile
+            session = self.get(session.id) or session
+            session.turns.append((question, answer))
+            session.working_set = working_set
+            # Hard bound if summarization is unavailable or falling behind (dropped turns
+            # count as summarized, so a pending summary of them is discarded)
+            dropped = len(session.turns) - Config.SESSION_HISTORY_TURNS * 4
+            if dropped > 0:
+                del session.turns[:dropped]
+                session.summarized_turns += dropped
+            self.save(session)
+        metrics.increment("sessions.turns")
+        overflow = len(session.turns) - Config.SESSION_HISTORY_TURNS
+        if overflow > 0 and llm is not None:
+            self._summarizer.submit(self._summarize, session.id, session.summarized_turns, overflow, llm)
+
+    def _summarize(self, session_id: str, summarized_turns: int, count: int, llm):
+        session = self.get(session_id)
+        if session is None or session.summarized_turns != summarized_turns:
+            return  # Expired, or another worker already folded these turns in
+        evicted = session.turns[:count]
+        turns_text = "\n".join(f"User: {human}\nAssistant: {ai}" for human, ai in evicted)
+        start = time.perf_counter()
+        try:
+            chain = SUMMARY_PROMPT | with_cache_hints(llm, "summary", max_tokens=Config.SESSION_SUMMARY_MAX_TOKENS) | StrOutputParser()
+            summary = chain.invoke({"summary": session.summary or "(empty)", "turns": turns_text}).strip()
+        except Exception as e:
+            # Keep the user's questions; they carry most of what follow-ups refer to
+            print(f"  [Sessions] Summarization failed, keeping questions only: {e}")
+            metrics.increment("sessions.summary_errors")
+            summary = " ".join(filter(None, [session.summary, "The user asked: " + "; ".join(h for h, _ in evicted)]))
+
+        # Re-read: a new turn may have been recorded while the LLM was summarizing
+        with self._lock:
+            latest = self.get(session_id) or session
+            if latest.summarized_turns != summarized_turns:
+                return
+            latest.summary = summary
+            latest.summarized_turns += count
+            latest.turns = latest.turns[count:]
+            self.save(latest)
+        metrics.increment("sessions.summaries")
+        metrics.increment("sessions.summary_seconds", round(time.perf_counter() - start, 3))
+
+    def stats(self) -> Dict[str, Any]:
+        active = len(self._sessions)
+        if self.path:
+            try:
+                active = self._db().execute(
+                    "SELECT COUNT(*) FROM sessions WHERE updated_at > ?", (time.time() - self.ttl_seconds,)
+                ).fetchone()[0]
+            except sqlite3.Error:
+                active = None
+        return {"sessions.active": active, "sessions.disk": bool(self.path)}
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """Process-wide session store (None if sessions are disabled)."""
+    global _store
+    if not Config.SESSIONS_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore()
+    return _store
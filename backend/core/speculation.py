@@ -0,0 +1,140 @@
+"""
+Speculative Retrieval
+Starts the routing-independent retrieval work while the router (an LLM call) is
+still running:
+- Engine A: plain BM25 + global vector search (`FilterableHybridRetriever.prefetch`)
+- Engine B: waterfall Tiers 1-3 (`CourseRetriever.retrieve_lexical`)
+
+Once the intent is known the matching branch is kept and the other one is cancelled
+(if it has not started) or its result discarded. The wasted work is bounded to one
+branch per query.
+
+The pool has room for SPECULATIVE_MAX_REQUESTS requests; when it is full a request
+skips speculation and retrieves after routing, instead of queueing its branches
+behind other requests' (which would finish after the router anyway).
+"""
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Dict, Optional
+from . import metrics
+
+
+class SpeculationPool:
+    """Shared thread pool with two threads per request slot; `try_acquire` never waits."""
+
+    def __init__(self, max_requests: int):
+        self.max_requests = max_requests
+        self.executor = ThreadPoolExecutor(max_workers=2 * max_requests, thread_name_prefix="speculative")
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """Reserve a request slot; False if every slot is taken."""
+        with self._lock:
+            if self._active >= self.max_requests:
+                metrics.increment("speculative.skipped_saturated")
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+
+class SpeculativeRetrieval:
+    """
+    Both retrieval branches for one question, running in a shared SpeculationPool.
+    The caller has reserved a slot (`pool.try_acquire()`); it is released once every
+    branch has finished or been cancelled.
+    """
+
+    def __init__(self, pool: SpeculationPool, question: str, retriever=None,
+                 course_retriever=None, course_top_k: int = 5):
+        self.question = question
+        self.cancel_event = threading.Event()
+        self.futures: Dict[str, Future] = {}
+        self.durations: Dict[str, float] = {}
+        self.pool = pool
+
+        if retriever is not None and hasattr(retriever, "prefetch"):
+            # Each branch runs in a copy of the caller's context, so it sees the request's
+            # cancel event (core/cancellation.py) and stops when the client disconnects
+            self.futures["general"] = pool.executor.submit(
+                contextvars.copy_context().run, self._timed, "general", retriever.prefetch, question, self.cancel_event
+            )
+        if course_retriever is not None and hasattr(course_retriever, "retrieve_lexical"):
+            self.futures["course"] = pool.executor.submit(
+                contextvars.copy_context().run, self._timed, "course", course_retriever.retrieve_lexical, question, course_top_k
+            )
+        metrics.increment("speculative.started")
+
+        self._pending = len(self.futures)
+        self._pending_lock = threading.Lock()
+        if not self.futures:
+            pool.release()
+        for future in list(self.futures.values()):
+            future.add_done_callback(self._branch_done)
+
+    def _branch_done(self, future: Future):
+        with self._pending_lock:
+            self._pending -= 1
+            last = self._pending == 0
+        if last:
+            self.pool.release()
+
+    def _timed(self, branch: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.durations[branch] = time.perf_counter() - start
+
+    def take(self, branch: str, question: str) -> Optional[Any]:
+        """
+        Result of `branch` for `question` (None if unavailable or the question changed);
+        every other branch is discarded.
+        """
+        for other in list(self.futures):
+            if other != branch:
+                self._discard(other)
+
+        future = self.futures.pop(branch, None)
+        if future is None or question != self.question:
+            if future is not None:
+                self._discard_future(branch, future)
+            return None
+
+        wait_start = time.perf_counter()
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"  [Speculative] {branch} branch failed: {e}")
+            metrics.increment("speculative.failed")
+            return None
+        waited = time.perf_counter() - wait_start
+
+        hidden = max(0.0, self.durations.get(branch, 0.0) - waited)
+        metrics.increment("speculative.used")
+        metrics.increment("speculative.hidden_seconds", hidden)
+        print(f"  [Speculative] Using prefetched {branch} retrieval ({hidden * 1000:.0f} ms hidden behind routing)")
+        return result
+
+    def discard(self):
+        """Drop every branch (e.g. greeting/off-topic queries that skip retrieval)."""
+        for branch in list(self.futures):
+            self._discard(branch)
+
+    def _discard(self, branch: str):
+        self._discard_future(branch, self.futures.pop(branch))
+
+    def _discard_future(self, branch: str, future: Future):
+        if branch == "general":
+            # Stops the prefetch between its stages if it is already running
+            self.cancel_event.set()
+        if future.cancel():
+            metrics.increment("speculative.cancelled")
+        else:
+            metrics.increment("speculative.discarded")
@@ -0,0 +1,96 @@
+"""
+Standalone Question Detector
+Decides locally whether a follow-up needs the condenser LLM call at all. Many follow-ups
+are already self-contained ("What is the fee for B.Tech?" after a placements question)
+and can skip the rewrite round trip.
+
+A follow-up is condensed when it:
+- refers back to the conversation (pronouns like "it"/"its"/"that", ellipsis like
+  "what about ...", "and for M.Tech?", "tell me more"), or
+- is short (a few words) and names no known course code, or
+- is close to the previous question in embedding space (same topic, likely elliptical,
+  e.g. "what is the fee?" right after "tell me about M.Tech")
+
+Otherwise (a greeting, a question naming a course code, or a topic switch) it is used
+as-is. Only codes in the course index count, so "top 100" or "of 500" are not courses.
+Decisions are counted under condense.* in /metrics; eval_standalone.py measures
+precision on labeled multi-turn transcripts.
+"""
+import re
+from typing import List, Optional, Set, Tuple
+import numpy as np
+from .config import Config
+from .router import COURSE_CODE_PATTERN, GREETING_PATTERNS
+from . import metrics
+
+
+ANAPHORA_PATTERN = re.compile(
+    r"\b(it|its|it's|itself|that|this|these|those|they|them|their|theirs|he|she|him|his|her|"
+    r"same|former|latter|above|previous|mentioned|one|ones|else|other|another)\b",
+    re.IGNORECASE
+)
+ELLIPSIS_PATTERN = re.compile(
+    r"^\s*(and|also|but|or|so|then|what about|how about|what if|why|why not|more|"
+    r"tell me more|elaborate|explain|continue|go on|which one|the same|same for|ok and)\b",
+    re.IGNORECASE
+)
+SHORT_QUESTION_WORDS = 5  # Short follow-ups without a course code are usually elliptical
+
+
+def embedding_similarity(embeddings, a: str, b: str) -> Optional[float]:
+    """Cosine similarity of two texts under `embeddings` (None without a model)."""
+    if embeddings is None:
+        return None
+    vectors = np.asarray(embeddings.embed_documents([a, b]), dtype=np.float32)
+    norms = np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+    return float(vectors[0] @ vectors[1] / (norms[0] * norms[1]))
+
+
+def _previous_question(chat_history: list) -> Optional[str]:
+    for message in reversed(chat_history):
+        if getattr(message, "type", None) == "human":
+            return message.content
+    return None
+
+
+class StandaloneDetector:
+    def __init__(self, embeddings=None, similarity_threshold: float = None, known_codes: Optional[Set[str]] = None):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None \
+            else Config.STANDALONE_SIMILARITY_THRESHOLD
+        self.known_codes = known_codes or set()  # Course codes in the index (cross-listed parts included)
+
+    def names_course(self, question: str) -> bool:
+        return any(f"{dept}{num}".upper() in self.known_codes for dept, num in COURSE_CODE_PATTERN.findall(question))
+
+    def similarity(self, question: str, previous: str) -> Optional[float]:
+        return embedding_similarity(self.embeddings, question, previous)
+
+    def classify(self, question: str, chat_history: list) -> Tuple[bool, str]:
+        """(needs condensing, reason)."""
+        if any(re.match(pattern, question.lower().strip()) for pattern in GREETING_PATTERNS):
+            return False, "greeting"
+        if ANAPHORA_PATTERN.search(question):
+            return True, "anaphora"
+        if ELLIPSIS_PATTERN.search(question):
+            return True, "ellipsis"
+        if self.names_course(question):
+            return False, "course_code"
+        if len(re.findall(r"\w+", question)) <= SHORT_QUESTION_WORDS:
+            return True, "short"
+        previous = _previous_question(chat_history)
+        if previous is None:
+            return False, "no_previous"
+        sim = self.similarity(question, previous)
+        if sim is None:
+            return True, "no_embeddings"
+        if sim >= self.similarity_threshold:
+            return True, "related"
+        return False, "unrelated"
+
+    def needs_condensing(self, question: str, chat_history: list) -> bool:
+        needed, reason = self.classify(question, chat_history)
+        metrics.increment(f"condense.{'needed' if needed else 'skipped'}.{reason}")
+        if not needed:
+            print(f"  [Standalone] Using follow-up as-is ({reason})")
+        return needed
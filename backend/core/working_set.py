@@ -0,0 +1,86 @@
+"""
+Session Working Set
+Follow-ups ("and what about its credits?", "tell me more") usually need the same courses
+or chunks as the previous turn. Each answer records its working set (the route plus the
+course codes or chunk ids it was built from) in the session; the next turn reuses it
+when the condensed question stays on the same entity:
+- Course: every course code in the question is already in the working set
+- Otherwise: MiniLM cosine to the previous standalone question is at least
+  SESSION_REUSE_SIMILARITY (and the question names no new course code)
+
+On reuse the router is skipped. Course answers are built from the stored courses;
+general answers re-rank the stored chunks with the cross-encoder instead of running
+BM25 + vector search + fusion. Counted under session_reuse.* in /metrics.
+"""
+import re
+from typing import Any, Dict, List, Optional
+from .config import Config
+from .router import COURSE_CODE_PATTERN
+from .standalone import embedding_similarity
+from . import metrics
+
+
+def course_codes(text: str) -> List[str]:
+    return [f"{dept}{num}".upper() for dept, num in COURSE_CODE_PATTERN.findall(text)]
+
+
+def code_parts(code: str) -> List[str]:
+    """Each code of a cross-listed course code ("CSE441/541" -> ["CSE441", "CSE541"])."""
+    parts, dept = [], ""
+    for part in code.upper().split("/"):
+        match = re.fullmatch(r"\s*([A-Z]*)\s*(\d{3}[A-Z]?)\s*", part)
+        if match:
+            dept = match.group(1) or dept
+            parts.append(f"{dept}{match.group(2)}")
+    return parts
+
+
+def known_course_codes(course_retriever) -> set:
+    """Every course code in Engine B's index, with the parts of cross-listed codes."""
+    if course_retriever is None:
+        return set()
+    return {part for code in course_retriever.index["by_code"] for part in code_parts(code)}
+
+
+def build_working_set(question: str, route_info: Optional[Dict[str, Any]], engine: str,
+                      codes: List[str] = None, chunk_ids: List[str] = None,
+                      top_rrf: Optional[float] = None) -> Dict[str, Any]:
+    """JSON-serializable working set of one answer, stored with the session."""
+    return {
+        "question": question,
+        "engine": engine,  # "course" | "general"
+        "route_info": route_info,
+        "codes": codes or [],
+        "chunk_ids": chunk_ids or [],
+        "top_rrf": top_rrf,  # Best RRF score of the retrieval the chunks came from (no-answer gate)
+    }
+
+
+class WorkingSetMatcher:
+    def __init__(self, embeddings=None, similarity_threshold: float = None):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold if similarity_threshold is not None \
+            else Config.SESSION_REUSE_SIMILARITY
+
+    def match(self, question: str, working_set: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Reason the working set can be reused for `question` ('course_code' | 'similar'), or None."""
+        if not working_set or not (working_set.get("codes") or working_set.get("chunk_ids")):
+            return None
+        metrics.increment("session_reuse.checked")
+
+        codes = course_codes(question)
+        known = {part for code in working_set.get("codes", []) for part in code_parts(code)}
+        if codes:
+            if working_set["engine"] == "course" and set(codes) <= known:
+                return self._hit("course_code")
+            return None  # Names a course the previous turn did not use
+
+        similarity = embedding_similarity(self.embeddings, question, working_set.get("question", ""))
+        if similarity is not None and similarity >= self.similarity_threshold:
+            print(f"  [WorkingSet] Same topic as the previous turn (cosine {similarity:.2f})")
+            return self._hit("similar")
+        return None
+
+    def _hit(self, reason: str) -> str:
+        metrics.increment(f"session_reuse.hits.{reason}")
+        return reason
@@ -0,0 +1,125 @@
+"""
+Standalone Detector Evaluation
+Measures how well the local standalone-question detector (core/standalone.py) decides
+when the condenser LLM call can be skipped, on labeled multi-turn transcripts.
+
+Skipping a follow-up that actually needed rewriting sends an incomplete question to
+retrieval, so the number to watch is skip precision (of the skipped follow-ups, the
+share that really were standalone); skip recall is the share of condenser calls saved.
+
+Labels are a JSON list of {"history": ["earlier question", ...], "question": "...",
+"standalone": true|false}. Without --labels a small built-in set is used.
+
+Usage:
+    python eval_standalone.py
+    python eval_standalone.py --labels data/standalone_labels.json --thresholds 0.35 0.45 0.55
+    python eval_standalone.py --no-embeddings     # regex rules only
+"""
+import os
+import sys
+import json
+import argparse
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core.config import Config
+from core.standalone import StandaloneDetector
+
+
+LABELS = [
+    {"history": ["What is the fee structure for B.Tech?"], "question": "what about hostel fees?", "standalone": False},
+    {"history": ["What is the fee structure for B.Tech?"], "question": "Is there a scholarship for it?", "standalone": False},
+    {"history": ["Tell me about CSE121"], "question": "what are its prerequisites?", "standalone": False},
+    {"history": ["Tell me about CSE121"], "question": "how many credits?", "standalone": False},
+    {"history": ["Tell me about CSE121"], "question": "Who teaches CSE233?", "standalone": True},
+    {"history": ["What is the attendance policy?"], "question": "what happens if I fall below it?", "standalone": False},
+    {"history": ["Which companies visit for placements?"], "question": "what was the highest package?", "standalone": False},
+    {"history": ["Which companies visit for placements?"], "question": "and for M.Tech?", "standalone": False},
+    {"history": ["What clubs are there on campus?"], "question": "how do I join the coding one?", "standalone": False},
+    {"history": ["Tell me about the M.Tech program"], "question": "what is the fee?", "standalone": False},
+    {"history": ["Tell me about the M.Tech program"], "question": "tell me more", "standalone": False},
+    {"history": ["What is the attendance policy?"], "question": "What are the hostel rules for guests?", "standalone": True},
+    {"history": ["Which companies visit for placements?"], "question": "How do I apply for a semester exchange?", "standalone": True},
+    {"history": ["What clubs are there on campus?"], "question": "What is the PhD admission process?", "standalone": True},
+    {"history": ["What is the fee structure for B.Tech?"], "question": "What is the policy on plagiarism in assignments?", "standalone": True},
+    {"history": ["Tell me about CSE121"], "question": "What are the prerequisites for ECE315?", "standalone": True},
+    {"history": ["How is CGPA calculated?"], "question": "Is there a gym on campus?", "standalone": True},
+    {"history": ["How is CGPA calculated?"], "question": "thanks", "standalone": True},
+    {"history": ["What are the research centers at IIITD?"], "question": "When does the monsoon semester start?", "standalone": True},
+    {"history": ["When does the monsoon semester start?"], "question": "when does it end?", "standalone": False},
+    {"history": ["What is the B.Tech admission process?"], "question": "what is the cutoff rank?", "standalone": False},
+    {"history": ["Who is the director of IIITD?"], "question": "Which courses cover deep learning?", "standalone": True},
+]
+
+
+def to_history(questions):
+    messages = []
+    for question in questions:
+        messages.append(HumanMessage(content=question))
+        messages.append(AIMessage(content="(answer)"))
+    return messages
+
+
+def load_known_codes(labels):
+    """Course codes from the artifact bundle, or (without one) the codes the labels mention."""
+    from core.artifacts import open_bundle, load_course_index
+    from core.working_set import code_parts, course_codes
+
+    bundle = open_bundle()
+    if bundle is not None and "courses.index" in bundle.sections:
+        index, _ = load_course_index(bundle)
+        return {part for code in index["by_code"] for part in code_parts(code)}
+    print("No course index in the artifact bundle; treating the codes in the labels as known")
+    return {code for item in labels for text in item["history"] + [item["question"]] for code in course_codes(text)}
+
+
+def evaluate(detector, labels, verbose=False):
+    tp = fp = fn = 0  # positive = skipped the condenser
+    for item in labels:
+        needed, reason = detector.classify(item["question"], to_history(item["history"]))
+        skipped = not needed
+        if skipped and item["standalone"]:
+            tp += 1
+        elif skipped:
+            fp += 1
+        elif item["standalone"]:
+            fn += 1
+        if verbose and skipped != item["standalone"]:
+            print(f"  {'skipped' if skipped else 'condensed'} ({reason}), labeled "
+                  f"{'standalone' if item['standalone'] else 'follow-up'}: {item['question']!r}")
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {"skipped": tp + fp, "precision": precision, "recall": recall, "wrong_skips": fp}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the standalone-question detector")
+    parser.add_argument("--labels", help="JSON list of {history, question, standalone}")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[Config.STANDALONE_SIMILARITY_THRESHOLD],
+                        help="Similarity thresholds to sweep")
+    parser.add_argument("--no-embeddings", action="store_true", help="Evaluate the regex rules only")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print misclassified follow-ups")
+    args = parser.parse_args()
+
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+    else:
+        labels = LABELS
+
+    embeddings = None
+    if not args.no_embeddings:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL_NAME)
+
+    known_codes = load_known_codes(labels)
+    standalone = sum(1 for item in labels if item["standalone"])
+    print(f"{len(labels)} follow-ups, {standalone} labeled standalone")
+    print(f"\n{'threshold':>9} {'skipped':>8} {'precision':>10} {'recall':>7} {'wrong skips':>12}")
+    for threshold in args.thresholds:
+        result = evaluate(StandaloneDetector(embeddings, threshold, known_codes), labels, args.verbose)
+        print(f"{threshold:>9.2f} {result['skipped']:>8} {result['precision']:>10.3f} "
+              f"{result['recall']:>7.3f} {result['wrong_skips']:>12}")
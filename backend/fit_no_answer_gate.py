@@ -0,0 +1,179 @@
+"""
+Fit the No-Answer Gate
+Routes each query of a labeled set like the pipeline does, runs Engine A retrieval with
+the router's section filter and keywords (retrieval cache bypassed), records the best
+cross-encoder and RRF score per query, and grid-searches
+the thresholds that gate the most unanswerable queries while gating at most
+NO_ANSWER_MAX_FALSE_NEGATIVE_RATE of the answerable ones. The result is written to
+data/no_answer_gate.json and picked up on the next pipeline (re)load.
+
+The labeled set is a JSON list of {"query": "...", "answerable": true|false} and is
+required: it should be held-out real traffic with both classes. Queries that are intent
+classifier exemplars are dropped (they match the classifier at ~1.0 and would bias the
+fit). Re-fit after every general re-ingestion. Queries the router sends elsewhere
+(courses, greetings, off-topic) never reach the gate and are left out of the fit.
+--no-router fits unfiltered scores, for pipelines run without one.
+
+Usage:
+    python fit_no_answer_gate.py --labels data/no_answer_labels.json
+    python fit_no_answer_gate.py --dry-run          # print the fit, don't save
+    python fit_no_answer_gate.py --no-router        # no LLM: unfiltered retrieval
+    python fit_no_answer_gate.py --audit            # review gated queries
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.config import Config
+from core.answer_gate import fit_thresholds, would_fire
+from core.index_version import read_index_versions
+from core.intent_classifier import INTENT_EXEMPLARS
+
+
+MIN_LABELS_PER_CLASS = 20  # Fewer than this per class: warn that the fit is noisy
+
+# Phrases in an LLM answer that mean it did not answer either (shadow-mode audit)
+REFUSAL_MARKERS = ["don't have", "do not have", "not available", "no information", "not mentioned"]
+
+
+def _normalize(query: str) -> str:
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+def load_labels(path: str):
+    """
+    Held-out labeled queries from `path`, without intent-classifier exemplars.
+    Exits with an error unless both classes remain.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    if not isinstance(labels, list) or not all(
+            isinstance(item, dict) and "query" in item and "answerable" in item for item in labels):
+        raise SystemExit(f"{path}: expected a JSON list of {{\"query\", \"answerable\"}} objects")
+
+    exemplars = {_normalize(q) for queries in INTENT_EXEMPLARS.values() for q in queries}
+    held_out = [item for item in labels if _normalize(item["query"]) not in exemplars]
+    if len(held_out) < len(labels):
+        print(f"Warning: dropped {len(labels) - len(held_out)} queries that are intent classifier exemplars")
+
+    answerable = sum(1 for item in held_out if item["answerable"])
+    unanswerable = len(held_out) - answerable
+    if not answerable or not unanswerable:
+        raise SystemExit(f"{path}: need both answerable and unanswerable held-out queries "
+                         f"(got {answerable} answerable, {unanswerable} unanswerable)")
+    if min(answerable, unanswerable) < MIN_LABELS_PER_CLASS:
+        print(f"Warning: only {answerable} answerable / {unanswerable} unanswerable queries; "
+              f"the thresholds will be noisy (aim for {MIN_LABELS_PER_CLASS}+ of each)")
+    return held_out
+
+
+def load_router(retriever):
+    """The pipeline's router, or None (with a warning) if no LLM is configured."""
+    from core.llm import create_llm
+    from core.router import SitemapRouter
+    try:
+        return SitemapRouter(llm=create_llm(), embeddings=retriever.vectorstore.embeddings)
+    except Exception as e:
+        print(f"Warning: router unavailable ({e}); fitting on unfiltered retrieval")
+        return None
+
+
+def collect_scores(labels, use_router: bool = True):
+    """(labels kept, samples): scores under the same filter the pipeline would apply."""
+    from core.retrieval import get_filterable_retriever
+
+    retriever = get_filterable_retriever().model_copy(update={"result_cache": None})
+    router = load_router(retriever) if use_router else None
+    kept, samples = [], []
+    for item in labels:
+        active_retriever = retriever
+        if router is not None:
+            route_info = router.route(item["query"])
+            if route_info.get("intent") != "general" or route_info.get("skip_retrieval"):
+                print(f"  Skipping {item['query']!r}: routed to {route_info.get('intent')}, never gated")
+                continue
+            if route_info.get("chroma_filter") or route_info.get("keywords"):
+                active_retriever = retriever.with_filter(
+                    chroma_filter=route_info.get("chroma_filter"),
+                    keywords=route_info.get("keywords")
+                )
+        result = active_retriever.retrieve_scored(item["query"], use_cache=False)
+        top_rerank = float(result.scored_docs[0][1]) if result.scored_docs else -1e9
+        kept.append(item)
+        samples.append((top_rerank, result.top_rrf or 0.0, bool(item["answerable"])))
+    return kept, samples
+
+
+def audit():
+    """Summarize gated queries; shadow-mode answers that look real are likely false negatives."""
+    if not os.path.exists(Config.NO_ANSWER_AUDIT_PATH):
+        print(f"No audit log at {Config.NO_ANSWER_AUDIT_PATH}")
+        return
+    with open(Config.NO_ANSWER_AUDIT_PATH, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    suspects = [
+        r for r in records
+        if r.get("answer") and not any(marker in r["answer"].lower() for marker in REFUSAL_MARKERS)
+    ]
+    shadow = sum(1 for r in records if r.get("mode") == "shadow")
+    print(f"{len(records)} gated queries ({shadow} in shadow mode), "
+          f"{len(suspects)} shadow answers that look like real answers (possible false negatives)\n")
+    for r in suspects:
+        print(f"- {r['question']!r} (rerank {r['top_rerank']:.2f}, rrf {r['top_rrf']})")
+        print(f"  {r['answer'][:200]!r}")
+    enforced = [r for r in records if r.get("mode") == "enforce"]
+    if enforced:
+        print("\nMost recent enforced gates (check for answerable questions):")
+        for r in enforced[-20:]:
+            print(f"- {r['time']} {r['question']!r} (rerank {r['top_rerank']:.2f}, rrf {r['top_rrf']})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit no-answer gate thresholds on a labeled query set")
+    parser.add_argument("--labels", help="Held-out JSON list of {query, answerable} (required to fit)")
+    parser.add_argument("--max-fnr", type=float, default=Config.NO_ANSWER_MAX_FALSE_NEGATIVE_RATE,
+                        help="Max share of answerable queries that may be gated")
+    parser.add_argument("--output", default=Config.NO_ANSWER_GATE_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Print the fit without saving it")
+    parser.add_argument("--audit", action="store_true", help="Review the gate's audit log and exit")
+    parser.add_argument("--no-router", action="store_true", help="Fit on unfiltered retrieval (pipeline without router)")
+    args = parser.parse_args()
+
+    if args.audit:
+        audit()
+        sys.exit(0)
+
+    if not args.labels:
+        parser.error("--labels is required: a held-out labeled query set (see the module docstring)")
+    labels = load_labels(args.labels)
+
+    labels, samples = collect_scores(labels, use_router=not args.no_router)
+    fitted = fit_thresholds(samples, args.max_fnr)
+
+    print(f"\n{'answerable':>10} {'rerank':>8} {'rrf':>8} {'gated':>6}  query")
+    for item, (rerank, rrf, ok) in zip(labels, samples):
+        gated = fitted["rerank_threshold"] is not None and would_fire(
+            rerank, rrf, fitted["rerank_threshold"], fitted["rrf_threshold"])
+        print(f"{str(ok):>10} {rerank:>8.2f} {rrf:>8.4f} {str(gated):>6}  {item['query']}")
+
+    print(f"\nrerank_threshold={fitted['rerank_threshold']} rrf_threshold={fitted['rrf_threshold']} "
+          f"recall={fitted['recall']} false_negative_rate={fitted['false_negative_rate']}")
+
+    fitted.update({
+        "fitted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "index_version": read_index_versions().get("general"),
+        "reranker_model": Config.RERANKER_MODEL_NAME,
+        "adaptive_rerank": Config.ADAPTIVE_RERANK,
+        "router_filter": not args.no_router,
+    })
+    if args.dry_run:
+        sys.exit(0)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(fitted, f, indent=2)
+    print(f"Saved to {args.output}")
@@ -0,0 +1,99 @@
+"""
+Artifact Migration Script
+Converts the legacy pickles (bm25_retriever.pkl, course_bm25_retriever.pkl,
+course_index.pkl, courses_raw.pkl) into the versioned artifact bundle (artifacts.bin in the
+same data directory).
+
+Unpickling is only done here, once, on files produced by our own ingestion.
+After migrating, the server no longer loads any pickle and the .pkl files can be deleted.
+"""
+import os
+import sys
+import time
+import pickle
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.config import Config
+from core.artifacts import (
+    write_bundle, build_lexical_sections, build_course_sections, open_bundle,
+    BundleBM25Retriever, load_course_index, GENERAL_LEXICAL, COURSE_LEXICAL
+)
+
+
+def load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def verify_lexical(bundle, prefix, legacy, queries):
+    """Check that the bundle retriever returns the same ranking as the pickled one."""
+    retriever = BundleBM25Retriever(bundle, prefix, k=Config.TOP_K_RETRIEVAL)
+    legacy.k = Config.TOP_K_RETRIEVAL
+    for query in queries:
+        expected = [d.page_content for d in legacy.invoke(query)]
+        actual = [d.page_content for d in retriever.invoke(query)]
+        if expected != actual:
+            raise SystemExit(f"Verification failed for {prefix!r} on query {query!r}")
+    print(f"  Verified {prefix}: {len(queries)} queries rank identically")
+
+
+def migrate(data_dir: str):
+    paths = {
+        "general_bm25": os.path.join(data_dir, "bm25_retriever.pkl"),
+        "course_bm25": os.path.join(data_dir, "course_bm25_retriever.pkl"),
+        "course_index": os.path.join(data_dir, "course_index.pkl"),
+        "courses_raw": os.path.join(data_dir, "courses_raw.pkl"),
+    }
+    sections = {}
+    legacy = {}
+
+    if os.path.exists(paths["general_bm25"]):
+        legacy[GENERAL_LEXICAL] = load_pickle(paths["general_bm25"])
+        vec = legacy[GENERAL_LEXICAL].vectorizer
+        sections.update(build_lexical_sections(GENERAL_LEXICAL, legacy[GENERAL_LEXICAL].docs, vec.k1, vec.b, vec.epsilon))
+        print(f"  {GENERAL_LEXICAL}: {len(legacy[GENERAL_LEXICAL].docs)} chunks")
+
+    if os.path.exists(paths["course_bm25"]):
+        legacy[COURSE_LEXICAL] = load_pickle(paths["course_bm25"])
+        vec = legacy[COURSE_LEXICAL].vectorizer
+        sections.update(build_lexical_sections(COURSE_LEXICAL, legacy[COURSE_LEXICAL].docs, vec.k1, vec.b, vec.epsilon))
+        print(f"  {COURSE_LEXICAL}: {len(legacy[COURSE_LEXICAL].docs)} course documents")
+
+    if os.path.exists(paths["course_index"]) and os.path.exists(paths["courses_raw"]):
+        courses = load_pickle(paths["courses_raw"])
+        course_index = load_pickle(paths["course_index"])
+        sections.update(build_course_sections(courses, course_index))
+        print(f"  courses: {len(courses)} records, {len(course_index['by_code'])} codes")
+
+    if not sections:
+        print(f"No legacy pickles found in {data_dir}. Nothing to migrate.")
+        return
+
+    # The bundle goes next to the pickles it was built from, never to another data dir
+    bundle_path = os.path.join(data_dir, os.path.basename(Config.ARTIFACT_BUNDLE_PATH))
+    write_bundle(bundle_path, sections)
+    size_kb = os.path.getsize(bundle_path) / 1024
+    print(f"Artifact bundle written to {bundle_path} ({size_kb:.0f} KB)")
+
+    # Verify
+    start = time.perf_counter()
+    bundle = open_bundle(bundle_path)
+    print(f"  Opened bundle in {(time.perf_counter() - start) * 1000:.2f} ms")
+    sample_queries = ["attendance policy", "hostel fee structure", "CSE 101 prerequisites", "machine learning", "Who is the director"]
+    for prefix, retriever in legacy.items():
+        verify_lexical(bundle, prefix, retriever, sample_queries)
+    if "courses.index" in bundle.sections:
+        index, records = load_course_index(bundle)
+        legacy_index = load_pickle(paths["course_index"])
+        assert all(index["by_code"][code] == course for code, course in legacy_index["by_code"].items())
+        print(f"  Verified courses: {len(index['by_code'])} codes resolve to identical records")
+
+
+if __name__ == "__main__":
+    data_dir = os.path.dirname(Config.CHROMA_PERSIST_DIRECTORY)
+    if len(sys.argv) > 1:
+        data_dir = sys.argv[1]
+    print(f"Migrating legacy pickles from: {data_dir}")
+    migrate(data_dir)
@@ -0,0 +1,256 @@
+"""
+Pre-fork Server
+Loads the read-only models and indexes (MiniLM, the cross-encoder, BM25 arrays,
+course records) once in a parent process, then forks uvicorn workers that share them
+copy-on-write. Each worker gets its own torch/BLAS thread budget so N workers do not
+oversubscribe the cores.
+
+The socket is bound before the models load: while the parent warms up, /healthz answers
+200 and every other path 503 with Retry-After (like the app's own warm-up). With a single
+worker there is nothing to share, so serve.py runs uvicorn in-process with the app's
+background warm-up instead.
+
+Usage:
+    python serve.py                    # WEB_CONCURRENCY workers (default 1)
+    python serve.py --workers 4 --port 8000
+    python serve.py memory             # RSS / PSS / unique (USS) memory per process
+
+Send SIGHUP to the parent to reload indexes (e.g. after ingestion) and re-fork workers.
+"""
+import os
+import sys
+import gc
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Add backend to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.config import Config
+
+
+def configure_threads(threads: int):
+    """Cap intra-op threads. Env vars must be set before torch/BLAS are imported."""
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+
+def set_torch_threads(threads: int):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class LoadingHandler(BaseHTTPRequestHandler):
+    """Answers probes on the bound socket while the parent loads the pipeline."""
+
+    def _respond(self):
+        ok = self.path.split("?")[0] == "/healthz"
+        body = json.dumps({"status": "ok"} if ok else {"status": "warming", "ready": False}).encode()
+        self.send_response(200 if ok else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if not ok:
+            self.send_header("Retry-After", "5")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LoadingServer:
+    """Serves LoadingHandler on an already bound socket until `stop()` (the socket stays open)."""
+
+    def __init__(self, sock: socket.socket):
+        self.httpd = HTTPServer(sock.getsockname(), LoadingHandler, bind_and_activate=False)
+        self.httpd.socket.close()  # Unbound placeholder; serve on the shared socket instead
+        self.httpd.socket = sock
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.1},
+                                       name="loading-server", daemon=True)
+
+    def start(self) -> "LoadingServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.thread.join()
+
+
+def run_worker(app_module, sock: socket.socket, index: int, threads: int):
+    """Worker body (runs in the forked child)."""
+    import uvicorn
+
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    set_torch_threads(threads)
+    app_module.reopen_after_fork()
+
+    print(f"[serve] Worker {index} (pid {os.getpid()}) serving with {threads} torch thread(s)")
+    config = uvicorn.Config(app_module.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class PreforkServer:
+    def __init__(self, workers: int, host: str, port: int, threads: int):
+        self.num_workers = workers
+        self.host = host
+        self.port = port
+        self.threads = threads
+        self.workers = {}  # pid -> worker index
+        self.reload_requested = False
+        self.stopping = False
+
+    def load(self):
+        """Load and warm the pipeline in the parent, then freeze it for sharing."""
+        import app as app_module
+        self.app = app_module
+
+        app_module.warm_up(wait=True)
+        if app_module.pipeline is None:
+            raise SystemExit(f"[serve] Warm-up failed: {app_module.startup_state['error']}")
+
+        # Move everything allocated so far out of the GC's tracked generations so that
+        # collections in the workers do not write to (and un-share) those pages.
+        gc.collect()
+        gc.freeze()
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.app, self.sock, index, self.threads)
+            finally:
+                os._exit(0)
+        self.workers[pid] = index
+        self.write_pid_file()
+
+    def write_pid_file(self):
+        with open(Config.SERVE_PID_FILE, "w") as f:
+            json.dump({"parent": os.getpid(), "workers": sorted(self.workers)}, f)
+
+    def reload(self):
+        """Reload indexes in the parent, then replace workers one at a time."""
+        print("[serve] Reloading pipeline")
+        gc.unfreeze()
+        self.app.warm_up(wait=True)
+        gc.collect()
+        gc.freeze()
+        for pid in list(self.workers):
+            index = self.workers.pop(pid)
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+            self.spawn(index)
+
+    def run(self):
+        os.environ["PREFORK_PARENT_PID"] = str(os.getpid())
+        self.sock = bind_socket(self.host, self.port)
+        print(f"[serve] Listening on {self.host}:{self.port}; loading the pipeline")
+        loading = LoadingServer(self.sock).start()
+        try:
+            self.load()
+        finally:
+            loading.stop()  # Before forking: workers must not inherit the thread's accept loop
+        print(f"[serve] Pipeline loaded; starting {self.num_workers} worker(s)")
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "reload_requested", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "stopping", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "stopping", True))
+
+        for index in range(self.num_workers):
+            self.spawn(index)
+
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid and pid in self.workers:
+                index = self.workers.pop(pid)
+                print(f"[serve] Worker {index} (pid {pid}) exited with status {status}, respawning")
+                self.spawn(index)
+            time.sleep(0.5)
+
+        print("[serve] Shutting down workers")
+        for pid in self.workers:
+            os.kill(pid, signal.SIGTERM)
+        for pid in self.workers:
+            os.waitpid(pid, 0)
+        if os.path.exists(Config.SERVE_PID_FILE):
+            os.remove(Config.SERVE_PID_FILE)
+
+
+def run_single(host: str, port: int):
+    """One worker: plain uvicorn, which binds at once and warms up in the background."""
+    import uvicorn
+    uvicorn.run("app:app", host=host, port=port, log_level="info")
+
+
+def report_memory():
+    """Print per-process memory for a running pre-fork server."""
+    from core.metrics import process_memory
+
+    if not os.path.exists(Config.SERVE_PID_FILE):
+        raise SystemExit(f"No running server found ({Config.SERVE_PID_FILE} missing)")
+    with open(Config.SERVE_PID_FILE) as f:
+        pids = json.load(f)
+
+    rows = [("parent", process_memory(pids["parent"]))]
+    rows += [(f"worker {i}", process_memory(pid)) for i, pid in enumerate(pids["workers"])]
+
+    print(f"{'process':<10} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'USS MB':>9} {'shared MB':>10}")
+    for name, mem in rows:
+        print(f"{name:<10} {mem['pid']:>8} {mem['rss_kb'] / 1024:>9.1f} {mem['pss_kb'] / 1024:>9.1f} "
+              f"{mem['uss_kb'] / 1024:>9.1f} {mem['shared_kb'] / 1024:>10.1f}")
+    total_pss = sum(mem["pss_kb"] for _, mem in rows) / 1024
+    total_rss = sum(mem["rss_kb"] for _, mem in rows) / 1024
+    print(f"Total PSS: {total_pss:.1f} MB (naive RSS sum: {total_rss:.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-fork server for the IIITD chatbot backend")
+    parser.add_argument("command", nargs="?", choices=["serve", "memory"], default="serve")
+    parser.add_argument("--workers", type=int, default=Config.WEB_CONCURRENCY)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=Config.TORCH_THREADS_PER_WORKER,
+                        help="torch/BLAS threads per worker (default: cores / workers)")
+    args = parser.parse_args()
+
+    if args.command == "memory":
+        report_memory()
+    else:
+        # Read by worker-count dependent settings (e.g. SESSION_STORE_DISK=auto)
+        Config.WEB_CONCURRENCY = args.workers
+        threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+        configure_threads(threads)
+        set_torch_threads(threads)
+        if args.workers == 1:
+            run_single(args.host, args.port)
+        else:
+            PreforkServer(args.workers, args.host, args.port, threads).run()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# Make `core` importable when pytest runs from backend/ or the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import Config
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Point every data/ path in Config at a temporary directory."""
+    for name in dir(Config):
+        value = getattr(Config, name)
+        if (name.endswith("_PATH") or name.endswith("_DIRECTORY")) and isinstance(value, str) \
+                and os.sep + "data" + os.sep in value:
+            monkeypatch.setattr(Config, name, str(tmp_path / os.path.basename(value)))
+    return tmp_path
@@ -0,0 +1,53 @@
+from core.answer_cache import AnswerCache, normalize_question, question_anchors
+from core.config import Config
+
+
+class FixedEmbeddings:
+    """Every question embeds to the same vector, so only the anchors tell them apart."""
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+def semantic_cache(monkeypatch):
+    monkeypatch.setattr(Config, "ANSWER_CACHE_SEMANTIC", True)
+    cache = AnswerCache(max_entries=10, ttl_seconds=3600, semantic_threshold=0.9)
+    cache.configure("v1", embeddings=FixedEmbeddings())
+    return cache
+
+
+def test_normalize_question():
+    assert normalize_question("  What is the  Hostel fee?? ") == "what is the hostel fee"
+
+
+def test_question_anchors():
+    assert question_anchors("CSE 101 credits for BTech?") == frozenset({"CSE101", "btech"})
+    assert question_anchors("fees for 2024") >= {"2024"}
+    assert question_anchors("MTech ECE") != question_anchors("MTech CSE")
+    assert "hcd" in question_anchors("Tell me about Human-Centered Design")
+
+
+def test_exact_hit_and_version_change(monkeypatch):
+    monkeypatch.setattr(Config, "ANSWER_CACHE_SEMANTIC", False)
+    cache = AnswerCache(max_entries=10, ttl_seconds=3600)
+    cache.configure("v1")
+    cache.store("What is the hostel fee?", {"answer": "Rs 10,000"})
+    assert cache.lookup("what is the hostel fee").tier == "exact"
+    cache.configure("v2")
+    assert cache.lookup("What is the hostel fee?").result is None
+
+
+def test_semantic_hit_needs_matching_anchors(monkeypatch):
+    cache = semantic_cache(monkeypatch)
+    cache.store("What is the fee for BTech CSE?", {"answer": "BTech CSE fee"})
+    assert cache.lookup("How much is the BTech CSE fee?").tier == "semantic"
+    assert cache.lookup("How much is the MTech CSE fee?").result is None
+    assert cache.lookup("How much is the BTech ECE fee?").result is None
+
+
+def test_semantic_tier_off_by_default(monkeypatch):
+    monkeypatch.setattr(Config, "ANSWER_CACHE_SEMANTIC", False)
+    cache = AnswerCache(max_entries=10, ttl_seconds=3600)
+    cache.configure("v1", embeddings=FixedEmbeddings())
+    cache.store("What is the fee for BTech CSE?", {"answer": "BTech CSE fee"})
+    assert cache.lookup("How much is the BTech CSE fee?").result is None
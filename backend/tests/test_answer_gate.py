@@ -0,0 +1,62 @@
+import json
+
+from core.answer_gate import fit_thresholds, load_no_answer_gate, would_fire
+from core.config import Config
+
+
+def test_would_fire_needs_both_scores_below_thresholds():
+    assert would_fire(0.1, 0.01, rerank_threshold=0.5, rrf_threshold=0.02)
+    assert not would_fire(0.6, 0.01, rerank_threshold=0.5, rrf_threshold=0.02)
+    assert not would_fire(0.1, 0.03, rerank_threshold=0.5, rrf_threshold=0.02)
+
+
+def test_would_fire_rerank_only_gate():
+    assert would_fire(0.1, None, rerank_threshold=0.5, rrf_threshold=None)
+    assert not would_fire(0.5, None, rerank_threshold=0.5, rrf_threshold=None)
+
+
+def test_would_fire_unknown_rrf_never_fires_rrf_gate():
+    assert not would_fire(0.1, None, rerank_threshold=0.5, rrf_threshold=0.02)
+
+
+def test_fit_thresholds_separable_samples():
+    samples = [(0.9, 0.05, True), (0.8, 0.04, True), (0.7, 0.03, True),
+               (0.1, 0.01, False), (0.2, 0.02, False)]
+    fitted = fit_thresholds(samples, max_false_negative_rate=0.0)
+    assert fitted["recall"] == 1.0
+    assert fitted["false_negative_rate"] == 0.0
+    assert (fitted["n_answerable"], fitted["n_unanswerable"]) == (3, 2)
+    for rerank, rrf, answerable in samples:
+        assert would_fire(rerank, rrf, fitted["rerank_threshold"], fitted["rrf_threshold"]) != answerable
+
+
+def test_fit_thresholds_respects_false_negative_budget():
+    # The unanswerable query scores above an answerable one: gating it costs a false negative
+    samples = [(0.9, 0.05, True), (0.3, 0.02, True), (0.4, 0.03, False)]
+    fitted = fit_thresholds(samples, max_false_negative_rate=0.0)
+    assert fitted["rerank_threshold"] is None
+    assert fitted["recall"] == 0.0
+
+
+def test_fit_thresholds_without_unanswerable_samples():
+    fitted = fit_thresholds([(0.9, 0.05, True), (0.8, 0.04, True)])
+    assert fitted["rerank_threshold"] is None
+    assert fitted["n_unanswerable"] == 0
+
+
+def test_load_gate_from_fitted_thresholds(data_dir, monkeypatch):
+    monkeypatch.setattr(Config, "NO_ANSWER_GATE", "enforce")
+    assert load_no_answer_gate() is None  # Not fitted yet
+    with open(Config.NO_ANSWER_GATE_PATH, "w", encoding="utf-8") as f:
+        json.dump({"rerank_threshold": 0.5, "rrf_threshold": 0.02}, f)
+    gate = load_no_answer_gate()
+    assert gate.enforced
+    assert gate.check(0.1, 0.01)
+    assert not gate.check(0.1, None)
+
+
+def test_gate_that_gates_nothing_is_inactive(data_dir, monkeypatch):
+    monkeypatch.setattr(Config, "NO_ANSWER_GATE", "shadow")
+    with open(Config.NO_ANSWER_GATE_PATH, "w", encoding="utf-8") as f:
+        json.dump({"rerank_threshold": None, "rrf_threshold": None}, f)
+    assert load_no_answer_gate() is None
@@ -0,0 +1,58 @@
+import json
+import os
+
+from core import artifacts
+from core.artifacts import ArtifactBundle, replace_directory, staging_directory, update_bundle, write_bundle
+
+
+def json_section(value):
+    return ("json", json.dumps(value).encode("utf-8"))
+
+
+def test_update_bundle_replaces_prefix_and_keeps_the_rest(tmp_path):
+    path = str(tmp_path / "artifacts.bin")
+    write_bundle(path, {"kb.meta": json_section({"v": 1}), "courses.meta": json_section({"n": 3})})
+
+    update_bundle(path, ["kb"], {"kb.meta": json_section({"v": 2})})
+
+    with ArtifactBundle(path) as bundle:
+        assert bundle.json("kb.meta") == {"v": 2}
+        assert bundle.json("courses.meta") == {"n": 3}
+
+
+def test_update_bundle_unmaps_the_old_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "artifacts.bin")
+    write_bundle(path, {"kb.meta": json_section({"v": 1}), "courses.meta": json_section({"n": 3})})
+    opened = []
+
+    class TrackedBundle(ArtifactBundle):
+        def __init__(self, path):
+            super().__init__(path)
+            opened.append(self)
+
+    monkeypatch.setattr(artifacts, "ArtifactBundle", TrackedBundle)
+    update_bundle(path, ["kb"], {"kb.meta": json_section({"v": 2})})
+    assert len(opened) == 1
+    assert opened[0]._mmap.closed
+
+
+def test_replace_directory_swaps_in_the_staged_build(tmp_path):
+    live = tmp_path / "chroma_db"
+    live.mkdir()
+    (live / "old.sqlite3").write_text("old")
+    staging = staging_directory(str(live))
+    os.makedirs(staging)
+    (tmp_path / "chroma_db.staging" / "new.sqlite3").write_text("new")
+
+    replace_directory(staging, str(live))
+
+    assert sorted(os.listdir(live)) == ["new.sqlite3"]
+    assert not os.path.exists(staging)
+    assert not os.path.exists(str(live) + ".old")
+
+
+def test_staging_directory_starts_empty(tmp_path):
+    leftover = tmp_path / "chroma_db.staging"
+    leftover.mkdir()
+    (leftover / "partial.bin").write_text("from a cancelled job")
+    assert not os.path.exists(staging_directory(str(tmp_path / "chroma_db")))
@@ -0,0 +1,118 @@
+import numpy as np
+from langchain_core.documents import Document
+from core.config import Config
+from core.context_packer import ContextPacker, split_header
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class FakeVectorStore:
+    """Chroma-style paged `get` over fixed (document, embedding) rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get(self, include=None, limit=None, offset=0):
+        page = self.rows[offset:offset + limit]
+        return {"documents": [text for text, _ in page], "embeddings": [vector for _, vector in page]}
+
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def chunk(path, content):
+    return f"Context: {path}\nContent: {content}"
+
+
+def test_split_header():
+    assert split_header(chunk("Hostel > Fees", "Rs 10,000 per semester.")) == ("Hostel > Fees", "Rs 10,000 per semester.")
+    assert split_header("No header here") == ("", "No header here")
+
+
+def test_trim_keeps_most_relevant_units_in_order():
+    packer = ContextPacker(count_tokens=count_words)
+    text = "Library opens at 9.\nHostel fee is 10000 per semester.\nSports complex has a pool.\nHostel mess fee is extra."
+    trimmed = packer.trim(text, "What is the hostel fee?", budget=14)
+    assert trimmed == "Hostel fee is 10000 per semester.\nHostel mess fee is extra."
+
+
+def test_trim_keeps_pinned_prefixes_first():
+    packer = ContextPacker(count_tokens=count_words)
+    text = "Code: CSE101\nSome unrelated line about labs.\nPrerequisites: none required."
+    trimmed = packer.trim(text, "prerequisites", budget=7, keep_prefixes=("Code:",))
+    assert trimmed == "Code: CSE101\nPrerequisites: none required."
+
+
+def test_pack_documents_groups_by_header_and_orders_by_score():
+    packer = ContextPacker(count_tokens=count_words)
+    docs = [
+        (Document(page_content=chunk("Hostel", "Rooms are shared.")), 0.5),
+        (Document(page_content=chunk("Fees", "Tuition is listed online.")), 0.9),
+        (Document(page_content=chunk("Hostel", "Mess is compulsory.")), 0.7),
+    ]
+    packed = packer.pack_documents("hostel", docs, budget=1000)
+    assert packed.text == ("Document 1 (Fees):\nTuition is listed online.\n\n"
+                           "Document 2 (Hostel):\nMess is compulsory.\n\nRooms are shared.")
+    assert packed.kept == 3
+    assert packed.dropped_duplicates == packed.dropped_budget == packed.trimmed == 0
+
+
+def test_pack_documents_drops_over_budget(monkeypatch):
+    monkeypatch.setattr(Config, "CONTEXT_TRIM_SENTENCES", False)
+    packer = ContextPacker(count_tokens=count_words)
+    docs = [
+        (Document(page_content=chunk("A", "one two three four five")), 0.9),
+        (Document(page_content=chunk("B", "six seven eight nine ten")), 0.8),
+    ]
+    packed = packer.pack_documents("q", docs, budget=10)
+    assert packed.kept == 1
+    assert packed.dropped_budget == 1
+    assert "six" not in packed.text
+
+
+def test_pack_documents_dedups_with_stored_vectors():
+    first = chunk("Hostel", "Rooms are shared by two students.")
+    copy = chunk("Hostel (old)", "Rooms are shared by two students.")
+    other = chunk("Fees", "Tuition is listed online.")
+    store = FakeVectorStore([(first, [1.0, 0.0]), (copy, [0.99, 0.01]), (other, [0.0, 1.0])])
+    embeddings = CountingEmbeddings()
+    packer = ContextPacker(embeddings=embeddings, count_tokens=count_words, vectorstore=store)
+
+    packed = packer.pack_documents("rooms", [(Document(page_content=first), 0.9),
+                                             (Document(page_content=copy), 0.8),
+                                             (Document(page_content=other), 0.7)], budget=1000)
+    assert packed.kept == 2
+    assert packed.dropped_duplicates == 1
+    assert embeddings.calls == 0  # Every chunk vector came from the store
+
+
+def test_chunk_vectors_embeds_only_missing_chunks():
+    stored = chunk("A", "stored chunk")
+    embeddings = CountingEmbeddings()
+    packer = ContextPacker(embeddings=embeddings, count_tokens=count_words,
+                           vectorstore=FakeVectorStore([(stored, [1.0, 0.0])]))
+    vectors = packer._chunk_vectors([stored, "new chunk"])
+    assert vectors.shape == (2, 2)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    packer._chunk_vectors(["new chunk"])
+    assert embeddings.calls == 1
+
+
+def test_pack_courses_keeps_identity_lines_when_trimming(monkeypatch):
+    monkeypatch.setattr(Config, "CONTEXT_MIN_TRIMMED_TOKENS", 1)
+    packer = ContextPacker(count_tokens=count_words)
+    first = "=== Course 1 ===\nCode: CSE121\nName: Discrete Mathematics\nCredits: 4"
+    second = ("=== Course 2 ===\nCode: CSE222\nName: Algorithms\nCredits: 4\n"
+              "Description: graphs, sorting and dynamic programming\nBooks: CLRS")
+    packed = packer.pack_courses("credits", [first, second], budget=count_words(first) + 2 + 12)
+    assert packed.trimmed == 1
+    assert "Code: CSE222" in packed.text and "Credits: 4" in packed.text
+    assert "Books" not in packed.text
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from core.intent_classifier import INTENT_EXEMPLARS
+from fit_no_answer_gate import load_labels
+
+
+def write_labels(tmp_path, labels):
+    path = tmp_path / "labels.json"
+    path.write_text(json.dumps(labels), encoding="utf-8")
+    return str(path)
+
+
+def test_load_labels_drops_classifier_exemplars(tmp_path):
+    exemplar = INTENT_EXEMPLARS["general"][0]
+    labels = [
+        {"query": exemplar.upper() + "?", "answerable": True},
+        {"query": "Is there a shuttle from the metro station?", "answerable": True},
+        {"query": "What is the wifi password for guests?", "answerable": False},
+    ]
+    held_out = load_labels(write_labels(tmp_path, labels))
+    assert [item["query"] for item in held_out] == [labels[1]["query"], labels[2]["query"]]
+
+
+def test_load_labels_needs_both_classes(tmp_path):
+    labels = [{"query": "What is the wifi password for guests?", "answerable": False}]
+    with pytest.raises(SystemExit):
+        load_labels(write_labels(tmp_path, labels))
+
+
+def test_load_labels_rejects_malformed_file(tmp_path):
+    with pytest.raises(SystemExit):
+        load_labels(write_labels(tmp_path, {"query": "x", "answerable": True}))
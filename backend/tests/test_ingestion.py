@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_chroma")
+pytest.importorskip("langchain_huggingface")
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from core import ingestion
+from core.config import Config
+from core.retrieval import reset_chroma_clients
+from core.retrieval_cache import chunk_id
+
+
+@pytest.fixture
+def knowledge_base(data_dir, monkeypatch):
+    embeddings = DeterministicFakeEmbedding(size=16)
+    monkeypatch.setattr(ingestion, "HuggingFaceEmbeddings", lambda model_name: embeddings)
+    monkeypatch.setattr(ingestion, "load_token_counter", lambda: (lambda text: len(text.split())))
+    path = data_dir / "kb.md"
+    monkeypatch.setattr(Config, "KNOWLEDGE_BASE_PATH", str(path))
+
+    def write(sections):
+        path.write_text("".join(f"# {title}\n\n{body}\n\n" for title, body in sections), encoding="utf-8")
+    write.embeddings = embeddings
+    return write
+
+
+def stored_chunk_ids(embeddings):
+    """Chunk ids the retriever's vector store sees, opened the way a reload opens it."""
+    reset_chroma_clients()
+    vectorstore = Chroma(persist_directory=Config.CHROMA_PERSIST_DIRECTORY, embedding_function=embeddings)
+    return {chunk_id(text) for text in vectorstore.get(include=["documents"])["documents"]}
+
+
+def test_reingest_in_one_process_serves_new_chunks(knowledge_base):
+    knowledge_base([("Hostel", "Rooms are shared by two students.")])
+    ingestion.ingest_data()
+    first = stored_chunk_ids(knowledge_base.embeddings)
+
+    knowledge_base([("Library", "The library opens at nine."), ("Sports", "There is a pool.")])
+    ingestion.ingest_data()
+    second = stored_chunk_ids(knowledge_base.embeddings)
+
+    assert len(second) == 2
+    assert not first & second
+    assert not os.path.exists(Config.CHROMA_PERSIST_DIRECTORY + ".old")
+
+
+def test_empty_knowledge_base_keeps_live_index(knowledge_base):
+    knowledge_base([("Hostel", "Rooms are shared by two students.")])
+    ingestion.ingest_data()
+    live = stored_chunk_ids(knowledge_base.embeddings)
+
+    knowledge_base([])
+    with pytest.raises(ValueError):
+        ingestion.ingest_data()
+    assert stored_chunk_ids(knowledge_base.embeddings) == live
@@ -0,0 +1,145 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from core import jobs
+from core.jobs import IngestionJob, JobManager
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": 100.0}
+    monkeypatch.setattr(jobs.time, "time", lambda: now["t"])
+    return now
+
+
+def test_eta_counts_the_first_batch(clock):
+    job = IngestionJob("general", {})
+    job.status = "running"
+    job.apply_progress({"stage": "embedding", "chunks_embedded": 0, "chunks_total": 30})
+    assert job.eta_seconds() is None
+
+    clock["t"] = 110.0  # First batch of 10 chunks took 10s
+    job.apply_progress({"chunks_embedded": 10})
+    assert job.eta_seconds() == 20.0
+
+
+def test_eta_clock_starts_once(clock):
+    job = IngestionJob("general", {})
+    job.apply_progress({"stage": "embedding", "chunks_embedded": 0, "chunks_total": 20})
+    clock["t"] = 105.0
+    job.apply_progress({"stage": "embedding", "chunks_embedded": 5})
+    assert job.embed_started_at == 100.0
+
+
+def test_no_eta_once_finished(clock):
+    job = IngestionJob("general", {})
+    job.apply_progress({"stage": "embedding", "chunks_embedded": 0, "chunks_total": 20})
+    clock["t"] = 105.0
+    job.apply_progress({"chunks_embedded": 5})
+    job.status = "succeeded"
+    assert job.eta_seconds() is None
+
+
+class FakeProcess:
+    """Stands in for the spawned worker: reports a batch per tick until cancelled."""
+
+    def __init__(self, progress_queue, cancel_event):
+        self.progress_queue = progress_queue
+        self.cancel_event = cancel_event
+        self.exitcode = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        self.progress_queue.put({"type": "progress", "stage": "embedding", "chunks_embedded": 0, "chunks_total": 1000})
+        for batch in range(1, 1000):
+            if self.cancel_event.is_set():
+                self.progress_queue.put({"type": "cancelled"})
+                break
+            self.progress_queue.put({"type": "progress", "chunks_embedded": batch})
+            time.sleep(0.02)
+        self.exitcode = 0
+
+    def start(self):
+        self.thread.start()
+
+    def is_alive(self):
+        return self.thread.is_alive()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def terminate(self):
+        self.cancel_event.set()
+
+    @property
+    def pid(self):
+        return os.getpid()
+
+
+class InProcessContext:
+    """multiprocessing context whose 'processes' are FakeProcess threads."""
+
+    Queue = staticmethod(queue.Queue)
+    Event = staticmethod(threading.Event)
+
+    @staticmethod
+    def Process(target, args, name, daemon):
+        kind, kwargs, progress_queue, cancel_event = args
+        return FakeProcess(progress_queue, cancel_event)
+
+
+@pytest.fixture
+def managers(data_dir):
+    """Two JobManagers on one jobs table, like two pre-fork workers."""
+    owner, other = JobManager(), JobManager()
+    owner._ctx = other._ctx = InProcessContext()
+    return owner, other
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_one_job_at_a_time_across_managers(managers):
+    owner, other = managers
+    job = owner.submit("general")
+    with pytest.raises(RuntimeError):
+        other.submit("courses")
+    other.cancel(job.id)
+    assert wait_for(lambda: owner.get(job.id).finished)
+
+
+def test_cancel_from_another_manager(managers):
+    owner, other = managers
+    job = owner.submit("general")
+    assert wait_for(lambda: other.get(job.id).progress.get("chunks_embedded", 0) > 0)
+
+    other.cancel(job.id)
+
+    assert wait_for(lambda: other.get(job.id).status == "cancelled")
+    assert other.active_job() is None
+
+
+def test_job_of_a_dead_owner_is_failed(data_dir):
+    manager = JobManager()
+    child = subprocess.Popen([sys.executable, "-c", "pass"])
+    child.wait()
+    job = IngestionJob("general", {})
+    job.status, job.owner_pid = "running", child.pid
+    manager._save(job)
+
+    reaped = manager.get(job.id)
+    assert reaped.status == "failed"
+    assert str(child.pid) in reaped.error
+    assert manager.active_job() is None
@@ -0,0 +1,41 @@
+import pytest
+
+from core import llm_pool
+from core.config import Config
+from core.llm import with_cache_hints
+from core.llm_pool import PooledChatModel, get_pool
+
+
+def unwrap(runnable):
+    """(innermost model, merged bound kwargs) of a chain of .bind() calls."""
+    kwargs = {}
+    while hasattr(runnable, "bound"):
+        kwargs = {**runnable.kwargs, **kwargs}
+        runnable = runnable.bound
+    return runnable, kwargs
+
+
+@pytest.fixture
+def main_pool(monkeypatch):
+    monkeypatch.setattr(Config, "LLM_BACKENDS", ["http://a:8080/v1", "http://b:8080/v1"])
+    monkeypatch.setattr(Config, "LLM_FAST_BACKENDS", [])
+    monkeypatch.setattr(Config, "LLAMA_PROMPT_CACHE", True)
+    monkeypatch.setattr(Config, "LLAMA_PIN_SLOTS", True)
+    monkeypatch.setattr(llm_pool, "_pools", {})
+    return get_pool("main")
+
+
+def test_primary_keeps_stage_affinity_and_slot(main_pool):
+    stage = with_cache_hints(PooledChatModel(main_pool), "router")
+    model, kwargs = unwrap(stage.llm)
+    assert model.affinity == "router"
+    assert kwargs["extra_body"]["id_slot"] == Config.LLAMA_SLOTS["router"]
+
+
+def test_hedge_has_no_affinity_or_slot(main_pool):
+    stage = with_cache_hints(PooledChatModel(main_pool), "router")
+    model, kwargs = unwrap(stage.unpinned)
+    assert model.pool is main_pool
+    assert model.affinity is None
+    assert "id_slot" not in kwargs["extra_body"]
+    assert kwargs["extra_body"]["cache_prompt"] is True
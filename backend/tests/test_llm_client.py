@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from core import cancellation
+from core.config import Config
+from core.llm_client import StageLLM
+
+
+class FakeStreamingModel:
+    """Streams `tokens` chunks, `delay` seconds apart; records whether the stream was closed early."""
+
+    def __init__(self, tokens, delay):
+        self.tokens = tokens
+        self.delay = delay
+        self.closed_early = threading.Event()
+
+    def stream(self, input, config=None, **kwargs):
+        sent = 0
+        try:
+            for sent in range(1, self.tokens + 1):
+                time.sleep(self.delay)
+                yield AIMessageChunk(content="x")
+        finally:
+            if sent < self.tokens:
+                self.closed_early.set()
+
+
+@pytest.fixture
+def hedged_router(monkeypatch):
+    monkeypatch.setattr(Config, "LLM_HEDGING", True)
+    monkeypatch.setattr(Config, "LLM_HEDGE_STAGES", ("router",))
+    monkeypatch.setattr(Config, "LLM_HEDGE_DELAY", 0.05)
+    monkeypatch.setattr(Config, "LLM_STAGE_RETRIES", {})
+
+    def build(primary, hedge):
+        return StageLLM(primary, "router", unpinned=hedge)
+    return build
+
+
+def test_hedge_win_closes_the_slow_primary(hedged_router):
+    slow, fast = FakeStreamingModel(tokens=100, delay=0.05), FakeStreamingModel(tokens=3, delay=0.01)
+    message = hedged_router(slow, fast).invoke("question")
+    assert message.content == "xxx"
+    assert slow.closed_early.wait(timeout=1)
+
+
+def test_cancel_aborts_both_hedged_requests(hedged_router):
+    primary, hedge = FakeStreamingModel(tokens=100, delay=0.05), FakeStreamingModel(tokens=100, delay=0.05)
+    event = threading.Event()
+    threading.Timer(0.2, event.set).start()
+    start = time.perf_counter()
+    with cancellation.cancellable(event), pytest.raises(cancellation.RequestCancelled):
+        hedged_router(primary, hedge).invoke("question")
+    assert time.perf_counter() - start < 1
+    assert primary.closed_early.wait(timeout=1)
+    assert hedge.closed_early.wait(timeout=1)
+
+
+def test_cancel_closes_unhedged_stream(monkeypatch):
+    monkeypatch.setattr(Config, "LLM_HEDGING", False)
+    model = FakeStreamingModel(tokens=100, delay=0.02)
+    event = threading.Event()
+    threading.Timer(0.1, event.set).start()
+    with cancellation.cancellable(event), pytest.raises(cancellation.RequestCancelled):
+        StageLLM(model, "general").invoke("question")
+    assert model.closed_early.is_set()
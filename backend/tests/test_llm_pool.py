@@ -0,0 +1,56 @@
+import httpx
+from core.config import Config
+from core.llm_pool import BackendPool, PooledChatModel
+
+
+def make_pool(n=3):
+    pool = BackendPool("test", [f"http://backend{i}:8080/v1" for i in range(n)], "model")
+    pool._ensure_checker = lambda: None  # No health-check thread (no network)
+    return pool
+
+
+def test_acquire_least_outstanding():
+    pool = make_pool(2)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first, None)
+    assert pool.acquire() is first
+
+
+def test_acquire_skips_unhealthy():
+    pool = make_pool(2)
+    pool.backends[0].healthy = False
+    assert all(pool.acquire() is pool.backends[1] for _ in range(3))
+
+
+def test_release_evicts_after_consecutive_failures(monkeypatch):
+    monkeypatch.setattr(Config, "LLM_BACKEND_MAX_FAILURES", 2)
+    pool = make_pool(2)
+    pool.backends[1].healthy = False
+    backend = pool.backends[0]
+    pool.release(pool.acquire(), ValueError("bad request"))  # Not the backend's fault
+    for _ in range(2):
+        pool.release(pool.acquire(), httpx.ConnectError("refused"))
+    assert not backend.healthy
+    assert backend.outstanding == 0
+
+
+def test_affinity_is_stable_until_overloaded(monkeypatch):
+    monkeypatch.setattr(Config, "LLM_AFFINITY_MAX_EXTRA", 1)
+    pool = make_pool(3)
+    preferred = pool.acquire("router")
+    assert pool.acquire("router") is preferred  # 1 call above the least-loaded: still preferred
+    assert pool.acquire("router") is not preferred
+    other = make_pool(3)
+    assert other.acquire("router").url == preferred.url  # Same choice in every process
+
+
+def test_slot_hint_dropped_for_missing_slot():
+    backend = make_pool(1).backends[0]
+    backend.slots = 2
+    kwargs = {"extra_body": {"cache_prompt": True, "id_slot": 3}}
+    assert PooledChatModel._for_backend(backend, kwargs) == {"extra_body": {"cache_prompt": True}}
+    kwargs = {"extra_body": {"cache_prompt": True, "id_slot": 1}}
+    assert PooledChatModel._for_backend(backend, kwargs) is kwargs
+
@@ -0,0 +1,82 @@
+import gc
+import os
+import signal
+import time
+
+import httpx
+import pytest
+
+import serve
+from core.config import Config
+
+
+@pytest.fixture
+def sock():
+    sock = serve.bind_socket("127.0.0.1", 0)
+    yield sock
+    sock.close()
+
+
+def url(sock, path):
+    host, port = sock.getsockname()
+    return f"http://{host}:{port}{path}"
+
+
+def test_loading_server_answers_probes_until_stopped(sock):
+    loading = serve.LoadingServer(sock).start()
+    try:
+        assert httpx.get(url(sock, "/healthz")).status_code == 200
+        response = httpx.get(url(sock, "/readyz"))
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+        assert httpx.post(url(sock, "/chat"), json={"question": "hi"}).status_code == 503
+    finally:
+        loading.stop()
+    assert sock.fileno() != -1  # Still open for the workers
+
+
+class FakeApp:
+    def __init__(self):
+        self.warm_ups = 0
+
+    def warm_up(self, wait=False):
+        self.warm_ups += 1
+
+
+def idle_worker(app_module, sock, index, threads):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    while True:
+        time.sleep(1)
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_reload_rewarms_parent_and_replaces_every_worker(sock, tmp_path, monkeypatch):
+    monkeypatch.setattr(serve, "run_worker", idle_worker)
+    monkeypatch.setattr(Config, "SERVE_PID_FILE", str(tmp_path / "serve.json"))
+    server = serve.PreforkServer(workers=2, host="127.0.0.1", port=0, threads=1)
+    server.app, server.sock = FakeApp(), sock
+    try:
+        for index in range(2):
+            server.spawn(index)
+        old = set(server.workers)
+
+        server.reload()
+
+        assert server.app.warm_ups == 1
+        assert sorted(server.workers.values()) == [0, 1]
+        assert not old & set(server.workers)
+        assert all(alive(pid) for pid in server.workers)
+        assert not any(alive(pid) for pid in old)
+    finally:
+        gc.unfreeze()
+        for pid in server.workers:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
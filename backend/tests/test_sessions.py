@@ -0,0 +1,53 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from core.sessions import SessionStore, window_history
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_window_history_keeps_newest_turns_in_order():
+    turns = [("q1", "a1"), ("q2", "a2"), ("q3", "a3")]
+    messages = window_history(turns, count_tokens=count_words, max_turns=2, budget=100)
+    assert [m.content for m in messages] == ["q2", "a2", "q3", "a3"]
+    assert isinstance(messages[0], HumanMessage) and isinstance(messages[1], AIMessage)
+
+
+def test_window_history_stops_at_budget_but_keeps_last_turn():
+    turns = [("first question", "first answer"), ("second question here", "a long second answer")]
+    messages = window_history(turns, count_tokens=count_words, max_turns=5, budget=3)
+    assert [m.content for m in messages] == ["second question here", "a long second answer"]
+
+
+def test_window_history_prepends_summary():
+    messages = window_history([("q", "a")], summary="talked about hostels",
+                              count_tokens=count_words, max_turns=3, budget=100)
+    assert messages[0].content == "Summary of the earlier conversation: talked about hostels"
+    assert [m.content for m in messages[1:]] == ["q", "a"]
+
+
+def test_window_history_clips_long_answers():
+    answer = " ".join(["word"] * 1000)
+    messages = window_history([("q", answer)], count_tokens=count_words, max_turns=3, budget=10000)
+    assert len(messages[1].content) < len(answer)
+    assert messages[1].content.endswith(" ...")
+
+
+def test_disk_store_shares_sessions_between_stores(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    writer, reader = SessionStore(path=path), SessionStore(path=path)
+    session = writer.get_or_create(None)
+    writer.record_turn(session, "Where is the library?", "Next to the academic block.")
+
+    loaded = reader.get(session.id)
+    assert loaded is not None
+    assert loaded.turns == [("Where is the library?", "Next to the academic block.")]
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = SessionStore(path="", max_entries=2)
+    sessions = [store.get_or_create(None) for _ in range(3)]
+    for session in sessions:
+        store.save(session)
+    assert store.get(sessions[0].id) is None
+    assert store.get(sessions[2].id) is not None
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from core.speculation import SpeculationPool, SpeculativeRetrieval
+
+
+class FakeRetriever:
+    def prefetch(self, query, cancel_event=None):
+        return {"query": query}
+
+
+class FakeCourseRetriever:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def retrieve_lexical(self, query, top_k):
+        self.started.set()
+        self.release.wait(timeout=5)
+        return [], None
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_pool_saturates_instead_of_queueing():
+    pool = SpeculationPool(max_requests=1)
+    assert pool.try_acquire()
+    assert not pool.try_acquire()
+    pool.release()
+    assert pool.try_acquire()
+
+
+def test_take_returns_the_branch_for_the_same_question():
+    pool = SpeculationPool(max_requests=1)
+    assert pool.try_acquire()
+    speculation = SpeculativeRetrieval(pool, "hostel fees", retriever=FakeRetriever())
+    assert speculation.take("general", "hostel fees") == {"query": "hostel fees"}
+
+
+def test_take_ignores_a_changed_question():
+    pool = SpeculationPool(max_requests=1)
+    assert pool.try_acquire()
+    speculation = SpeculativeRetrieval(pool, "hostel fees", retriever=FakeRetriever())
+    assert speculation.take("general", "library hours") is None
+
+
+def test_slot_is_released_when_every_branch_is_done():
+    pool = SpeculationPool(max_requests=1)
+    course = FakeCourseRetriever()
+    assert pool.try_acquire()
+    speculation = SpeculativeRetrieval(pool, "CSE121", retriever=FakeRetriever(), course_retriever=course)
+    assert course.started.wait(timeout=5)
+    speculation.take("general", "CSE121")  # Discards the course branch, which is still running
+    assert not pool.try_acquire()
+    course.release.set()
+    assert wait_for(pool.try_acquire)
@@ -0,0 +1,41 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core.standalone import StandaloneDetector, embedding_similarity
+
+
+class FixedEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+
+HISTORY = [HumanMessage(content="Tell me about the MTech programme"), AIMessage(content="...")]
+
+
+def test_embedding_similarity():
+    embeddings = FixedEmbeddings({"a": [1.0, 0.0], "b": [2.0, 0.0], "c": [0.0, 3.0]})
+    assert embedding_similarity(embeddings, "a", "b") == pytest.approx(1.0)
+    assert embedding_similarity(embeddings, "a", "c") == pytest.approx(0.0)
+    assert embedding_similarity(None, "a", "b") is None
+
+
+def test_only_indexed_codes_count_as_courses():
+    detector = StandaloneDetector(known_codes={"CSE121"})
+    assert detector.classify("What are the prerequisites of CSE 121?", HISTORY) == (False, "course_code")
+    assert detector.classify("Any courses of 500 level?", HISTORY) == (True, "short")
+
+
+def test_references_need_condensing():
+    detector = StandaloneDetector()
+    assert detector.classify("What is its fee structure for this year?", HISTORY) == (True, "anaphora")
+    assert detector.classify("and for the BTech programme?", HISTORY) == (True, "ellipsis")
+
+
+def test_topic_switch_is_used_as_is():
+    question = "What are the library opening hours on weekends?"
+    embeddings = FixedEmbeddings({question: [0.0, 1.0], HISTORY[0].content: [1.0, 0.0]})
+    detector = StandaloneDetector(embeddings=embeddings, similarity_threshold=0.5)
+    assert detector.classify(question, HISTORY) == (False, "unrelated")
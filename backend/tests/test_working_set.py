@@ -0,0 +1,49 @@
+from core.working_set import WorkingSetMatcher, build_working_set, code_parts, course_codes
+
+
+class FixedEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+
+def test_course_codes():
+    assert course_codes("Is CSE 101 a prerequisite for cse222?") == ["CSE101", "CSE222"]
+    assert course_codes("no codes here") == []
+
+
+def test_code_parts_cross_listed():
+    assert code_parts("CSE441/541") == ["CSE441", "CSE541"]
+    assert code_parts("CSE441/ECE541") == ["CSE441", "ECE541"]
+    assert code_parts("BIO101") == ["BIO101"]
+    assert code_parts("not a code") == []
+
+
+def test_match_course_codes_in_working_set():
+    matcher = WorkingSetMatcher()
+    working_set = build_working_set("What is CSE441?", {"intent": "course"}, "course", codes=["CSE441/541"])
+    assert matcher.match("Credits of CSE541?", working_set) == "course_code"
+    assert matcher.match("And CSE222?", working_set) is None
+
+
+def test_match_requires_codes_or_chunks():
+    matcher = WorkingSetMatcher()
+    assert matcher.match("anything", None) is None
+    assert matcher.match("anything", build_working_set("q", None, "general")) is None
+
+
+def test_match_without_embeddings_never_reuses_by_similarity():
+    working_set = build_working_set("hostel fees", None, "general", chunk_ids=["c1"])
+    assert WorkingSetMatcher().match("hostel fees again", working_set) is None
+
+
+def test_match_by_similarity():
+    embeddings = FixedEmbeddings({"hostel fees": [1.0, 0.0], "hostel fee?": [0.9, 0.1],
+                                  "library hours": [0.0, 1.0]})
+    matcher = WorkingSetMatcher(embeddings=embeddings, similarity_threshold=0.8)
+    working_set = build_working_set("hostel fees", None, "general", chunk_ids=["c1"])
+    assert matcher.match("hostel fee?", working_set) == "similar"
+    assert matcher.match("library hours", working_set) is None
+